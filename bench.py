@@ -0,0 +1,616 @@
+"""
+Query-plan + latency benchmark for every SQL statement the bot issues.
+
+    BENCH_DATABASE_URL=postgresql://localhost/mmbot python bench.py
+    BENCH_DATABASE_URL=... python bench.py --sizes 10k,1m --runs 300 > bench_output.txt
+    python bench.py --throughput --backend memory
+    BENCH_DATABASE_URL=... python bench.py --throughput --backend memory,postgres --concurrency 50
+
+Everything happens inside a scratch `mmbot_bench` schema, which is dropped and
+rebuilt for each size: bot.MIGRATIONS are applied, synthetic rows are bulk-loaded
+server-side with generate_series, then each entry in QUERIES is EXPLAIN ANALYZEd
+and timed. Write statements run inside a transaction that is rolled back, so
+every run sees the same data.
+
+--throughput drives the storage side of ticket opens and join floods through
+bot.Storage with many concurrent workers, once per backend, so MemoryStorage
+and Postgres numbers come out side by side.
+
+Keep QUERIES in sync with the SQL in bot.py.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import itertools
+import statistics
+from datetime import datetime, timedelta
+
+import asyncpg
+
+import bot
+from bot import (MIGRATIONS, CONFIG_COLUMNS, TICKET_COLUMNS, ARCHIVE_BATCH, EXPORT_CHUNK,
+                 EXPORT_TABLES, EXPORT_ARCHIVES, TRANSCRIPT_COLUMNS, TRANSCRIPT_PAGE,
+                 counter_upsert_sql)
+
+SCHEMA = 'mmbot_bench'
+SIZES  = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+GUILD      = 1
+CHANNEL0   = 1_000_000_000   # ticket g lives in channel CHANNEL0 + g, open when g % 50 == 0
+MEMBER0    = 2_000_000_000   # member_invites row g is member MEMBER0 + g
+
+
+def users(n):    return max(100, n // 10)
+def inviters(n): return max(50, n // 100)
+
+
+# ================================================================== seed
+
+SEED = [
+    # tickets — 1 in 50 open, the rest closed; ~90% in the main guild
+    '''INSERT INTO tickets (ticket_id, guild_id, channel_id, user_id, ticket_type, tier, claimed_by, status, created_at)
+       SELECT 'b' || g,
+              CASE WHEN g % 10 = 0 THEN 2 ELSE 1 END,
+              {ch0} + g,
+              1 + (g * 7919) % {users},
+              CASE WHEN g % 3 = 0 THEN 'support' ELSE 'middleman' END,
+              (ARRAY['support','lowtier','midtier','hightier','reward'])[1 + g % 5],
+              CASE WHEN g % 4 = 0 THEN NULL ELSE 500 + g % 50 END,
+              CASE WHEN g % 50 = 0 THEN 'open' ELSE 'closed' END,
+              NOW() - g * INTERVAL '1 minute'
+       FROM generate_series(1, {n}) g''',
+    # steady state for archive_sweep: closed tickets live in tickets_archive, bar a small not-yet-moved backlog
+    f'''INSERT INTO tickets_archive ({", ".join(TICKET_COLUMNS)})
+       SELECT {", ".join(TICKET_COLUMNS)} FROM tickets
+       WHERE status='closed' AND substr(ticket_id, 2)::int % 50 != 1''',
+    '''DELETE FROM tickets WHERE status='closed' AND substr(ticket_id, 2)::int % 50 != 1''',
+    # ticket_messages — open tickets only (closed ones are read back and deleted), 40 rows each
+    '''INSERT INTO ticket_messages (guild_id, channel_id, message_id, event, author_id, author_name, content, at)
+       SELECT t.guild_id, t.channel_id, t.channel_id * 100 + i / 4,
+              CASE WHEN i % 4 = 3 THEN 'edit' ELSE 'message' END,
+              t.user_id, 'user' || t.user_id, repeat('x', 40 + i % 80),
+              t.created_at + i * INTERVAL '10 seconds'
+       FROM tickets t, generate_series(1, 40) i
+       WHERE t.status='open' ''',
+    # member_invites — inviter ids skewed so a few inviters own most rows
+    '''INSERT INTO member_invites (guild_id, user_id, inviter_id, is_rejoin, joined_at, state)
+       SELECT CASE WHEN g % 10 = 0 THEN 2 ELSE 1 END,
+              {m0} + g,
+              1 + floor(power(random(), 3) * {inviters})::bigint,
+              g % 20 = 0,
+              NOW() - g * INTERVAL '1 second',
+              CASE WHEN g % 20 = 0 THEN 'rejoin' WHEN g % 10 = 1 THEN 'left' WHEN g % 13 = 0 THEN 'fake'
+                   WHEN g % 2 = 0 THEN 'verified' ELSE 'unverified' END
+       FROM generate_series(1, {n}) g''',
+    '''INSERT INTO invite_breakdown (guild_id, inviter_id, joins, departed, rejoins, fake, verified, unverified)
+       SELECT guild_id, inviter_id, COUNT(*),
+              COUNT(*) FILTER (WHERE state='left'),
+              COUNT(*) FILTER (WHERE state='rejoin'),
+              COUNT(*) FILTER (WHERE state='fake'),
+              COUNT(*) FILTER (WHERE state='verified'),
+              COUNT(*) FILTER (WHERE state='unverified')
+       FROM member_invites GROUP BY guild_id, inviter_id''',
+    '''INSERT INTO invite_stats (guild_id, inviter_id, joins, leaves, fake, rejoins, verified)
+       SELECT guild_id, inviter_id,
+              COUNT(*) FILTER (WHERE NOT is_rejoin),
+              COUNT(*) FILTER (WHERE user_id % 7 = 0),
+              COUNT(*) FILTER (WHERE user_id % 11 = 0),
+              COUNT(*) FILTER (WHERE is_rejoin),
+              COUNT(*) FILTER (WHERE user_id % 2 = 0)
+       FROM member_invites GROUP BY guild_id, inviter_id''',
+    '''INSERT INTO member_left (guild_id, user_id, left_at)
+       SELECT 1, {m0} + g, NOW() - (g % 30) * INTERVAL '1 day'
+       FROM generate_series(1, {n}, 10) g''',
+    '''INSERT INTO verifications (guild_id, user_id)
+       SELECT 1, {m0} + g FROM generate_series(1, {n}, 2) g''',
+    '''INSERT INTO blacklist (user_id, guild_id, reason, blacklisted_by)
+       SELECT g, 1, 'bench', 1 FROM generate_series(1, {users}, 97) g''',
+    '''INSERT INTO custom_invites (guild_id, code, user_id, created_by)
+       SELECT 1, 'code' || g, g, g FROM generate_series(1, {inviters}) g''',
+    '''INSERT INTO invite_uses (guild_id, code, uses)
+       SELECT 1, 'code' || g, g % 40 FROM generate_series(1, {inviters}) g''',
+    '''INSERT INTO ticket_stats (guild_id, user_id, claimed, closed, total_rating, rating_count)
+       SELECT 1, 500 + g, 100, 90, 400, 90 FROM generate_series(0, 49) g''',
+    '''INSERT INTO ticket_ratings (guild_id, ticket_id, claimer_id, user_id, rating)
+       SELECT 1, 'b' || g, 500 + g % 50, 1 + g % {users}, 1 + g % 5
+       FROM generate_series(1, {n}, 10) g''',
+    '''INSERT INTO config (guild_id, ticket_category_id, log_channel_id, ticket_counter)
+       VALUES (1, 11, 12, {n}), (2, 21, 22, {n})''',
+]
+
+
+# ================================================================== queries
+
+def _open_channel(r, n): return CHANNEL0 + 50 * r.randint(1, max(1, n // 50))
+def _open_tid(r, n):     return f'b{50 * r.randint(1, max(1, n // 50))}'
+def _user(r, n):         return r.randint(1, users(n))
+def _inviter(r, n):      return 1 + int(r.random() ** 3 * inviters(n))
+def _member(r, n):       return MEMBER0 + r.randint(1, n)
+
+
+def _counter_batch(r, n, ncols, rows=50):
+    """One CounterBuffer flush: `rows` distinct inviters with small deltas per column."""
+    ids = sorted(r.sample(range(1, inviters(n) + 1), rows))
+    return ([GUILD] * rows, ids, *[[r.randint(0, 3) for _ in ids] for _ in range(ncols)])
+
+
+def _transcript_batch(r, n, rows=20):
+    """One TranscriptBuffer flush: `rows` messages spread over a few open tickets."""
+    chans = [_open_channel(r, n) for _ in range(rows)]
+    now   = datetime.now()
+    return ([GUILD] * rows, chans, [c * 100 + r.randint(50, 99) for c in chans], ['message'] * rows,
+            [_user(r, n) for _ in chans], ['bench'] * rows, ['x' * r.randint(10, 200) for _ in chans],
+            [None] * rows, [now] * rows)
+
+
+# (name, is_write, sql, params(rng, n) -> tuple)
+QUERIES = [
+    # ── tickets ────────────────────────────────────────────────────
+    ('ticket_cache.load', False,
+     "SELECT * FROM tickets WHERE status!='closed'",
+     lambda r, n: ()),
+    ('get_ticket', False,
+     'SELECT * FROM tickets WHERE channel_id = $1',
+     lambda r, n: (_open_channel(r, n),)),
+    ('insert_ticket', True,
+     '''INSERT INTO tickets (ticket_id, guild_id, channel_id, user_id, ticket_type, tier, trade_details)
+        VALUES ($1,$2,$3,$4,$5,$6,$7) RETURNING *''',
+     lambda r, n: (f'x{r.random()}', GUILD, r.randint(1, 10**9), _user(r, n), 'support', 'support', None)),
+    ('claim_ticket', True,
+     '''WITH won AS (
+            UPDATE tickets SET claimed_by=$2, status='claimed'
+            WHERE ticket_id=$1 AND claimed_by IS NULL AND status!='closed'
+            RETURNING guild_id, claimed_by
+        ), bump AS (
+            INSERT INTO ticket_stats (guild_id, user_id, claimed)
+            SELECT guild_id, claimed_by, 1 FROM won
+            ON CONFLICT (guild_id, user_id) DO UPDATE SET claimed = ticket_stats.claimed + 1
+        )
+        SELECT (SELECT claimed_by FROM won)                     AS won_by,
+               (SELECT claimed_by FROM tickets WHERE ticket_id=$1) AS holder''',
+     lambda r, n: (_open_tid(r, n), 777)),
+    ('unclaim_ticket', True,
+     '''UPDATE tickets SET claimed_by=NULL, status='open'
+        WHERE ticket_id=$1 AND claimed_by=$2
+        RETURNING ticket_id''',
+     lambda r, n: (_open_tid(r, n), 500)),
+    ('transfer_ticket', True,
+     '''UPDATE tickets SET claimed_by=$3, status='claimed'
+        WHERE ticket_id=$1 AND claimed_by=$2
+        RETURNING ticket_id''',
+     lambda r, n: (_open_tid(r, n), 500, 777)),
+    ('ticket_numbers.next', True,
+     '''INSERT INTO config (guild_id, ticket_counter) VALUES ($1, $2)
+        ON CONFLICT (guild_id) DO UPDATE
+        SET ticket_counter = COALESCE(config.ticket_counter, 0) + $2
+        RETURNING ticket_counter''',
+     lambda r, n: (GUILD, 50)),
+    ('close_ticket', True,
+     "UPDATE tickets SET status='closed' WHERE ticket_id=$1",
+     lambda r, n: (_open_tid(r, n),)),
+    ('ticket_totals', False,
+     '''SELECT (SELECT COUNT(*) FROM tickets WHERE guild_id=$1 AND status!='closed') AS open,
+               (SELECT COUNT(*) FROM tickets WHERE guild_id=$1)
+             + (SELECT COUNT(*) FROM tickets_archive WHERE guild_id=$1)             AS total,
+               (SELECT COUNT(*) FROM verifications WHERE guild_id=$1)               AS verifications''',
+     lambda r, n: (GUILD,)),
+    ('archive.move', True,
+     f'''WITH moved AS (
+             DELETE FROM tickets WHERE ticket_id IN (
+                 SELECT ticket_id FROM tickets WHERE status='closed'
+                 LIMIT $1 FOR UPDATE SKIP LOCKED
+             )
+             RETURNING {", ".join(TICKET_COLUMNS)}
+         )
+         , archived AS (
+             INSERT INTO tickets_archive ({", ".join(TICKET_COLUMNS)})
+             SELECT {", ".join(TICKET_COLUMNS)} FROM moved
+             ON CONFLICT (guild_id, ticket_id) DO UPDATE SET
+                 {", ".join(f"{col}=EXCLUDED.{col}" for col in TICKET_COLUMNS if col not in ("guild_id", "ticket_id"))},
+                 archived_at=NOW()
+             RETURNING guild_id, ticket_id, xmax <> 0 AS replaced
+         )
+         SELECT COUNT(*) AS n,
+                array_agg(guild_id || '/' || ticket_id) FILTER (WHERE replaced) AS replaced
+         FROM archived''',
+     lambda r, n: (ARCHIVE_BATCH,)),
+
+    # ── pre_open_checks / config / blacklist ───────────────────────
+    ('pre_open.combined', False,
+     '''WITH bl AS (
+            SELECT reason, blacklisted_by, created_at FROM blacklist
+            WHERE $3::boolean AND user_id=$1 AND guild_id=$2
+        ), mine AS (
+            SELECT channel_id FROM tickets
+            WHERE user_id=$1 AND guild_id=$2 AND status!='closed'
+        )
+        SELECT bl.*, ARRAY(SELECT channel_id FROM mine) AS open_channels
+        FROM (SELECT 1) AS one LEFT JOIN bl ON TRUE''',
+     lambda r, n: (_user(r, n), GUILD, False)),
+    ('blacklist_cache.load', False,
+     'SELECT guild_id, user_id FROM blacklist',
+     lambda r, n: ()),
+    ('ghost_sweep.scan', False,
+     "SELECT ticket_id, guild_id, channel_id FROM tickets "
+     "WHERE status!='closed' AND created_at < NOW() - INTERVAL '1 minute'",
+     lambda r, n: ()),
+    ('ghost_sweep.close', True,
+     "UPDATE tickets SET status='closed' WHERE ticket_id=ANY($1::text[])",
+     lambda r, n: ([_open_tid(r, n)],)),
+    ('config_cache.load', False,
+     f'SELECT {", ".join(CONFIG_COLUMNS)} FROM config',
+     lambda r, n: ()),
+    ('get_config', False,
+     'SELECT * FROM config WHERE guild_id=$1',
+     lambda r, n: (GUILD,)),
+    ('set_config', True,
+     '''INSERT INTO config (guild_id, log_channel_id) VALUES ($1,$2)
+        ON CONFLICT (guild_id) DO UPDATE SET log_channel_id=$2 RETURNING *''',
+     lambda r, n: (GUILD, 99)),
+    ('blacklist.add', True,
+     '''INSERT INTO blacklist (user_id, guild_id, reason, blacklisted_by) VALUES ($1,$2,$3,$4)
+        ON CONFLICT (user_id, guild_id) DO UPDATE SET reason=$3, blacklisted_by=$4, created_at=NOW()''',
+     lambda r, n: (_user(r, n), GUILD, 'bench', 1)),
+    ('blacklist.remove', True,
+     'DELETE FROM blacklist WHERE user_id=$1 AND guild_id=$2',
+     lambda r, n: (_user(r, n), GUILD)),
+    ('blacklists', False,
+     'SELECT * FROM blacklist WHERE guild_id=$1 ORDER BY created_at DESC',
+     lambda r, n: (GUILD,)),
+
+    # ── invite commands ────────────────────────────────────────────
+    ('invitees_page.first', False,
+     '''SELECT user_id, joined_at, state FROM member_invites
+        WHERE guild_id=$1 AND inviter_id=$2
+        ORDER BY joined_at DESC, user_id DESC LIMIT $3''',
+     lambda r, n: (GUILD, _inviter(r, n), 31)),
+    ('invitees_page.next', False,
+     '''SELECT user_id, joined_at, state FROM member_invites
+        WHERE guild_id=$1 AND inviter_id=$2 AND (joined_at, user_id) < ($4, $5)
+        ORDER BY joined_at DESC, user_id DESC LIMIT $3''',
+     lambda r, n: (GUILD, _inviter(r, n), 31, datetime.now() - timedelta(seconds=r.randint(1, n)), MEMBER0 + n)),
+    ('get_invite_breakdown', False,
+     '''SELECT joins, departed, rejoins, fake, verified, unverified
+        FROM invite_breakdown WHERE guild_id=$1 AND inviter_id=$2''',
+     lambda r, n: (GUILD, _inviter(r, n))),
+    ('invite_leaderboard', False,
+     '''SELECT inviter_id, joins, leaves, fake, rejoins, verified
+        FROM invite_stats
+        WHERE guild_id=$1
+        ORDER BY real_invites DESC, inviter_id
+        LIMIT $2''',
+     lambda r, n: (GUILD, 10)),
+    ('invite_rank', False,
+     '''SELECT (SELECT COUNT(*) FROM invite_stats
+                WHERE guild_id=$1 AND real_invites > $3 AND inviter_id <> $2) + 1 AS rank,
+               (SELECT COUNT(*) FROM invite_stats WHERE guild_id=$1) AS total,
+               (SELECT real_invites FROM invite_stats
+                WHERE guild_id=$1 AND real_invites > $3 AND inviter_id <> $2
+                ORDER BY real_invites LIMIT 1) AS next_up''',
+     lambda r, n: (GUILD, _inviter(r, n), r.randint(0, 20))),
+    ('member_invite', False,
+     'SELECT inviter_id, joined_at, is_rejoin FROM member_invites WHERE guild_id=$1 AND user_id=$2',
+     lambda r, n: (GUILD, _member(r, n))),
+    ('get_invite_stats', False,
+     'SELECT joins, leaves, fake, rejoins, verified, unattributed FROM invite_stats WHERE guild_id=$1 AND inviter_id=$2',
+     lambda r, n: (GUILD, _inviter(r, n))),
+    ('clearinvites.user', True,
+     'DELETE FROM invite_stats WHERE guild_id=$1 AND inviter_id=$2',
+     lambda r, n: (GUILD, _inviter(r, n))),
+    ('createcustomlink.delete', True,
+     'DELETE FROM custom_invites WHERE guild_id=$1 AND user_id=$2',
+     lambda r, n: (GUILD, _inviter(r, n))),
+    ('createcustomlink.insert', True,
+     'INSERT INTO custom_invites (guild_id, code, user_id, created_by) VALUES ($1,$2,$3,$4)',
+     lambda r, n: (GUILD, f'new{r.random()}', _inviter(r, n), 1)),
+
+    # ── stats / ratings ────────────────────────────────────────────
+    ('ticketstats', False,
+     'SELECT claimed, closed, total_rating, rating_count FROM ticket_stats WHERE guild_id=$1 AND user_id=$2',
+     lambda r, n: (GUILD, 500 + r.randint(0, 49))),
+    ('rating.exists', False,
+     'SELECT rating FROM ticket_ratings WHERE guild_id=$1 AND ticket_id=$2',
+     lambda r, n: (GUILD, f'b{r.randint(1, n)}')),
+    ('rating.insert', True,
+     '''INSERT INTO ticket_ratings (guild_id, ticket_id, claimer_id, user_id, rating)
+        VALUES ($1,$2,$3,$4,$5)
+        ON CONFLICT (guild_id, ticket_id) DO NOTHING
+        RETURNING rating''',
+     lambda r, n: (GUILD, f'x{r.random()}', 510, _user(r, n), 5)),
+    ('custom_invite_cache.load', False,
+     'SELECT guild_id, code, user_id FROM custom_invites',
+     lambda r, n: ()),
+    ('join.record', True,
+     '''WITH prev AS (
+            SELECT inviter_id, state FROM member_invites WHERE guild_id=$1 AND user_id=$2
+        ), kind AS (
+            SELECT NOT $4::boolean AND COALESCE(
+                (SELECT left_at FROM member_left WHERE guild_id=$1 AND user_id=$2)
+                    > LOCALTIMESTAMP - INTERVAL '8 days', FALSE) AS is_rejoin
+        ), joined AS (
+            INSERT INTO member_invites (guild_id, user_id, inviter_id, is_rejoin, state)
+            SELECT $1, $2, $3, is_rejoin,
+                   CASE WHEN is_rejoin THEN 'rejoin' WHEN $4 THEN 'fake' ELSE 'unverified' END
+            FROM kind
+            ON CONFLICT (guild_id, user_id) DO UPDATE
+            SET inviter_id=$3, joined_at=NOW(), is_rejoin=EXCLUDED.is_rejoin, state=EXCLUDED.state
+            RETURNING state
+        ), cleared AS (
+            DELETE FROM member_left WHERE guild_id=$1 AND user_id=$2
+        )
+        SELECT kind.is_rejoin, (SELECT state FROM joined) AS state,
+               prev.inviter_id AS prev_inviter, prev.state AS prev_state,
+               s.joins, s.leaves, s.fake, s.rejoins, s.verified
+        FROM kind
+        LEFT JOIN prev ON TRUE
+        LEFT JOIN invite_stats s ON s.guild_id=$1 AND s.inviter_id=$3''',
+     lambda r, n: (GUILD, _member(r, n), _inviter(r, n), False)),
+    ('leave.record', True,
+     '''WITH stamp AS (
+            INSERT INTO member_left (guild_id, user_id, left_at) VALUES ($1,$2,NOW())
+            ON CONFLICT (guild_id, user_id) DO UPDATE SET left_at=NOW()
+        ), moved AS (
+            UPDATE member_invites SET state='left'
+            WHERE guild_id=$1 AND user_id=$2 AND state NOT IN ('left', 'rejoin')
+            RETURNING user_id
+        )
+        SELECT inviter_id, is_rejoin, state, EXISTS (SELECT 1 FROM moved) AS moved
+        FROM member_invites WHERE guild_id=$1 AND user_id=$2''',
+     lambda r, n: (GUILD, _member(r, n))),
+    ('role.set_invite_state', True,
+     '''WITH prev AS (
+            SELECT inviter_id, state FROM member_invites
+            WHERE guild_id=$1 AND user_id=$2 AND state = ANY($4::text[])
+            FOR UPDATE
+        )
+        UPDATE member_invites m SET state=$3 FROM prev
+        WHERE m.guild_id=$1 AND m.user_id=$2
+        RETURNING prev.inviter_id, prev.state''',
+     lambda r, n: (GUILD, _member(r, n), 'verified', ['unverified'])),
+    ('role.verify_invitees', True,
+     '''UPDATE member_invites SET state='verified'
+        WHERE guild_id=$1 AND user_id = ANY($2::bigint[]) AND state='unverified'
+        RETURNING inviter_id''',
+     lambda r, n: (GUILD, [_member(r, n) for _ in range(50)])),
+    ('verify.insert', True,
+     'INSERT INTO verifications (guild_id, user_id) VALUES ($1,$2) ON CONFLICT DO NOTHING',
+     lambda r, n: (GUILD, _member(r, n))),
+    ('invite_uses.load', False,
+     'SELECT guild_id, code, uses FROM invite_uses',
+     lambda r, n: ()),
+    ('invite_uses.put', True,
+     '''WITH pruned AS (
+            DELETE FROM invite_uses
+            WHERE guild_id=$1 AND $4::boolean AND code <> ALL($2::text[])
+        )
+        INSERT INTO invite_uses (guild_id, code, uses)
+        SELECT $1, code, uses FROM unnest($2::text[], $3::int[]) AS t(code, uses)
+        ON CONFLICT (guild_id, code) DO UPDATE SET uses=EXCLUDED.uses, updated_at=NOW()
+        WHERE invite_uses.uses IS DISTINCT FROM EXCLUDED.uses''',
+     lambda r, n: (GUILD, [f'code{_inviter(r, n)}'], [r.randint(1, 99)], False)),
+    ('invite_uses.drop', True,
+     'DELETE FROM invite_uses WHERE guild_id=$1 AND code=$2',
+     lambda r, n: (GUILD, f'code{_inviter(r, n)}')),
+    ('verify.inviter', False,
+     'SELECT inviter_id FROM member_invites WHERE guild_id=$1 AND user_id=$2',
+     lambda r, n: (GUILD, _member(r, n))),
+
+    # ── transcripts (TranscriptBuffer in bot.py) ───────────────────
+    ('transcript.append', True,
+     f'''INSERT INTO ticket_messages ({", ".join(TRANSCRIPT_COLUMNS)})
+         SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::bigint[], $4::text[], $5::bigint[],
+                              $6::text[], $7::text[], $8::text[], $9::timestamp[])''',
+     lambda r, n: _transcript_batch(r, n)),
+    ('transcript.page', False,
+     f'''SELECT id, {", ".join(TRANSCRIPT_COLUMNS)} FROM ticket_messages
+         WHERE channel_id=$1
+         ORDER BY at, id
+         LIMIT $2''',
+     lambda r, n: (_open_channel(r, n), TRANSCRIPT_PAGE)),
+    ('transcript.last', False,
+     '''SELECT channel_id, MAX(message_id) AS last FROM ticket_messages
+         WHERE channel_id = ANY($1::bigint[]) AND event='message'
+         GROUP BY channel_id''',
+     lambda r, n: ([_open_channel(r, n)],)),
+    ('transcript.drop', True,
+     'DELETE FROM ticket_messages WHERE channel_id = ANY($1::bigint[])',
+     lambda r, n: ([_open_channel(r, n)],)),
+
+    # ── counter buffer flush (CounterBuffer in bot.py) ─────────────
+    ('counters.invite_stats', True,
+     counter_upsert_sql('invite_stats'),
+     lambda r, n: _counter_batch(r, n, 5)),
+    ('counters.ticket_stats', True,
+     counter_upsert_sql('ticket_stats'),
+     lambda r, n: _counter_batch(r, n, 4)),
+    ('counters.invite_breakdown', True,
+     counter_upsert_sql('invite_breakdown'),
+     lambda r, n: _counter_batch(r, n, 6)),
+
+    # ── $export: first cursor chunk of a per-guild walk ─────────────
+    *[(f'export.{source}', False,
+       f'SELECT {", ".join(cols)} FROM {source} WHERE guild_id=$1 ORDER BY {key} LIMIT {EXPORT_CHUNK}',
+       lambda r, n: (GUILD,))
+      for table, (cols, key) in EXPORT_TABLES.items()
+      for source in (table, *EXPORT_ARCHIVES.get(table, ()))],
+]
+
+
+# ================================================================== runner
+
+async def reset_and_seed(c, n: int):
+    await c.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+    await c.execute(f'CREATE SCHEMA {SCHEMA}')
+    for _, _, statements in MIGRATIONS:
+        for sql in statements:
+            await c.execute(sql)
+    fmt = {'n': n, 'users': users(n), 'inviters': inviters(n), 'ch0': CHANNEL0, 'm0': MEMBER0}
+    for sql in SEED:
+        t0 = time.perf_counter()
+        await c.execute(sql.format(**fmt))
+        print(f'  seeded {sql.split()[2]:<16} {time.perf_counter() - t0:7.2f}s')
+    await c.execute('ANALYZE')
+
+
+async def explain(c, sql: str, args: tuple) -> str:
+    tr = c.transaction()
+    await tr.start()
+    try:
+        rows = await c.fetch(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', *args)
+    finally:
+        await tr.rollback()
+    return '\n'.join('      ' + r[0] for r in rows)
+
+
+async def timed(c, sql: str, args: tuple, is_write: bool) -> float:
+    if is_write:
+        tr = c.transaction()
+        await tr.start()
+    t0 = time.perf_counter()
+    try:
+        await c.fetch(sql, *args)
+        return (time.perf_counter() - t0) * 1000
+    finally:
+        if is_write:
+            await tr.rollback()
+
+
+def pct(samples: list, p: float) -> float:
+    if len(samples) < 2:
+        return samples[0] if samples else 0.0
+    return statistics.quantiles(samples, n=100, method='inclusive')[int(p) - 1]
+
+
+async def bench_size(url: str, label: str, n: int, runs: int, plans: bool):
+    print(f'\n==================== {label}  ({n:,} rows)')
+    c = await asyncpg.connect(url, server_settings={'search_path': SCHEMA})
+    try:
+        await reset_and_seed(c, n)
+        rng = random.Random(n)
+        print(f'\n  {"query":<28}{"p50 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+        for name, is_write, sql, params in QUERIES:
+            for _ in range(min(10, runs)):
+                await timed(c, sql, params(rng, n), is_write)
+            samples = [await timed(c, sql, params(rng, n), is_write) for _ in range(runs)]
+            print(f'  {name:<28}{pct(samples, 50):>10.3f}{pct(samples, 99):>10.3f}{max(samples):>10.3f}')
+            if plans:
+                print(await explain(c, sql, params(rng, n)))
+    finally:
+        await c.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        await c.close()
+
+
+# ================================================================== throughput
+
+async def _open_ticket(i: int):
+    """Storage side of a ticket open: pre_open_checks' lookup, a ticket number, the insert."""
+    user_id = 10_000 + i
+    await bot.db.open_state(GUILD, user_id)
+    num = await bot.db.next_num(GUILD)
+    await bot.db.insert_ticket(f'{num:04d}', GUILD, CHANNEL0 + num, user_id, 'support', 'support')
+
+
+def _join_op(rng):
+    async def op(i: int):
+        inviter = 1 + int(rng.random() ** 3 * 50)
+        await bot.attribute_join(GUILD, MEMBER0 + i, inviter, new_account=rng.random() < 0.05)
+    return op
+
+
+SCENARIOS = {'ticket_open': lambda rng: _open_ticket, 'join_flood': _join_op}
+
+
+async def make_storage(backend: str, url: str, latency_ms: float) -> bot.Storage:
+    # fresh module state per backend so one run can't warm the next
+    bot.ticket_numbers = bot.TicketNumberAllocator(bot.TICKET_NUM_BLOCK)
+    bot.counters       = bot.CounterBuffer()
+    if backend == 'memory':
+        store = bot.MemoryStorage(latency_ms / 1000)
+        await store.connect()
+    else:
+        c = await asyncpg.connect(url)
+        await c.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        await c.execute(f'CREATE SCHEMA {SCHEMA}')
+        await c.close()
+        store = bot.Database()
+        await store.connect(url=url, server_settings={'search_path': SCHEMA})
+    bot.db = store
+    return store
+
+
+async def run_scenario(op, ops: int, concurrency: int) -> tuple[float, list]:
+    latencies = []
+    ids       = itertools.count()
+
+    async def worker():
+        while (i := next(ids)) < ops:
+            t0 = time.perf_counter()
+            await op(i)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    stop = asyncio.Event()
+
+    async def flusher():
+        # stands in for the bot's counter_flush loop
+        while not stop.is_set():
+            await asyncio.sleep(bot.COUNTER_FLUSH_MS / 1000)
+            await bot.counters.flush(bot.db)
+
+    f  = asyncio.create_task(flusher())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    stop.set()
+    await f
+    await bot.counters.flush(bot.db)
+    return wall, latencies
+
+
+async def bench_throughput(backends: list, url: str, ops: int, concurrency: int, latency_ms: float):
+    print(f'\n==================== throughput  ({ops:,} ops, {concurrency} workers)')
+    print(f'\n  {"backend":<10}{"scenario":<14}{"ops/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+    for backend in backends:
+        store = await make_storage(backend, url, latency_ms)
+        try:
+            for name, make_op in SCENARIOS.items():
+                wall, lat = await run_scenario(make_op(random.Random(ops)), ops, concurrency)
+                print(f'  {backend:<10}{name:<14}{ops / wall:>10.0f}{pct(lat, 50):>10.3f}{pct(lat, 99):>10.3f}{max(lat):>10.3f}')
+        finally:
+            await store.close()
+            if backend == 'postgres':
+                c = await asyncpg.connect(url)
+                await c.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+                await c.close()
+
+
+async def main():
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    ap.add_argument('--sizes', default='10k,1m,10m', help=f'comma list from {",".join(SIZES)}')
+    ap.add_argument('--runs', type=int, default=200, help='timed executions per query')
+    ap.add_argument('--no-plans', action='store_true', help='skip EXPLAIN output')
+    ap.add_argument('--throughput', action='store_true', help='run the storage throughput scenarios instead')
+    ap.add_argument('--backend', default='memory,postgres', help='throughput backends: memory, postgres')
+    ap.add_argument('--ops', type=int, default=2000, help='operations per throughput scenario')
+    ap.add_argument('--concurrency', type=int, default=50, help='concurrent throughput workers')
+    ap.add_argument('--latency-ms', type=float, default=0.0, help='simulated round trip for the memory backend')
+    args = ap.parse_args()
+
+    backends = [b.strip().lower() for b in args.backend.split(',')]
+    url      = os.getenv('BENCH_DATABASE_URL', '')
+    if not args.throughput or 'postgres' in backends:
+        if not url:
+            sys.exit('BENCH_DATABASE_URL is not set — point it at a scratch database, never production')
+        if url == os.getenv('DATABASE_URL'):
+            sys.exit('BENCH_DATABASE_URL must not be the bot\'s DATABASE_URL')
+    if args.throughput:
+        await bench_throughput(backends, url, args.ops, args.concurrency, args.latency_ms)
+        return
+    for label in args.sizes.split(','):
+        await bench_size(url, label, SIZES[label.strip().lower()], args.runs, not args.no_plans)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,18 +1,27 @@
 import os
 import re
 import io
+import csv
+import gzip
 import json
 import random
 import string
 import asyncio
 import logging
 import secrets
+import signal
 import hashlib
 import struct
+import contextlib
+import contextvars
+import sys
+import argparse
+import tempfile
 import time as _time
 from datetime import datetime, timezone, timedelta
+from abc import ABC, abstractmethod
 from typing import Optional
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
 
 import discord
 import aiohttp
@@ -78,9 +87,47 @@ TIER_SLUG = {
 }
 
 MAX_OPEN       = 1
+# ticket numbers are reserved from the DB in blocks of this size; a crash skips at most this many
+TICKET_NUM_BLOCK = max(1, int(os.getenv('TICKET_NUM_BLOCK', 50)))
+# asyncpg pools grow lazily between min and max and shed idle connections after 5 min,
+# so the live size follows load; the background lane keeps member events off the interactive pool
+DB_POOL_MIN      = max(1, int(os.getenv('DB_POOL_MIN', 1)))
+DB_POOL_MAX      = max(DB_POOL_MIN, int(os.getenv('DB_POOL_MAX', 10)))
+DB_BG_POOL_MAX   = max(1, int(os.getenv('DB_BG_POOL_MAX', 3)))
+DB_IDLE_HOLD_MS  = float(os.getenv('DB_IDLE_HOLD_MS', 50))   # held outside DB calls longer than this → flagged
+DB_SLOW_MS       = float(os.getenv('DB_SLOW_MS', 250))        # statements slower than this are logged
+# invite_stats / ticket_stats increments are buffered in memory and written at most this often
+COUNTER_FLUSH_MS = max(50, int(os.getenv('COUNTER_FLUSH_MS', 500)))
+# 'postgres' (default) or 'memory' — the latter keeps everything in dicts, for load tests and local runs
+STORAGE_BACKEND   = os.getenv('STORAGE_BACKEND', 'postgres').lower()
+MEMORY_LATENCY_MS = float(os.getenv('MEMORY_LATENCY_MS', 0))   # simulated round trip per call with STORAGE_BACKEND=memory
+# exports stream through a server-side cursor this many rows at a time into a temp file that
+# stays in memory up to EXPORT_SPOOL_BYTES and spills to disk past that
+EXPORT_CHUNK       = max(100, int(os.getenv('EXPORT_CHUNK', 2000)))
+EXPORT_SPOOL_BYTES = int(os.getenv('EXPORT_SPOOL_BYTES', 8 * 1024 * 1024))
+# closed tickets are moved from `tickets` to `tickets_archive` this many rows per statement
+ARCHIVE_BATCH      = max(10, int(os.getenv('ARCHIVE_BATCH', 500)))
+# joins landing within this window of each other share one guild.invites() fetch
+JOIN_COALESCE_MS   = max(0, int(os.getenv('JOIN_COALESCE_MS', 1500)))
+# hidden channels kept ready per ticket kind in each guild's ticket category; opening a ticket
+# renames one instead of creating it. The filler waits CHANNEL_POOL_REFILL_S between creates
+CHANNEL_POOL_DEPTH    = max(0, int(os.getenv('CHANNEL_POOL_DEPTH', 2)))
+CHANNEL_POOL_REFILL_S = max(0.5, float(os.getenv('CHANNEL_POOL_REFILL_S', 3)))
+# every ticket open goes through one per-guild queue: at most TICKET_OPEN_CONCURRENCY run at once,
+# at most TICKET_OPEN_QUEUE wait, and anyone past that is told to retry
+TICKET_OPEN_CONCURRENCY = max(1, int(os.getenv('TICKET_OPEN_CONCURRENCY', 2)))
+TICKET_OPEN_QUEUE       = max(1, int(os.getenv('TICKET_OPEN_QUEUE', 25)))
+# ticket channel messages / edits / deletes are buffered and written to ticket_messages this often
+TRANSCRIPT_FLUSH_MS     = max(100, int(os.getenv('TRANSCRIPT_FLUSH_MS', 2000)))
+TRANSCRIPT_PENDING_MAX  = max(1000, int(os.getenv('TRANSCRIPT_PENDING_MAX', 50_000)))   # rows held while the DB is unreachable
+# transcripts are built a page at a time into spooled temp files (EXPORT_SPOOL_BYTES in memory),
+# split into parts under the log guild's upload limit; TRANSCRIPT_GZIP=1 uploads them as .txt.gz
+TRANSCRIPT_PAGE         = max(100, int(os.getenv('TRANSCRIPT_PAGE', 1000)))
+TRANSCRIPT_GZIP         = os.getenv('TRANSCRIPT_GZIP', '').lower() in ('1', 'true', 'yes')
 tickets_locked = {}
 captchas       = {}
-invite_cache   = {}   # guild_id -> {code: uses}
+invite_cache   = {}   # guild_id -> {code: uses} — mirrored to invite_uses, kept current by invite events
+VANITY_CODE    = '~vanity'   # invite_cache / invite_uses key for the vanity URL's count; real codes never contain '~'
 snipe_cache    = {}   # channel_id -> {content, author, avatar, attachments}
 esnipe_cache   = {}   # channel_id -> {before, after, author, avatar}
 
@@ -188,13 +235,1009 @@ class RateLimiter:
 limiter = RateLimiter()
 
 
-# ================================================================== database
+# ================================================================== ticket cache
+
+TICKET_COLUMNS = (
+    'ticket_id', 'guild_id', 'channel_id', 'user_id', 'ticket_type',
+    'tier', 'claimed_by', 'status', 'trade_details', 'created_at',
+)
+
+
+class TicketRecord:
+    """
+    Compact in-memory copy of a `tickets` row.
+    Supports row['col'] and row.get('col') so it drops in wherever an asyncpg Record was used.
+    """
+    __slots__ = TICKET_COLUMNS
+
+    def __init__(self, row):
+        for col in TICKET_COLUMNS:
+            setattr(self, col, row.get(col))
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+class TicketCache:
+    """
+    Write-through cache of open tickets keyed by channel_id.
+    Loaded once on connect, then kept current by the insert / claim / transfer / close paths.
+    """
+    def __init__(self):
+        self._by_channel: dict = {}   # channel_id -> TicketRecord
+
+    def __len__(self):
+        return len(self._by_channel)
+
+    async def load(self, db):
+        rows = await db.load_open_tickets()
+        self._by_channel = {r['channel_id']: TicketRecord(r) for r in rows}
+        logger.info(f'ticket cache loaded  •  {len(rows)} open ticket(s)')
+
+    def get(self, channel_id: int) -> Optional[TicketRecord]:
+        return self._by_channel.get(channel_id)
+
+    def put(self, row) -> TicketRecord:
+        rec = row if isinstance(row, TicketRecord) else TicketRecord(row)
+        if rec.status == 'closed':
+            self._by_channel.pop(rec.channel_id, None)
+        else:
+            self._by_channel[rec.channel_id] = rec
+        return rec
+
+    def update(self, channel_id: int, **fields):
+        # copy-on-write: handlers holding the old record keep a consistent snapshot
+        rec = self._by_channel.get(channel_id)
+        if not rec:
+            return
+        new = TicketRecord(rec)
+        for k, v in fields.items():
+            setattr(new, k, v)
+        self.put(new)
+
+    def drop(self, channel_id: int):
+        self._by_channel.pop(channel_id, None)
+
+
+ticket_cache = TicketCache()
+
+
+# ================================================================== ticket numbers
+
+class TicketNumberAllocator:
+    """
+    Hands out ticket numbers from ranges reserved with a single UPSERT ... RETURNING.
+    Numbers stay monotonic per guild; if the bot dies mid-block the unused rest of
+    that block (at most `block` numbers) is skipped.
+    """
+    def __init__(self, block: int):
+        self.block  = block
+        self._next  = {}                        # guild_id -> next number to hand out
+        self._end   = {}                        # guild_id -> last number of the reserved block
+        self._locks = defaultdict(asyncio.Lock)
+
+    async def next(self, db, guild_id: int) -> int:
+        async with self._locks[guild_id]:
+            if self._next.get(guild_id, 1) > self._end.get(guild_id, 0):
+                end = await db.reserve_ticket_numbers(guild_id, self.block)
+                self._next[guild_id] = end - self.block + 1
+                self._end[guild_id]  = end
+            num = self._next[guild_id]
+            self._next[guild_id] = num + 1
+            return num
+
+    def issued(self, guild_id: int) -> Optional[int]:
+        """Last number this process handed out for the guild, None if it hasn't opened one yet."""
+        n = self._next.get(guild_id)
+        return n - 1 if n else None
+
+
+ticket_numbers = TicketNumberAllocator(TICKET_NUM_BLOCK)
+
+
+# ================================================================== config cache
+
+# cached per guild; ticket_counter is left out — it moves with every block reservation
+CONFIG_COLUMNS = (
+    'guild_id', 'ticket_category_id', 'log_channel_id', 'verify_unverified_id',
+    'verify_verified_id', 'verify_member_id', 'verify_channel_id', 'welcome_channel_id',
+)
+CONFIG_CHANNEL = 'config_changed'   # NOTIFY channel raised by the config_notify trigger
+
+
+class ConfigCache:
+    """
+    guild_id -> config row, loaded on connect so hot paths never query `config`.
+    Writers put() the row they just stored; other processes hear about the change
+    through the config_notify trigger and reload that guild.
+    """
+    def __init__(self):
+        self._by_guild: dict = {}
+
+    def __len__(self):
+        return len(self._by_guild)
+
+    async def load(self, db):
+        rows = await db.load_config()
+        self._by_guild = {r['guild_id']: {col: r.get(col) for col in CONFIG_COLUMNS} for r in rows}
+        logger.info(f'config cache loaded  •  {len(rows)} guild(s)')
+
+    async def refresh(self, db, guild_id: int):
+        row = await db.get_config(guild_id)
+        if row:
+            self.put(row)
+        else:
+            self._by_guild.pop(guild_id, None)
+
+    def get(self, guild_id: int) -> Optional[dict]:
+        return self._by_guild.get(guild_id)
+
+    def put(self, row):
+        self._by_guild[row['guild_id']] = {col: row.get(col) for col in CONFIG_COLUMNS}
+
+
+config_cache = ConfigCache()
+
 
-class Database:
-    pool: Optional[asyncpg.Pool] = None
+# ================================================================== blacklist cache
+
+BLACKLIST_CHANNEL = 'blacklist_changed'   # NOTIFY channel raised by the blacklist_notify trigger
+
+
+class BlacklistCache:
+    """
+    guild_id -> set of blacklisted user ids. Lets pre_open_checks skip the blacklist
+    lookup for everyone not on it; the full row is only read for actual hits.
+    """
+    def __init__(self):
+        self._by_guild = defaultdict(set)
+
+    async def load(self, db):
+        rows = await db.load_blacklist()
+        by_guild = defaultdict(set)
+        for r in rows:
+            by_guild[r['guild_id']].add(r['user_id'])
+        self._by_guild = by_guild
+        logger.info(f'blacklist cache loaded  •  {len(rows)} entr{"y" if len(rows) == 1 else "ies"}')
+
+    def has(self, guild_id: int, user_id: int) -> bool:
+        return user_id in self._by_guild.get(guild_id, ())
+
+    def add(self, guild_id: int, user_id: int):
+        self._by_guild[guild_id].add(user_id)
+
+    def discard(self, guild_id: int, user_id: int):
+        self._by_guild[guild_id].discard(user_id)
+
+
+blacklist_cache = BlacklistCache()
+
+
+# ================================================================== custom invite cache
+
+class CustomInviteCache:
+    """
+    guild_id -> {code: owner user id} for the whole custom_invites table, so the
+    attribution override on every join is a dict lookup. createcustomlink is the
+    only writer and goes through Storage.set_custom_invite, which keeps this current.
+    """
+    def __init__(self):
+        self._by_guild = defaultdict(dict)
+
+    async def load(self, db):
+        rows = await db.load_custom_invites()
+        by_guild = defaultdict(dict)
+        for r in rows:
+            by_guild[r['guild_id']][r['code']] = r['user_id']
+        self._by_guild = by_guild
+        logger.info(f'custom invite cache loaded  •  {len(rows)} code(s)')
+
+    def owner(self, guild_id: int, code: str) -> Optional[int]:
+        return self._by_guild.get(guild_id, {}).get(code)
+
+    def put(self, guild_id: int, code: str, user_id: int):
+        """Points `code` at `user_id`, dropping the member's previous custom code."""
+        codes = self._by_guild[guild_id]
+        for old in [c for c, uid in codes.items() if uid == user_id]:
+            del codes[old]
+        codes[code] = user_id
+
+
+custom_invite_cache = CustomInviteCache()
+
+
+# ================================================================== pool instrumentation
+
+# command currently being handled — set in before_invoke, read when a statement is traced
+current_command: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_command', default=None)
+# pool lane for statements issued by the current task — member events switch it to 'background'
+current_lane: contextvars.ContextVar[str] = contextvars.ContextVar('current_lane', default='interactive')
+
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r'(?<![$\w])\d+(?:\.\d+)?\b')
+_SQL_SPACE  = re.compile(r'\s+')
+
+
+def sql_fingerprint(sql: str) -> str:
+    """SQL with literals replaced by ? and whitespace collapsed — $n placeholders are kept."""
+    sql = _SQL_STRING.sub('?', sql)
+    sql = _SQL_NUMBER.sub('?', sql)
+    return _SQL_SPACE.sub(' ', sql).strip()
+
+
+def _redact(args) -> str:
+    # types and sizes only — parameters carry user ids, reasons and trade details
+    out = []
+    for i, a in enumerate(args, 1):
+        size = f'({len(a)})' if isinstance(a, (str, bytes, list, tuple)) else ''
+        out.append(f'${i}={type(a).__name__}{size}')
+    return ', '.join(out)
+
+
+class QueryStats:
+    """
+    Per-fingerprint call counts, total / max time, a latency histogram and the
+    commands that issued it. Statements slower than DB_SLOW_MS are logged.
+    """
+    BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))   # ms upper bounds
+
+    def __init__(self):
+        self._fp    = {}    # raw sql -> fingerprint
+        self.stats  = {}    # fingerprint -> {'n', 'total', 'max', 'errors', 'hist', 'tags'}
+
+    def fingerprint(self, sql: str) -> str:
+        fp = self._fp.get(sql)
+        if fp is None:
+            if len(self._fp) > 5000:
+                self._fp.clear()
+            fp = self._fp[sql] = sql_fingerprint(sql)
+        return fp
+
+    def record(self, sql: str, args, elapsed: float, tag: str, error: Optional[BaseException] = None):
+        fp = self.fingerprint(sql)
+        s  = self.stats.get(fp)
+        if s is None:
+            s = self.stats[fp] = {'n': 0, 'total': 0.0, 'max': 0.0, 'errors': 0,
+                                  'hist': [0] * len(self.BUCKETS), 'tags': defaultdict(int)}
+        ms = elapsed * 1000
+        s['n']     += 1
+        s['total'] += ms
+        s['max']    = max(s['max'], ms)
+        s['tags'][tag] += 1
+        s['hist'][next(i for i, b in enumerate(self.BUCKETS) if ms <= b)] += 1
+        if error is not None:
+            s['errors'] += 1
+            logger.warning(f'db error  •  {type(error).__name__}: {error}  •  {tag}  •  {fp[:200]}  •  {_redact(args)}')
+        elif ms > DB_SLOW_MS:
+            logger.warning(f'slow query  •  {ms:.0f}ms  •  {tag}  •  {fp[:200]}  •  {_redact(args)}')
+
+    def pct(self, fp: str, q: float) -> float:
+        """Upper bound of the histogram bucket holding the q-th quantile."""
+        s      = self.stats[fp]
+        target = q * s['n']
+        seen   = 0
+        for b, count in zip(self.BUCKETS, s['hist']):
+            seen += count
+            if seen >= target:
+                return b if b != float('inf') else s['max']
+        return s['max']
+
+    def top(self, n: int = 10) -> list:
+        return sorted(self.stats.items(), key=lambda kv: kv[1]['total'], reverse=True)[:n]
+
+
+query_stats = QueryStats()
+
+
+class _TimedConnection:
+    """
+    Proxy over a pooled connection. Times every statement into query_stats and adds
+    up DB time so the acquire wrapper can tell it apart from time held across other awaits.
+    """
+    __slots__ = ('_conn', '_tag', 'db_time')
+    _TIMED = frozenset({'fetch', 'fetchrow', 'fetchval', 'execute', 'executemany'})
+
+    def __init__(self, conn, tag: str):
+        self._conn   = conn
+        self._tag    = tag
+        self.db_time = 0.0
+
+    def record(self, sql: str, args: tuple, seconds: float, error: Optional[Exception] = None):
+        """Books one statement's DB time — the timed methods use it, as does anything driving a cursor."""
+        self.db_time += seconds
+        query_stats.record(sql, args, seconds, self._tag, error)
+
+    def __getattr__(self, name):
+        attr = getattr(self._conn, name)
+        if name not in self._TIMED:
+            return attr
+
+        async def timed(sql, *args, **kwargs):
+            t0    = _time.perf_counter()
+            error = None
+            try:
+                return await attr(sql, *args, **kwargs)
+            except Exception as ex:
+                error = ex
+                raise
+            finally:
+                self.record(sql, args, _time.perf_counter() - t0, error)
+        return timed
+
+
+class PoolStats:
+    """
+    Wait / hold timings per lane and per call site.
+    A connection whose hold time minus DB time exceeds DB_IDLE_HOLD_MS was kept
+    across non-DB awaits (Discord HTTP, sleeps) and is logged once per call site.
+    """
+    def __init__(self):
+        self.sites  = defaultdict(lambda: {'n': 0, 'wait': 0.0, 'hold': 0.0, 'max_wait': 0.0, 'max_hold': 0.0, 'idle_holds': 0})
+        self.waits  = defaultdict(lambda: deque(maxlen=2000))   # lane -> recent wait times (ms)
+        self.in_use = defaultdict(int)                           # lane -> connections checked out now
+        self.peak   = defaultdict(int)                           # lane -> max in_use since last report
+
+    def enter(self, lane: str, wait: float):
+        self.waits[lane].append(wait * 1000)
+        self.in_use[lane] += 1
+        self.peak[lane] = max(self.peak[lane], self.in_use[lane])
+
+    def exit(self, lane: str, site: str, wait: float, hold: float, db_time: float):
+        self.in_use[lane] -= 1
+        s = self.sites[site]
+        s['n']        += 1
+        s['wait']     += wait
+        s['hold']     += hold
+        s['max_wait']  = max(s['max_wait'], wait)
+        s['max_hold']  = max(s['max_hold'], hold)
+        idle_ms = (hold - db_time) * 1000
+        if idle_ms > DB_IDLE_HOLD_MS:
+            if not s['idle_holds']:
+                logger.warning(f'db connection held {idle_ms:.0f}ms across non-DB awaits  •  {site}')
+            s['idle_holds'] += 1
+
+    def wait_pct(self, lane: str, q: float) -> float:
+        w = sorted(self.waits[lane])
+        if not w:
+            return 0.0
+        return w[min(len(w) - 1, int(q * len(w)))]
+
+
+pool_stats = PoolStats()
+
+
+class _Acquire:
+    """Async context manager returned by Database.acquire()."""
+    __slots__ = ('pool', 'lane', 'site', '_cm', '_conn', '_t0', '_t1')
+
+    def __init__(self, pool, lane: str, site: str):
+        self.pool = pool
+        self.lane = lane
+        self.site = site
+
+    async def __aenter__(self):
+        self._t0 = _time.perf_counter()
+        self._cm = self.pool.acquire()
+        conn     = await self._cm.__aenter__()
+        self._t1 = _time.perf_counter()
+        pool_stats.enter(self.lane, self._t1 - self._t0)
+        self._conn = _TimedConnection(conn, current_command.get() or self.site.rpartition('/')[2].split(':')[0])
+        return self._conn
+
+    async def __aexit__(self, *exc):
+        hold = _time.perf_counter() - self._t1
+        try:
+            return await self._cm.__aexit__(*exc)
+        finally:
+            pool_stats.exit(self.lane, self.site, self._t1 - self._t0, hold, self._conn.db_time)
+
+
+# ================================================================== counter buffer
+
+# table -> (key column, counter columns); every counter is a plain `col = col + n` bump
+COUNTER_TABLES = {
+    'invite_stats':     ('inviter_id', ('joins', 'leaves', 'fake', 'rejoins', 'verified', 'unattributed')),
+    'ticket_stats':     ('user_id',    ('claimed', 'closed', 'total_rating', 'rating_count')),
+    'invite_breakdown': ('inviter_id', ('joins', 'departed', 'rejoins', 'fake', 'verified', 'unverified')),
+}
+
+# member_invites.state -> the invite_breakdown column that member is counted in.
+# A member's state is the first that applies: rejoin, left, fake (account < 3 days at join), verified, unverified.
+INVITE_STATE_COLUMN = {
+    'rejoin':     'rejoins',
+    'left':       'departed',
+    'fake':       'fake',
+    'verified':   'verified',
+    'unverified': 'unverified',
+}
 
-    async def connect(self, retries: int = 5, delay: int = 4):
-        url = os.getenv('DATABASE_URL', '')
+
+def counter_upsert_sql(table: str) -> str:
+    """Multi-row upsert for `table`: $1 guild ids, $2 key ids, then one delta array per counter column."""
+    key_col, cols = COUNTER_TABLES[table]
+    return (
+        f'''INSERT INTO {table} AS t (guild_id, {key_col}, {', '.join(cols)})
+            SELECT * FROM unnest({', '.join(f'${i}::bigint[]' for i in range(1, len(cols) + 3))})
+            ON CONFLICT (guild_id, {key_col}) DO UPDATE
+            SET {', '.join(f'{col} = t.{col} + EXCLUDED.{col}' for col in cols)}'''
+    )
+
+
+class CounterBuffer:
+    """
+    Write-behind buffer for invite_stats / ticket_stats increments.
+    bump() merges deltas in memory keyed by (table, guild, id, column); flush() hands
+    the batch to db.apply_counters — one multi-row upsert per table on Postgres.
+    A failed flush merges its deltas back so nothing is lost while the process stays up.
+    """
+    def __init__(self):
+        self._pending  = defaultdict(lambda: defaultdict(int))   # (table, guild_id, id) -> {column: delta}
+        self._inflight = {}                                       # batch currently being written
+        self._oldest   = None                                     # perf_counter of the oldest pending bump
+        self._lock     = asyncio.Lock()
+        self.last_lag  = 0.0                                      # age of the oldest delta when last flushed
+        self.flushes   = 0
+        self.failures  = 0
+        self._versions = defaultdict(int)                         # (table, guild_id) -> bumps + discards so far
+
+    def bump(self, table: str, guild_id: int, key_id: int, **deltas):
+        row = self._pending[(table, guild_id, key_id)]
+        for col, n in deltas.items():
+            row[col] += n
+        if self._oldest is None:
+            self._oldest = _time.perf_counter()
+        self._versions[(table, guild_id)] += 1
+
+    def version(self, table: str, guild_id: int) -> int:
+        """Changes whenever a guild's counters in `table` do — cheap staleness check for derived views."""
+        return self._versions[(table, guild_id)]
+
+    def overlay(self, table: str, guild_id: int, key_id: int, row) -> dict:
+        """`row` as read from the DB (or None) with this process's unflushed deltas added."""
+        out = {col: (row.get(col) if row else None) or 0 for col in COUNTER_TABLES[table][1]}
+        for batch in (self._inflight, self._pending):
+            for col, n in batch.get((table, guild_id, key_id), {}).items():
+                out[col] += n
+        return out
+
+    def discard(self, table: str, guild_id: int, key_id: Optional[int] = None):
+        """Forget pending deltas after their rows were deleted (e.g. $clearinvites)."""
+        for key in [k for k in self._pending if k[0] == table and k[1] == guild_id and key_id in (None, k[2])]:
+            del self._pending[key]
+        if not self._pending:
+            self._oldest = None
+        self._versions[(table, guild_id)] += 1
+
+    def lag(self) -> float:
+        """Seconds the oldest unflushed delta has been waiting."""
+        return _time.perf_counter() - self._oldest if self._oldest is not None else 0.0
+
+    async def flush(self, db):
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            started, self._oldest = self._oldest, None
+            self._inflight = batch
+            try:
+                await db.apply_counters(batch)
+            except Exception as ex:
+                for key, cols in batch.items():
+                    for col, n in cols.items():
+                        self._pending[key][col] += n
+                self._oldest   = min(started, self._oldest or started)
+                self.failures += 1
+                logger.error(f'counter flush ({len(batch)} row(s)): {ex}')
+                return
+            finally:
+                self._inflight = {}
+            self.last_lag = _time.perf_counter() - started
+            self.flushes += 1
+
+
+counters = CounterBuffer()
+
+
+# ================================================================== transcript buffer
+
+TRANSCRIPT_COLUMNS = ('guild_id', 'channel_id', 'message_id', 'event', 'author_id', 'author_name', 'content', 'attachments', 'at')
+
+
+class TranscriptBuffer:
+    """
+    Everything said in ticket channels, captured as it happens: each message, edit and
+    delete becomes a TRANSCRIPT_COLUMNS row. flush() writes the backlog to ticket_messages
+    in one statement; closing a ticket flushes and reads its rows back instead of paging
+    channel history, then seals the channel so stragglers aren't written after its rows
+    are deleted. A failed flush keeps its rows, in order, for the next one. At most
+    TRANSCRIPT_PENDING_MAX rows wait; past that rows are dropped and their channel is
+    marked lossy, so its transcript is rebuilt from channel history at close.
+    """
+    def __init__(self):
+        self._pending = []
+        self._sealed  = {}   # channel_id -> None, oldest first; bounded like the snipe caches
+        self.lossy    = set()   # channels that lost rows to the cap
+        self.dropped  = 0
+        self._lock    = asyncio.Lock()
+        self.rows     = 0
+        self.flushes  = 0
+        self.failures = 0
+        self.builds   = 0                      # transcripts built at close
+        self.built    = 0                      # bytes uploaded for them
+        self.timings  = deque(maxlen=256)      # recent build seconds
+
+    def add(self, guild_id: int, channel_id: int, message_id: int, event: str, author_id: Optional[int] = None,
+            author_name: Optional[str] = None, content: Optional[str] = None, attachments=(), at: Optional[datetime] = None):
+        if channel_id in self._sealed:
+            return
+        if len(self._pending) >= TRANSCRIPT_PENDING_MAX:
+            self.dropped += 1
+            self.lossy.add(channel_id)
+            return
+        self._pending.append((
+            guild_id, channel_id, message_id, event, author_id, author_name, content,
+            '\n'.join(attachments) or None, at.astimezone(timezone.utc).replace(tzinfo=None) if at else _utcnow(),
+        ))
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record_build(self, size: int, seconds: float):
+        self.builds += 1
+        self.built  += size
+        self.timings.append(seconds)
+
+    def build_pct(self, q: float) -> float:
+        t = sorted(self.timings)
+        if not t:
+            return 0.0
+        return t[min(len(t) - 1, int(q * len(t)))] * 1000
+
+    def seal(self, channel_ids):
+        """Stop capturing these (closed) channels and drop anything of theirs not yet written."""
+        for ch_id in channel_ids:
+            if len(self._sealed) >= 1000:
+                self._sealed.pop(next(iter(self._sealed)), None)
+            self._sealed[ch_id] = None
+            self.lossy.discard(ch_id)
+        self._pending = [row for row in self._pending if row[1] not in self._sealed]
+
+    async def backfill(self, db, channels: list) -> int:
+        """
+        After a fresh gateway session (events from the gap are not replayed), append what
+        each open ticket channel received after its newest captured message. Channels with
+        nothing captured are left to save_transcript's full history read.
+        """
+        await self.flush(db)
+        last  = await db.last_ticket_messages([ch.id for ch in channels])
+        added = 0
+        for ch in channels:
+            if ch.id not in last:
+                continue
+            try:
+                async for m in ch.history(limit=None, after=discord.Object(last[ch.id]), oldest_first=True):
+                    self.add(ch.guild.id, ch.id, m.id, 'message', m.author.id, m.author.name,
+                             m.content, [a.url for a in m.attachments], m.created_at)
+                    added += 1
+            except discord.HTTPException as ex:
+                logger.warning(f'transcript backfill {ch.id}: {ex}')
+        return added
+
+    async def flush(self, db):
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                await db.append_ticket_messages(batch)
+            except Exception as ex:
+                self._pending = batch + self._pending
+                if len(self._pending) > TRANSCRIPT_PENDING_MAX:
+                    over           = self._pending[TRANSCRIPT_PENDING_MAX:]
+                    self._pending  = self._pending[:TRANSCRIPT_PENDING_MAX]
+                    self.dropped  += len(over)
+                    self.lossy.update(row[1] for row in over)
+                self.failures += 1
+                logger.error(f'transcript flush ({len(batch)} row(s)): {ex}')
+                return
+            self.rows    += len(batch)
+            self.flushes += 1
+
+
+transcripts = TranscriptBuffer()
+
+
+# ================================================================== schema migrations
+
+class MigrationError(RuntimeError):
+    """A schema migration failed — the bot must not start on a half-migrated schema."""
+
+
+SCHEMA_LOCK_ID = 0x4D4D424F54   # pg advisory lock key held while migrating
+
+# (version, name, statements) — append only; never edit an entry once it has shipped.
+# v1 is the schema the old DDL-on-boot _setup produced, written idempotently so
+# databases created by it are adopted without changes.
+MIGRATIONS = [
+    (1, 'base schema', [
+        '''CREATE TABLE IF NOT EXISTS config (
+            guild_id           BIGINT PRIMARY KEY,
+            ticket_category_id BIGINT,
+            log_channel_id     BIGINT,
+            ticket_counter     INT DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS tickets (
+            ticket_id     TEXT PRIMARY KEY,
+            guild_id      BIGINT,
+            channel_id    BIGINT,
+            user_id       BIGINT,
+            ticket_type   TEXT,
+            tier          TEXT,
+            claimed_by    BIGINT,
+            status        TEXT DEFAULT 'open',
+            trade_details JSONB,
+            created_at    TIMESTAMP DEFAULT NOW()
+        )''',
+        '''CREATE TABLE IF NOT EXISTS blacklist (
+            user_id        BIGINT,
+            guild_id       BIGINT,
+            reason         TEXT,
+            blacklisted_by BIGINT,
+            created_at     TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (user_id, guild_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS invite_stats (
+            guild_id   BIGINT,
+            inviter_id BIGINT,
+            joins      INT DEFAULT 0,
+            leaves     INT DEFAULT 0,
+            fake       INT DEFAULT 0,
+            rejoins    INT DEFAULT 0,
+            verified   INT DEFAULT 0,
+            PRIMARY KEY (guild_id, inviter_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS member_invites (
+            guild_id   BIGINT,
+            user_id    BIGINT,
+            inviter_id BIGINT,
+            is_rejoin  BOOLEAN DEFAULT FALSE,
+            joined_at  TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (guild_id, user_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS member_left (
+            guild_id BIGINT,
+            user_id  BIGINT,
+            left_at  TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (guild_id, user_id)
+        )''',
+        'ALTER TABLE config ADD COLUMN IF NOT EXISTS ticket_counter INT DEFAULT 0',
+        'ALTER TABLE config ADD COLUMN IF NOT EXISTS verify_unverified_id BIGINT',
+        'ALTER TABLE config ADD COLUMN IF NOT EXISTS verify_verified_id BIGINT',
+        'ALTER TABLE config ADD COLUMN IF NOT EXISTS verify_member_id BIGINT',
+        'ALTER TABLE config ADD COLUMN IF NOT EXISTS verify_channel_id BIGINT',
+        'ALTER TABLE config ADD COLUMN IF NOT EXISTS welcome_channel_id BIGINT',
+        'ALTER TABLE blacklist ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW()',
+        'ALTER TABLE invite_stats ADD COLUMN IF NOT EXISTS rejoins INT DEFAULT 0',
+        'ALTER TABLE invite_stats ADD COLUMN IF NOT EXISTS verified INT DEFAULT 0',
+        'ALTER TABLE member_invites ADD COLUMN IF NOT EXISTS is_rejoin BOOLEAN DEFAULT FALSE',
+        '''CREATE TABLE IF NOT EXISTS ticket_stats (
+            guild_id BIGINT,
+            user_id  BIGINT,
+            claimed  INT DEFAULT 0,
+            closed   INT DEFAULT 0,
+            PRIMARY KEY (guild_id, user_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS ticket_ratings (
+            guild_id   BIGINT,
+            ticket_id  TEXT,
+            claimer_id BIGINT,
+            user_id    BIGINT,
+            rating     INT,
+            PRIMARY KEY (guild_id, ticket_id)
+        )''',
+        'ALTER TABLE ticket_stats ADD COLUMN IF NOT EXISTS total_rating BIGINT DEFAULT 0',
+        'ALTER TABLE ticket_stats ADD COLUMN IF NOT EXISTS rating_count INT DEFAULT 0',
+        '''CREATE TABLE IF NOT EXISTS custom_invites (
+            guild_id   BIGINT NOT NULL,
+            code       TEXT NOT NULL,
+            user_id    BIGINT NOT NULL,
+            created_by BIGINT NOT NULL,
+            PRIMARY KEY (guild_id, code)
+        )''',
+    ]),
+    (2, 'verifications table', [
+        '''CREATE TABLE IF NOT EXISTS verifications (
+            guild_id    BIGINT,
+            user_id     BIGINT,
+            verified_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (guild_id, user_id)
+        )''',
+    ]),
+    (3, 'hot path indexes', [
+        'CREATE INDEX IF NOT EXISTS tickets_channel_idx ON tickets (channel_id)',
+        'CREATE INDEX IF NOT EXISTS tickets_user_open_idx ON tickets (user_id, guild_id, status)',
+        'CREATE INDEX IF NOT EXISTS member_invites_inviter_idx ON member_invites (guild_id, inviter_id)',
+        'CREATE INDEX IF NOT EXISTS invite_stats_real_idx ON invite_stats (guild_id, (joins - leaves - fake) DESC)',
+    ]),
+    (4, 'config change notify', [
+        f'''CREATE OR REPLACE FUNCTION config_notify() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify('{CONFIG_CHANNEL}', COALESCE(NEW.guild_id, OLD.guild_id)::text);
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql''',
+        'DROP TRIGGER IF EXISTS config_notify ON config',
+        # ticket_counter is deliberately not listed — block reservations must not fan out
+        '''CREATE TRIGGER config_notify
+            AFTER INSERT OR DELETE OR UPDATE OF ticket_category_id, log_channel_id, verify_unverified_id,
+                verify_verified_id, verify_member_id, verify_channel_id, welcome_channel_id
+            ON config FOR EACH ROW EXECUTE FUNCTION config_notify()''',
+    ]),
+    (5, 'blacklist change notify', [
+        f'''CREATE OR REPLACE FUNCTION blacklist_notify() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    PERFORM pg_notify('{BLACKLIST_CHANNEL}', 'del:' || OLD.guild_id || ':' || OLD.user_id);
+                ELSE
+                    PERFORM pg_notify('{BLACKLIST_CHANNEL}', 'add:' || NEW.guild_id || ':' || NEW.user_id);
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql''',
+        'DROP TRIGGER IF EXISTS blacklist_notify ON blacklist',
+        '''CREATE TRIGGER blacklist_notify
+            AFTER INSERT OR DELETE ON blacklist
+            FOR EACH ROW EXECUTE FUNCTION blacklist_notify()''',
+    ]),
+    # closed tickets move here so `tickets` only holds live rows; the archive job finds them
+    # through the partial index, which stays as small as the backlog of not-yet-moved rows
+    (6, 'tickets archive', [
+        '''CREATE TABLE IF NOT EXISTS tickets_archive (
+            LIKE tickets INCLUDING DEFAULTS,
+            archived_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (guild_id, ticket_id)
+        )''',
+        "CREATE INDEX IF NOT EXISTS tickets_closed_idx ON tickets (ticket_id) WHERE status='closed'",
+    ]),
+    (7, 'invite uses', [
+        '''CREATE TABLE IF NOT EXISTS invite_uses (
+            guild_id   BIGINT,
+            code       TEXT,
+            uses       INT DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (guild_id, code)
+        )''',
+        # uses gained while the bot was offline: no member row exists for them, so they are kept
+        # out of joins (and of invite_breakdown) and reported on their own
+        'ALTER TABLE invite_stats ADD COLUMN IF NOT EXISTS unattributed INT DEFAULT 0',
+    ]),
+    # per-member state plus per-inviter counts of each, so $invites / $invited never scan an inviter's rows;
+    # existing rows are classified once here (account age comes from the snowflake)
+    (8, 'invite breakdown', [
+        'ALTER TABLE member_invites ADD COLUMN IF NOT EXISTS state TEXT',
+        '''UPDATE member_invites m SET state = CASE
+               WHEN m.is_rejoin THEN 'rejoin'
+               WHEN EXISTS (SELECT 1 FROM member_left l WHERE l.guild_id=m.guild_id AND l.user_id=m.user_id) THEN 'left'
+               WHEN m.joined_at < to_timestamp(((m.user_id >> 22) + 1420070400000) / 1000.0)::timestamp
+                                  + INTERVAL '3 days' THEN 'fake'
+               WHEN EXISTS (SELECT 1 FROM verifications v WHERE v.guild_id=m.guild_id AND v.user_id=m.user_id) THEN 'verified'
+               ELSE 'unverified'
+           END
+           WHERE m.state IS NULL''',
+        '''CREATE TABLE IF NOT EXISTS invite_breakdown (
+            guild_id   BIGINT,
+            inviter_id BIGINT,
+            joins      INT DEFAULT 0,
+            departed   INT DEFAULT 0,
+            rejoins    INT DEFAULT 0,
+            fake       INT DEFAULT 0,
+            verified   INT DEFAULT 0,
+            unverified INT DEFAULT 0,
+            PRIMARY KEY (guild_id, inviter_id)
+        )''',
+        '''INSERT INTO invite_breakdown (guild_id, inviter_id, joins, departed, rejoins, fake, verified, unverified)
+           SELECT guild_id, inviter_id, COUNT(*),
+                  COUNT(*) FILTER (WHERE state='left'),
+                  COUNT(*) FILTER (WHERE state='rejoin'),
+                  COUNT(*) FILTER (WHERE state='fake'),
+                  COUNT(*) FILTER (WHERE state='verified'),
+                  COUNT(*) FILTER (WHERE state='unverified')
+           FROM member_invites GROUP BY guild_id, inviter_id
+           ON CONFLICT (guild_id, inviter_id) DO NOTHING''',
+        # keyset pages of $invited; the (guild_id, inviter_id) index is a prefix of it
+        'CREATE INDEX IF NOT EXISTS member_invites_page_idx ON member_invites (guild_id, inviter_id, joined_at DESC, user_id DESC)',
+        'DROP INDEX IF EXISTS member_invites_inviter_idx',
+    ]),
+    # the real count as a stored column, so $lb is a top-N walk of one index and $myrank a
+    # count over the prefix above a user; INCLUDE keeps both index-only
+    (9, 'invite rank index', [
+        '''ALTER TABLE invite_stats ADD COLUMN IF NOT EXISTS real_invites INT
+           GENERATED ALWAYS AS (COALESCE(joins, 0) - COALESCE(leaves, 0) - COALESCE(fake, 0)) STORED''',
+        '''CREATE INDEX IF NOT EXISTS invite_stats_rank_idx ON invite_stats (guild_id, real_invites DESC, inviter_id)
+           INCLUDE (joins, leaves, fake, rejoins, verified)''',
+        'DROP INDEX IF EXISTS invite_stats_real_idx',
+    ]),
+    # ticket channel traffic captured live (TranscriptBuffer) or backfilled from history after a
+    # gateway reconnect; a ticket's rows are read back in time order at close, then deleted
+    (10, 'ticket messages', [
+        '''CREATE TABLE IF NOT EXISTS ticket_messages (
+            id          BIGSERIAL PRIMARY KEY,
+            guild_id    BIGINT,
+            channel_id  BIGINT,
+            message_id  BIGINT,
+            event       TEXT,
+            author_id   BIGINT,
+            author_name TEXT,
+            content     TEXT,
+            attachments TEXT,
+            at          TIMESTAMP DEFAULT NOW()
+        )''',
+        'CREATE INDEX IF NOT EXISTS ticket_messages_channel_idx ON ticket_messages (channel_id, at, id)',
+    ]),
+]
+
+
+# ================================================================== storage
+
+class Storage(ABC):
+    """
+    Everything the bot persists, as one interface. Database is the Postgres
+    implementation; MemoryStorage keeps the same data in dicts so hot paths can be
+    load-tested without a server (STORAGE_BACKEND=memory). Rows are mappings —
+    row['col'] and row.get('col') work on both. Methods that change open tickets,
+    config or the blacklist keep ticket_cache / config_cache / blacklist_cache current.
+    """
+    pool      = None
+    bg_pool   = None
+    connected = False
+
+    @abstractmethod
+    async def connect(self): ...
+
+    async def close(self):
+        self.connected = False
+
+    async def warm_caches(self):
+        await ticket_cache.load(self)
+        await config_cache.load(self)
+        await blacklist_cache.load(self)
+        await custom_invite_cache.load(self)
+        rows = await self.load_invite_uses()
+        for r in rows:
+            invite_cache.setdefault(r['guild_id'], {})[r['code']] = r['uses']
+        logger.info(f'invite cache loaded  •  {len(rows)} code(s)')
+
+    async def next_num(self, guild_id: int) -> int:
+        return await ticket_numbers.next(self, guild_id)
+
+    # ── tickets ──
+    @abstractmethod
+    async def load_open_tickets(self) -> list: ...
+    @abstractmethod
+    async def reserve_ticket_numbers(self, guild_id: int, block: int) -> int: ...
+    @abstractmethod
+    async def get_ticket(self, channel_id: int): ...
+    @abstractmethod
+    async def insert_ticket(self, ticket_id: str, guild_id: int, channel_id: int, user_id: int,
+                            ticket_type: str, tier: str, trade_details: str = None) -> TicketRecord: ...
+    @abstractmethod
+    async def claim_ticket(self, ticket, user_id: int) -> tuple[bool, Optional[int]]: ...
+    @abstractmethod
+    async def unclaim_ticket(self, ticket) -> bool: ...
+    @abstractmethod
+    async def transfer_ticket(self, ticket, to_id: int) -> bool: ...
+    @abstractmethod
+    async def close_ticket(self, ticket): ...
+    @abstractmethod
+    async def open_state(self, guild_id: int, user_id: int) -> tuple: ...
+    @abstractmethod
+    async def stale_open_tickets(self) -> list: ...
+    @abstractmethod
+    async def close_tickets(self, rows): ...
+    @abstractmethod
+    async def ticket_totals(self, guild_id: int) -> dict: ...
+    @abstractmethod
+    async def archive_closed_tickets(self, limit: int) -> int: ...
+
+    # ── transcripts ──
+    @abstractmethod
+    async def append_ticket_messages(self, rows: list): ...
+    @abstractmethod
+    async def ticket_messages(self, channel_id: int, after: Optional[tuple] = None, limit: int = TRANSCRIPT_PAGE) -> list: ...
+    @abstractmethod
+    async def last_ticket_messages(self, channel_ids: list) -> dict: ...
+    @abstractmethod
+    async def drop_ticket_messages(self, channel_ids: list): ...
+
+    # ── config ──
+    @abstractmethod
+    async def load_config(self) -> list: ...
+    @abstractmethod
+    async def get_config(self, guild_id: int): ...
+    @abstractmethod
+    async def set_config(self, guild_id: int, column: str, value): ...
+
+    # ── blacklist ──
+    @abstractmethod
+    async def load_blacklist(self) -> list: ...
+    @abstractmethod
+    async def add_blacklist(self, guild_id: int, user_id: int, reason: str, by: int): ...
+    @abstractmethod
+    async def remove_blacklist(self, guild_id: int, user_id: int) -> bool: ...
+    @abstractmethod
+    async def list_blacklist(self, guild_id: int) -> list: ...
+
+    # ── invites ──
+    @abstractmethod
+    async def invitees_page(self, guild_id: int, inviter_id: int, limit: int, after: Optional[tuple] = None) -> list: ...
+    @abstractmethod
+    async def member_invite(self, guild_id: int, user_id: int): ...
+    @abstractmethod
+    async def invite_leaderboard(self, guild_id: int, limit: int = 10) -> list: ...
+    @abstractmethod
+    async def invite_rank(self, guild_id: int, inviter_id: int, real: int): ...
+    @abstractmethod
+    async def get_invite_stats(self, guild_id: int, inviter_id: int): ...
+    @abstractmethod
+    async def clear_invites(self, guild_id: int, inviter_id: Optional[int] = None): ...
+    @abstractmethod
+    async def load_custom_invites(self) -> list: ...
+    @abstractmethod
+    async def set_custom_invite(self, guild_id: int, code: str, user_id: int, created_by: int): ...
+    @abstractmethod
+    async def record_join(self, guild_id: int, user_id: int, inviter_id: int, new_account: bool): ...
+    @abstractmethod
+    async def record_leave(self, guild_id: int, user_id: int): ...
+    @abstractmethod
+    async def record_verification(self, guild_id: int, user_id: int) -> Optional[int]: ...
+    @abstractmethod
+    async def set_invite_state(self, guild_id: int, user_id: int, state: str, from_states: tuple): ...
+    @abstractmethod
+    async def verify_invitees(self, guild_id: int, user_ids: list) -> list: ...
+    @abstractmethod
+    async def get_invite_breakdown(self, guild_id: int, inviter_id: int): ...
+    @abstractmethod
+    async def load_invite_uses(self) -> list: ...
+    @abstractmethod
+    async def put_invite_uses(self, guild_id: int, uses: dict, prune: bool = False): ...
+    @abstractmethod
+    async def drop_invite_use(self, guild_id: int, code: str): ...
+
+    # ── stats / ratings ──
+    @abstractmethod
+    async def get_ticket_stats(self, guild_id: int, user_id: int): ...
+    @abstractmethod
+    async def rating_exists(self, guild_id: int, ticket_id: str) -> bool: ...
+    @abstractmethod
+    async def add_rating(self, guild_id: int, ticket_id: str, claimer_id: int, user_id: int, rating: int) -> bool: ...
+    @abstractmethod
+    async def apply_counters(self, batch: dict): ...
+
+    # ── export ──
+    @abstractmethod
+    def export_rows(self, table: str, guild_id: Optional[int] = None):
+        """Async iterator of row-tuple chunks (EXPORT_TABLES[table] column order), at most EXPORT_CHUNK rows each."""
+
+
+# ================================================================== database
+
+class Database(Storage):
+    """Postgres storage over two instrumented asyncpg pools."""
+    pool:      Optional[asyncpg.Pool] = None   # interactive lane — commands, buttons, modals
+    bg_pool:   Optional[asyncpg.Pool] = None   # background lane — member events, cache loads, jobs
+    _url:      str = ''
+    _listener: Optional[asyncio.Task] = None   # LISTEN loop for config_changed
+    _codes:    Optional[frozenset] = None      # code objects of the class's methods, for acquire()'s call site
+
+    async def connect(self, retries: int = 5, delay: int = 4, url: Optional[str] = None,
+                      server_settings: Optional[dict] = None):
+        url = url or os.getenv('DATABASE_URL', '')
         if not url:
             raise RuntimeError('DATABASE_URL is not set')
         if url.startswith('postgres://'):
@@ -203,141 +1246,1171 @@ class Database:
             try:
                 self.pool = await asyncpg.create_pool(
                     url,
-                    min_size=1,
-                    max_size=5,
+                    min_size=DB_POOL_MIN,
+                    max_size=DB_POOL_MAX,
                     command_timeout=15,
                     max_inactive_connection_lifetime=300,
+                    server_settings=server_settings,
+                )
+                self.bg_pool = await asyncpg.create_pool(
+                    url,
+                    min_size=0,
+                    max_size=DB_BG_POOL_MAX,
+                    command_timeout=15,
+                    max_inactive_connection_lifetime=300,
+                    server_settings=server_settings,
                 )
                 await self._setup()
+                await self.warm_caches()
+                self.connected = True
+                self._url = url
+                if not self._listener:
+                    self._listener = asyncio.create_task(self._listen())
                 logger.info('database ready')
                 return
+            except MigrationError:
+                raise
             except Exception as ex:
                 logger.warning(f'db connect attempt {attempt}/{retries} failed: {ex}')
                 if attempt < retries:
                     await asyncio.sleep(delay)
         raise RuntimeError('database failed to connect after all retries')
 
+    async def close(self):
+        self.connected = False
+        if self._listener:
+            # awaited so the listener's own connection is closed before the pools are
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        for pool in (self.pool, self.bg_pool):
+            if pool:
+                await pool.close()
+
+    async def _listen(self):
+        """
+        LISTEN for config / blacklist changes on a dedicated connection (pooled ones get reset on release).
+        Every time LISTEN is (re)established both caches are reloaded, covering notifies sent before
+        it was up — since warm_caches(), or while a failed first connect was being retried. The
+        connection is closed whenever it is replaced and when the task is cancelled.
+        """
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self._url)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(CONFIG_CHANNEL, self._on_config_notify)
+                await conn.add_listener(BLACKLIST_CHANNEL, self._on_blacklist_notify)
+                await config_cache.load(self)
+                await blacklist_cache.load(self)
+                await lost.wait()
+                logger.warning('config listener connection lost — reconnecting')
+            except Exception as ex:
+                logger.warning(f'config listener: {ex}')
+            finally:
+                if conn is not None and not conn.is_closed():
+                    try:
+                        await conn.close(timeout=5)
+                    except Exception:
+                        conn.terminate()
+            await asyncio.sleep(5)
+
+    _notify_tasks: set = set()   # config refreshes in flight
+
+    def _on_config_notify(self, conn, pid, channel, payload):
+        task = asyncio.create_task(config_cache.refresh(self, int(payload)))
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+
+    def _on_blacklist_notify(self, conn, pid, channel, payload):
+        op, guild_id, user_id = payload.split(':')
+        if op == 'add':
+            blacklist_cache.add(int(guild_id), int(user_id))
+        else:
+            blacklist_cache.discard(int(guild_id), int(user_id))
+
+    def acquire(self, lane: Optional[str] = None) -> _Acquire:
+        """
+        Instrumented pool.acquire() — records wait / hold time against the caller.
+        lane='background' (or current_lane set by an event handler) draws from bg_pool
+        so bursts of member events never queue interactions. The call site is the first
+        frame outside this class plus the method it called, e.g. 'invites_cmd:4102/get_invite_stats'.
+        """
+        codes = Database._codes
+        if codes is None:
+            codes = Database._codes = frozenset(
+                getattr(fn, '__func__', fn).__code__ for cls in type(self).__mro__ for fn in vars(cls).values()
+                if hasattr(getattr(fn, '__func__', fn), '__code__')
+            )
+        f, method = sys._getframe(1), None
+        while f.f_back is not None and f.f_code in codes:
+            method, f = f.f_code.co_name, f.f_back
+        site = f'{f.f_code.co_name}:{f.f_lineno}' + (f'/{method}' if method else '')
+        lane = lane or current_lane.get()
+        pool = self.bg_pool if lane == 'background' else self.pool
+        return _Acquire(pool, lane, site)
+
     async def _setup(self):
-        async with self.pool.acquire() as c:
-            await c.execute('''
-                CREATE TABLE IF NOT EXISTS config (
-                    guild_id           BIGINT PRIMARY KEY,
-                    ticket_category_id BIGINT,
-                    log_channel_id     BIGINT,
-                    ticket_counter     INT DEFAULT 0
-                )
-            ''')
-            await c.execute('''
-                CREATE TABLE IF NOT EXISTS tickets (
-                    ticket_id     TEXT PRIMARY KEY,
-                    guild_id      BIGINT,
-                    channel_id    BIGINT,
-                    user_id       BIGINT,
-                    ticket_type   TEXT,
-                    tier          TEXT,
-                    claimed_by    BIGINT,
-                    status        TEXT DEFAULT 'open',
-                    trade_details JSONB,
-                    created_at    TIMESTAMP DEFAULT NOW()
-                )
-            ''')
-            await c.execute('''
-                CREATE TABLE IF NOT EXISTS blacklist (
-                    user_id        BIGINT,
-                    guild_id       BIGINT,
-                    reason         TEXT,
-                    blacklisted_by BIGINT,
-                    created_at     TIMESTAMP DEFAULT NOW(),
-                    PRIMARY KEY (user_id, guild_id)
-                )
-            ''')
-            await c.execute('''
-                CREATE TABLE IF NOT EXISTS invite_stats (
-                    guild_id   BIGINT,
-                    inviter_id BIGINT,
-                    joins      INT DEFAULT 0,
-                    leaves     INT DEFAULT 0,
-                    fake       INT DEFAULT 0,
-                    rejoins    INT DEFAULT 0,
-                    verified   INT DEFAULT 0,
-                    PRIMARY KEY (guild_id, inviter_id)
+        """
+        Applies pending MIGRATIONS in order, each in its own transaction.
+        When the schema is current this is a single SELECT and no DDL.
+        """
+        async with self.acquire() as c:
+            current = await self._schema_version(c)
+            latest  = MIGRATIONS[-1][0]
+            if current >= latest:
+                logger.info(f'schema current  •  v{current}')
+                return
+            # serialise concurrent boots so two processes never run the same migration
+            await c.execute('SELECT pg_advisory_lock($1)', SCHEMA_LOCK_ID)
+            try:
+                await c.execute('''
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version    INT PRIMARY KEY,
+                        name       TEXT,
+                        applied_at TIMESTAMP DEFAULT NOW()
+                    )
+                ''')
+                current = await self._schema_version(c)
+                for version, name, statements in MIGRATIONS:
+                    if version <= current:
+                        continue
+                    try:
+                        async with c.transaction():
+                            for sql in statements:
+                                await c.execute(sql)
+                            await c.execute(
+                                'INSERT INTO schema_version (version, name) VALUES ($1, $2)',
+                                version, name
+                            )
+                    except Exception as ex:
+                        raise MigrationError(f'migration v{version} ({name}) failed: {ex}') from ex
+                    logger.info(f'schema migration v{version} applied  •  {name}')
+            finally:
+                await c.execute('SELECT pg_advisory_unlock($1)', SCHEMA_LOCK_ID)
+
+    @staticmethod
+    async def _schema_version(c) -> int:
+        try:
+            return await c.fetchval('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+        except asyncpg.UndefinedTableError:
+            return 0
+
+    # ── tickets ──
+    async def load_open_tickets(self) -> list:
+        async with self.acquire('background') as c:
+            return await c.fetch("SELECT * FROM tickets WHERE status!='closed'")
+
+    async def reserve_ticket_numbers(self, guild_id: int, block: int) -> int:
+        """Advances the guild's counter by `block` and returns the last number of the reserved range."""
+        async with self.acquire() as c:
+            return await c.fetchval(
+                '''INSERT INTO config (guild_id, ticket_counter) VALUES ($1, $2)
+                   ON CONFLICT (guild_id) DO UPDATE
+                   SET ticket_counter = COALESCE(config.ticket_counter, 0) + $2
+                   RETURNING ticket_counter''',
+                guild_id, block
+            )
+
+    async def get_ticket(self, channel_id: int):
+        """Ticket row for a channel — served from ticket_cache, DB only on a miss."""
+        rec = ticket_cache.get(channel_id)
+        if rec:
+            return rec
+        async with self.acquire() as c:
+            row = await c.fetchrow('SELECT * FROM tickets WHERE channel_id = $1', channel_id)
+        return ticket_cache.put(row) if row else None
+
+    async def insert_ticket(self, ticket_id: str, guild_id: int, channel_id: int, user_id: int,
+                            ticket_type: str, tier: str, trade_details: str = None) -> TicketRecord:
+        async with self.acquire() as c:
+            row = await c.fetchrow(
+                '''INSERT INTO tickets (ticket_id, guild_id, channel_id, user_id, ticket_type, tier, trade_details)
+                   VALUES ($1,$2,$3,$4,$5,$6,$7) RETURNING *''',
+                ticket_id, guild_id, channel_id, user_id, ticket_type, tier, trade_details
+            )
+        return ticket_cache.put(row)
+
+    # ── claim state (one conditional statement each, so concurrent clicks can't both win) ──
+    async def claim_ticket(self, ticket, user_id: int) -> tuple[bool, Optional[int]]:
+        """
+        Claims an unclaimed ticket and bumps the claimer's stats in one round trip.
+        Returns (won, claimed_by). On a lost race claimed_by is the current holder
+        when Postgres can see it, otherwise None.
+        """
+        async with self.acquire() as c:
+            row = await c.fetchrow(
+                '''WITH won AS (
+                       UPDATE tickets SET claimed_by=$2, status='claimed'
+                       WHERE ticket_id=$1 AND claimed_by IS NULL AND status!='closed'
+                       RETURNING guild_id, claimed_by
+                   ), bump AS (
+                       INSERT INTO ticket_stats (guild_id, user_id, claimed)
+                       SELECT guild_id, claimed_by, 1 FROM won
+                       ON CONFLICT (guild_id, user_id) DO UPDATE SET claimed = ticket_stats.claimed + 1
+                   )
+                   SELECT (SELECT claimed_by FROM won)                     AS won_by,
+                          (SELECT claimed_by FROM tickets WHERE ticket_id=$1) AS holder''',
+                ticket['ticket_id'], user_id
+            )
+        if row['won_by']:
+            ticket_cache.update(ticket['channel_id'], claimed_by=user_id, status='claimed')
+            return True, user_id
+        if row['holder']:
+            ticket_cache.update(ticket['channel_id'], claimed_by=row['holder'], status='claimed')
+        else:
+            ticket_cache.drop(ticket['channel_id'])
+        return False, row['holder']
+
+    async def unclaim_ticket(self, ticket) -> bool:
+        """Releases the claim, but only if it is still held by the claimer the caller checked."""
+        async with self.acquire() as c:
+            done = await c.fetchval(
+                '''UPDATE tickets SET claimed_by=NULL, status='open'
+                   WHERE ticket_id=$1 AND claimed_by=$2
+                   RETURNING ticket_id''',
+                ticket['ticket_id'], ticket['claimed_by']
+            )
+        if done:
+            ticket_cache.update(ticket['channel_id'], claimed_by=None, status='open')
+        else:
+            ticket_cache.drop(ticket['channel_id'])
+        return bool(done)
+
+    async def transfer_ticket(self, ticket, to_id: int) -> bool:
+        """Moves the claim to `to_id` if the old claimer still holds it; claim counts are left as they were."""
+        async with self.acquire() as c:
+            done = await c.fetchval(
+                '''UPDATE tickets SET claimed_by=$3, status='claimed'
+                   WHERE ticket_id=$1 AND claimed_by=$2
+                   RETURNING ticket_id''',
+                ticket['ticket_id'], ticket['claimed_by'], to_id
+            )
+        if done:
+            ticket_cache.update(ticket['channel_id'], claimed_by=to_id, status='claimed')
+        else:
+            ticket_cache.drop(ticket['channel_id'])
+        return bool(done)
+
+    async def close_ticket(self, ticket):
+        async with self.acquire() as c:
+            await c.execute("UPDATE tickets SET status='closed' WHERE ticket_id=$1", ticket['ticket_id'])
+        ticket_cache.drop(ticket['channel_id'])
+
+    async def open_state(self, guild_id: int, user_id: int) -> tuple:
+        """
+        (blacklist row or None, channel ids of the user's open tickets) in one round trip.
+        The blacklist row is only looked up when blacklist_cache says the user is on it.
+        """
+        async with self.acquire() as c:
+            row = await c.fetchrow(
+                '''WITH bl AS (
+                       SELECT reason, blacklisted_by, created_at FROM blacklist
+                       WHERE $3::boolean AND user_id=$1 AND guild_id=$2
+                   ), mine AS (
+                       SELECT channel_id FROM tickets
+                       WHERE user_id=$1 AND guild_id=$2 AND status!='closed'
+                   )
+                   SELECT bl.*, ARRAY(SELECT channel_id FROM mine) AS open_channels
+                   FROM (SELECT 1) AS one LEFT JOIN bl ON TRUE''',
+                user_id, guild_id, blacklist_cache.has(guild_id, user_id)
+            )
+        return (row if row['blacklisted_by'] is not None else None), row['open_channels']
+
+    async def stale_open_tickets(self) -> list:
+        # skip brand-new rows — the channel may not be in the gateway cache yet
+        async with self.acquire('background') as c:
+            return await c.fetch(
+                "SELECT ticket_id, guild_id, channel_id FROM tickets "
+                "WHERE status!='closed' AND created_at < NOW() - INTERVAL '1 minute'"
+            )
+
+    async def close_tickets(self, rows):
+        async with self.acquire('background') as c:
+            await c.execute(
+                "UPDATE tickets SET status='closed' WHERE ticket_id=ANY($1::text[])",
+                [r['ticket_id'] for r in rows]
+            )
+        for r in rows:
+            ticket_cache.drop(r['channel_id'])
+
+    async def ticket_totals(self, guild_id: int) -> dict:
+        async with self.acquire() as c:
+            return dict(await c.fetchrow(
+                '''SELECT (SELECT COUNT(*) FROM tickets WHERE guild_id=$1 AND status!='closed') AS open,
+                          (SELECT COUNT(*) FROM tickets WHERE guild_id=$1)
+                        + (SELECT COUNT(*) FROM tickets_archive WHERE guild_id=$1)             AS total,
+                          (SELECT COUNT(*) FROM verifications WHERE guild_id=$1)               AS verifications''',
+                guild_id
+            ))
+
+    async def archive_closed_tickets(self, limit: int) -> int:
+        """
+        Moves up to `limit` closed tickets into tickets_archive in one statement, so a row is
+        never in both tables or neither. SKIP LOCKED lets a second process run the job alongside.
+        Ticket numbers are per guild, so the archive is keyed on (guild_id, ticket_id). That only
+        collides if a guild's counter went backwards; the moved row then replaces the older
+        archived one, which is lost, and the replacement is logged.
+        """
+        cols = ', '.join(TICKET_COLUMNS)
+        sets = ', '.join(f'{col}=EXCLUDED.{col}' for col in TICKET_COLUMNS if col not in ('guild_id', 'ticket_id'))
+        async with self.acquire('background') as c:
+            result = await c.fetchrow(
+                f'''WITH moved AS (
+                        DELETE FROM tickets WHERE ticket_id IN (
+                            SELECT ticket_id FROM tickets WHERE status='closed'
+                            LIMIT $1 FOR UPDATE SKIP LOCKED
+                        )
+                        RETURNING {cols}
+                    )
+                    , archived AS (
+                        INSERT INTO tickets_archive ({cols})
+                        SELECT {cols} FROM moved
+                        ON CONFLICT (guild_id, ticket_id) DO UPDATE SET {sets}, archived_at=NOW()
+                        RETURNING guild_id, ticket_id, xmax <> 0 AS replaced
+                    )
+                    SELECT COUNT(*) AS n,
+                           array_agg(guild_id || '/' || ticket_id) FILTER (WHERE replaced) AS replaced
+                    FROM archived''',
+                limit
+            )
+        if result['replaced']:
+            logger.warning(f'archive replaced {len(result["replaced"])} older archived ticket(s): {", ".join(result["replaced"])}')
+        return result['n']
+
+    # ── transcripts ──
+    async def append_ticket_messages(self, rows: list):
+        """A TranscriptBuffer batch as one unnest() insert; ids follow batch order."""
+        async with self.acquire('background') as c:
+            await c.execute(
+                f'''INSERT INTO ticket_messages ({', '.join(TRANSCRIPT_COLUMNS)})
+                    SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::bigint[], $4::text[], $5::bigint[],
+                                         $6::text[], $7::text[], $8::text[], $9::timestamp[])''',
+                *[list(col) for col in zip(*rows)]
+            )
+
+    async def ticket_messages(self, channel_id: int, after: Optional[tuple] = None, limit: int = TRANSCRIPT_PAGE) -> list:
+        """
+        One page of a channel's captured rows in time order. `after` is the (at, id) of the
+        last row of the previous page; each page is one range read of ticket_messages_channel_idx.
+        """
+        cols = ', '.join(TRANSCRIPT_COLUMNS)
+        async with self.acquire('background') as c:
+            if after is None:
+                return await c.fetch(
+                    f'''SELECT id, {cols} FROM ticket_messages
+                        WHERE channel_id=$1
+                        ORDER BY at, id LIMIT $2''',
+                    channel_id, limit
                 )
-            ''')
-            await c.execute('''
-                CREATE TABLE IF NOT EXISTS member_invites (
-                    guild_id   BIGINT,
-                    user_id    BIGINT,
-                    inviter_id BIGINT,
-                    is_rejoin  BOOLEAN DEFAULT FALSE,
-                    joined_at  TIMESTAMP DEFAULT NOW(),
-                    PRIMARY KEY (guild_id, user_id)
+            return await c.fetch(
+                f'''SELECT id, {cols} FROM ticket_messages
+                    WHERE channel_id=$1 AND (at, id) > ($3, $4)
+                    ORDER BY at, id LIMIT $2''',
+                channel_id, limit, *after
+            )
+
+    async def last_ticket_messages(self, channel_ids: list) -> dict:
+        """channel_id -> newest captured message id, for the channels that have any."""
+        async with self.acquire('background') as c:
+            rows = await c.fetch(
+                '''SELECT channel_id, MAX(message_id) AS last FROM ticket_messages
+                   WHERE channel_id = ANY($1::bigint[]) AND event='message'
+                   GROUP BY channel_id''',
+                list(channel_ids)
+            )
+        return {r['channel_id']: r['last'] for r in rows}
+
+    async def drop_ticket_messages(self, channel_ids: list):
+        async with self.acquire('background') as c:
+            await c.execute('DELETE FROM ticket_messages WHERE channel_id = ANY($1::bigint[])', list(channel_ids))
+
+    # ── config ──
+    async def load_config(self) -> list:
+        async with self.acquire('background') as c:
+            return await c.fetch(f'SELECT {", ".join(CONFIG_COLUMNS)} FROM config')
+
+    async def get_config(self, guild_id: int):
+        async with self.acquire() as c:
+            return await c.fetchrow('SELECT * FROM config WHERE guild_id=$1', guild_id)
+
+    async def set_config(self, guild_id: int, column: str, value):
+        if column not in CONFIG_COLUMNS[1:]:
+            raise ValueError(f'not a config column: {column}')
+        async with self.acquire() as c:
+            row = await c.fetchrow(
+                f'''INSERT INTO config (guild_id, {column}) VALUES ($1,$2)
+                    ON CONFLICT (guild_id) DO UPDATE SET {column}=$2 RETURNING *''',
+                guild_id, value
+            )
+        config_cache.put(row)
+        return row
+
+    # ── blacklist ──
+    async def load_blacklist(self) -> list:
+        async with self.acquire('background') as c:
+            return await c.fetch('SELECT guild_id, user_id FROM blacklist')
+
+    async def add_blacklist(self, guild_id: int, user_id: int, reason: str, by: int):
+        async with self.acquire() as c:
+            await c.execute(
+                'INSERT INTO blacklist (user_id, guild_id, reason, blacklisted_by) VALUES ($1,$2,$3,$4) '
+                'ON CONFLICT (user_id, guild_id) DO UPDATE SET reason=$3, blacklisted_by=$4, created_at=NOW()',
+                user_id, guild_id, reason, by
+            )
+        blacklist_cache.add(guild_id, user_id)
+
+    async def remove_blacklist(self, guild_id: int, user_id: int) -> bool:
+        async with self.acquire() as c:
+            result = await c.execute(
+                'DELETE FROM blacklist WHERE user_id=$1 AND guild_id=$2', user_id, guild_id
+            )
+        blacklist_cache.discard(guild_id, user_id)
+        return result != 'DELETE 0'
+
+    async def list_blacklist(self, guild_id: int) -> list:
+        async with self.acquire() as c:
+            return await c.fetch('SELECT * FROM blacklist WHERE guild_id=$1 ORDER BY created_at DESC', guild_id)
+
+    # ── invites ──
+    async def invitees_page(self, guild_id: int, inviter_id: int, limit: int, after: Optional[tuple] = None) -> list:
+        """
+        Newest-first page of an inviter's members. `after` is the (joined_at, user_id) of the
+        last row of the previous page; each page is one range read of member_invites_page_idx.
+        """
+        async with self.acquire() as c:
+            if after is None:
+                return await c.fetch(
+                    '''SELECT user_id, joined_at, state FROM member_invites
+                       WHERE guild_id=$1 AND inviter_id=$2
+                       ORDER BY joined_at DESC, user_id DESC LIMIT $3''',
+                    guild_id, inviter_id, limit
                 )
-            ''')
-            await c.execute('''
-                CREATE TABLE IF NOT EXISTS member_left (
-                    guild_id BIGINT,
-                    user_id  BIGINT,
-                    left_at  TIMESTAMP DEFAULT NOW(),
-                    PRIMARY KEY (guild_id, user_id)
+            return await c.fetch(
+                '''SELECT user_id, joined_at, state FROM member_invites
+                   WHERE guild_id=$1 AND inviter_id=$2 AND (joined_at, user_id) < ($4, $5)
+                   ORDER BY joined_at DESC, user_id DESC LIMIT $3''',
+                guild_id, inviter_id, limit, *after
+            )
+
+    async def member_invite(self, guild_id: int, user_id: int):
+        async with self.acquire() as c:
+            return await c.fetchrow(
+                'SELECT inviter_id, joined_at, is_rejoin FROM member_invites WHERE guild_id=$1 AND user_id=$2',
+                guild_id, user_id
+            )
+
+    async def invite_leaderboard(self, guild_id: int, limit: int = 10) -> list:
+        async with self.acquire() as c:
+            return await c.fetch(
+                '''SELECT inviter_id, joins, leaves, fake, rejoins, verified
+                   FROM invite_stats
+                   WHERE guild_id=$1
+                   ORDER BY real_invites DESC, inviter_id
+                   LIMIT $2''',
+                guild_id, limit
+            )
+
+    async def invite_rank(self, guild_id: int, inviter_id: int, real: int):
+        """
+        Where `real` invites would place the user among everyone else on the leaderboard:
+        rank (1 + everyone strictly ahead), the guild's ranked total and the count of the
+        next place up (None at the top). Every part is a range of invite_stats_rank_idx.
+        """
+        async with self.acquire() as c:
+            return await c.fetchrow(
+                '''SELECT (SELECT COUNT(*) FROM invite_stats
+                           WHERE guild_id=$1 AND real_invites > $3 AND inviter_id <> $2) + 1 AS rank,
+                          (SELECT COUNT(*) FROM invite_stats WHERE guild_id=$1) AS total,
+                          (SELECT real_invites FROM invite_stats
+                           WHERE guild_id=$1 AND real_invites > $3 AND inviter_id <> $2
+                           ORDER BY real_invites LIMIT 1) AS next_up''',
+                guild_id, inviter_id, real
+            )
+
+    async def get_invite_stats(self, guild_id: int, inviter_id: int):
+        async with self.acquire() as c:
+            return await c.fetchrow(
+                'SELECT joins, leaves, fake, rejoins, verified, unattributed FROM invite_stats WHERE guild_id=$1 AND inviter_id=$2',
+                guild_id, inviter_id
+            )
+
+    async def clear_invites(self, guild_id: int, inviter_id: Optional[int] = None):
+        """Resets one inviter's stats, or every invite table for the guild when inviter_id is None."""
+        async with self.acquire() as c:
+            if inviter_id is not None:
+                await c.execute('DELETE FROM invite_stats WHERE guild_id=$1 AND inviter_id=$2', guild_id, inviter_id)
+                return
+            async with c.transaction():
+                await c.execute('DELETE FROM invite_stats     WHERE guild_id=$1', guild_id)
+                await c.execute('DELETE FROM invite_breakdown WHERE guild_id=$1', guild_id)
+                await c.execute('DELETE FROM member_invites   WHERE guild_id=$1', guild_id)
+                await c.execute('DELETE FROM member_left      WHERE guild_id=$1', guild_id)
+
+    async def load_custom_invites(self) -> list:
+        async with self.acquire('background') as c:
+            return await c.fetch('SELECT guild_id, code, user_id FROM custom_invites')
+
+    async def set_custom_invite(self, guild_id: int, code: str, user_id: int, created_by: int):
+        """Replaces the member's previous custom invite, if any."""
+        async with self.acquire() as c:
+            async with c.transaction():
+                await c.execute('DELETE FROM custom_invites WHERE guild_id=$1 AND user_id=$2', guild_id, user_id)
+                await c.execute(
+                    'INSERT INTO custom_invites (guild_id, code, user_id, created_by) VALUES ($1,$2,$3,$4)',
+                    guild_id, code, user_id, created_by
                 )
-            ''')
-
-            migrations = [
-                'ALTER TABLE config ADD COLUMN IF NOT EXISTS ticket_counter INT DEFAULT 0',
-                'ALTER TABLE config ADD COLUMN IF NOT EXISTS verify_unverified_id BIGINT',
-                'ALTER TABLE config ADD COLUMN IF NOT EXISTS verify_verified_id BIGINT',
-                'ALTER TABLE config ADD COLUMN IF NOT EXISTS verify_member_id BIGINT',
-                'ALTER TABLE config ADD COLUMN IF NOT EXISTS verify_channel_id BIGINT',
-                'ALTER TABLE config ADD COLUMN IF NOT EXISTS welcome_channel_id BIGINT',
-                'ALTER TABLE blacklist ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW()',
-                'ALTER TABLE invite_stats ADD COLUMN IF NOT EXISTS rejoins INT DEFAULT 0',
-                'ALTER TABLE invite_stats ADD COLUMN IF NOT EXISTS verified INT DEFAULT 0',
-                'ALTER TABLE member_invites ADD COLUMN IF NOT EXISTS is_rejoin BOOLEAN DEFAULT FALSE',
-                '''CREATE TABLE IF NOT EXISTS ticket_stats (
-                    guild_id BIGINT,
-                    user_id  BIGINT,
-                    claimed  INT DEFAULT 0,
-                    closed   INT DEFAULT 0,
-                    PRIMARY KEY (guild_id, user_id)
-                )''',
-                '''CREATE TABLE IF NOT EXISTS ticket_ratings (
-                    guild_id   BIGINT,
-                    ticket_id  TEXT,
-                    claimer_id BIGINT,
-                    user_id    BIGINT,
-                    rating     INT,
-                    PRIMARY KEY (guild_id, ticket_id)
-                )''',
-                'ALTER TABLE ticket_stats ADD COLUMN IF NOT EXISTS total_rating BIGINT DEFAULT 0',
-                'ALTER TABLE ticket_stats ADD COLUMN IF NOT EXISTS rating_count INT DEFAULT 0',
-                '''CREATE TABLE IF NOT EXISTS custom_invites (
-                    guild_id   BIGINT NOT NULL,
-                    code       TEXT NOT NULL,
-                    user_id    BIGINT NOT NULL,
-                    created_by BIGINT NOT NULL,
-                    PRIMARY KEY (guild_id, code)
-                )''',
-            ]
-            for sql in migrations:
-                try:
-                    await c.execute(sql)
-                except Exception:
-                    pass
+        custom_invite_cache.put(guild_id, code, user_id)
 
-    async def next_num(self, guild_id: int) -> int:
-        async with self.pool.acquire() as c:
+    async def record_join(self, guild_id: int, user_id: int, inviter_id: int, new_account: bool) -> tuple:
+        """
+        Records an attributed join in one statement: reads member_left to classify it, upserts
+        member_invites, clears member_left and reads the inviter's stored totals.
+        A member counts as a rejoin if they left under 8 days ago (unless the account is new).
+        Returns is_rejoin, the member's new `state`, the row it replaced (prev_inviter /
+        prev_state, NULL for a first join) and the invite_stats columns (NULL if no row yet).
+        """
+        async with self.acquire() as c:
+            return await c.fetchrow(
+                '''WITH prev AS (
+                       SELECT inviter_id, state FROM member_invites WHERE guild_id=$1 AND user_id=$2
+                   ), kind AS (
+                       SELECT NOT $4::boolean AND COALESCE(
+                           (SELECT left_at FROM member_left WHERE guild_id=$1 AND user_id=$2)
+                               > LOCALTIMESTAMP - INTERVAL '8 days', FALSE) AS is_rejoin
+                   ), joined AS (
+                       INSERT INTO member_invites (guild_id, user_id, inviter_id, is_rejoin, state)
+                       SELECT $1, $2, $3, is_rejoin,
+                              CASE WHEN is_rejoin THEN 'rejoin' WHEN $4 THEN 'fake' ELSE 'unverified' END
+                       FROM kind
+                       ON CONFLICT (guild_id, user_id) DO UPDATE
+                       SET inviter_id=$3, joined_at=NOW(), is_rejoin=EXCLUDED.is_rejoin, state=EXCLUDED.state
+                       RETURNING state
+                   ), cleared AS (
+                       DELETE FROM member_left WHERE guild_id=$1 AND user_id=$2
+                   )
+                   SELECT kind.is_rejoin, (SELECT state FROM joined) AS state,
+                          prev.inviter_id AS prev_inviter, prev.state AS prev_state,
+                          s.joins, s.leaves, s.fake, s.rejoins, s.verified
+                   FROM kind
+                   LEFT JOIN prev ON TRUE
+                   LEFT JOIN invite_stats s ON s.guild_id=$1 AND s.inviter_id=$3''',
+                guild_id, user_id, inviter_id, new_account
+            )
+
+    async def record_leave(self, guild_id: int, user_id: int):
+        """
+        Stamps member_left and moves the member's state to 'left' (a rejoin stays a rejoin).
+        Returns their invite row (inviter_id, is_rejoin, the state before, `moved`), if any.
+        """
+        async with self.acquire() as c:
+            return await c.fetchrow(
+                '''WITH stamp AS (
+                       INSERT INTO member_left (guild_id, user_id, left_at) VALUES ($1,$2,NOW())
+                       ON CONFLICT (guild_id, user_id) DO UPDATE SET left_at=NOW()
+                   ), moved AS (
+                       UPDATE member_invites SET state='left'
+                       WHERE guild_id=$1 AND user_id=$2 AND state NOT IN ('left', 'rejoin')
+                       RETURNING user_id
+                   )
+                   SELECT inviter_id, is_rejoin, state, EXISTS (SELECT 1 FROM moved) AS moved
+                   FROM member_invites WHERE guild_id=$1 AND user_id=$2''',
+                guild_id, user_id
+            )
+
+    async def record_verification(self, guild_id: int, user_id: int) -> Optional[int]:
+        """Stores the verification and returns who invited the member, if known."""
+        async with self.acquire() as c:
             await c.execute(
-                '''INSERT INTO config (guild_id, ticket_counter) VALUES ($1, 1)
-                   ON CONFLICT (guild_id) DO UPDATE
-                   SET ticket_counter = config.ticket_counter + 1''',
-                guild_id
+                'INSERT INTO verifications (guild_id, user_id) VALUES ($1,$2) ON CONFLICT DO NOTHING',
+                guild_id, user_id
             )
-            row = await c.fetchrow(
-                'SELECT ticket_counter FROM config WHERE guild_id = $1', guild_id
+            return await c.fetchval(
+                'SELECT inviter_id FROM member_invites WHERE guild_id=$1 AND user_id=$2',
+                guild_id, user_id
+            )
+
+    async def set_invite_state(self, guild_id: int, user_id: int, state: str, from_states: tuple):
+        """Moves a member to `state` if they are currently in one of `from_states`; returns (inviter_id, old state) when moved."""
+        async with self.acquire() as c:
+            return await c.fetchrow(
+                '''WITH prev AS (
+                       SELECT inviter_id, state FROM member_invites
+                       WHERE guild_id=$1 AND user_id=$2 AND state = ANY($4::text[])
+                       FOR UPDATE
+                   )
+                   UPDATE member_invites m SET state=$3 FROM prev
+                   WHERE m.guild_id=$1 AND m.user_id=$2
+                   RETURNING prev.inviter_id, prev.state''',
+                guild_id, user_id, state, list(from_states)
+            )
+
+    async def verify_invitees(self, guild_id: int, user_ids: list) -> list:
+        """Moves every listed member still marked unverified to verified; returns the moved rows' inviter_id."""
+        async with self.acquire('background') as c:
+            return await c.fetch(
+                '''UPDATE member_invites SET state='verified'
+                   WHERE guild_id=$1 AND user_id = ANY($2::bigint[]) AND state='unverified'
+                   RETURNING inviter_id''',
+                guild_id, list(user_ids)
             )
-            return row['ticket_counter']
 
-db = Database()
+    async def get_invite_breakdown(self, guild_id: int, inviter_id: int):
+        async with self.acquire() as c:
+            return await c.fetchrow(
+                '''SELECT joins, departed, rejoins, fake, verified, unverified
+                   FROM invite_breakdown WHERE guild_id=$1 AND inviter_id=$2''',
+                guild_id, inviter_id
+            )
+
+    async def load_invite_uses(self) -> list:
+        async with self.acquire('background') as c:
+            return await c.fetch('SELECT guild_id, code, uses FROM invite_uses')
+
+    async def put_invite_uses(self, guild_id: int, uses: dict, prune: bool = False):
+        """
+        Upserts code -> uses for a guild; rows whose count didn't change aren't rewritten.
+        With prune=True `uses` is the guild's full invite list and other codes are deleted.
+        """
+        async with self.acquire('background') as c:
+            await c.execute(
+                '''WITH pruned AS (
+                       DELETE FROM invite_uses
+                       WHERE guild_id=$1 AND $4::boolean AND code <> ALL($2::text[])
+                   )
+                   INSERT INTO invite_uses (guild_id, code, uses)
+                   SELECT $1, code, uses FROM unnest($2::text[], $3::int[]) AS t(code, uses)
+                   ON CONFLICT (guild_id, code) DO UPDATE SET uses=EXCLUDED.uses, updated_at=NOW()
+                   WHERE invite_uses.uses IS DISTINCT FROM EXCLUDED.uses''',
+                guild_id, list(uses), list(uses.values()), prune
+            )
+
+    async def drop_invite_use(self, guild_id: int, code: str):
+        async with self.acquire('background') as c:
+            await c.execute('DELETE FROM invite_uses WHERE guild_id=$1 AND code=$2', guild_id, code)
+
+    # ── stats / ratings ──
+    async def get_ticket_stats(self, guild_id: int, user_id: int):
+        async with self.acquire() as c:
+            return await c.fetchrow(
+                'SELECT claimed, closed, total_rating, rating_count FROM ticket_stats WHERE guild_id=$1 AND user_id=$2',
+                guild_id, user_id
+            )
+
+    async def rating_exists(self, guild_id: int, ticket_id: str) -> bool:
+        async with self.acquire() as c:
+            return bool(await c.fetchval(
+                'SELECT rating FROM ticket_ratings WHERE guild_id=$1 AND ticket_id=$2', guild_id, ticket_id
+            ))
+
+    async def add_rating(self, guild_id: int, ticket_id: str, claimer_id: int, user_id: int, rating: int) -> bool:
+        """Stores the rating unless the ticket already has one; True when this call stored it."""
+        async with self.acquire() as c:
+            return bool(await c.fetchval(
+                '''INSERT INTO ticket_ratings (guild_id, ticket_id, claimer_id, user_id, rating)
+                   VALUES ($1,$2,$3,$4,$5)
+                   ON CONFLICT (guild_id, ticket_id) DO NOTHING
+                   RETURNING rating''',
+                guild_id, ticket_id, claimer_id, user_id, rating
+            ))
+
+    async def apply_counters(self, batch: dict):
+        """Writes a CounterBuffer batch as one unnest() upsert per table, in a single transaction."""
+        async with self.acquire('background') as c:
+            async with c.transaction():
+                for table, (_, cols) in COUNTER_TABLES.items():
+                    # sorted so concurrent writers lock rows in the same order
+                    keys = sorted(k for k in batch if k[0] == table)
+                    if not keys:
+                        continue
+                    args = [[k[1] for k in keys], [k[2] for k in keys]]
+                    args += [[batch[k].get(col, 0) for k in keys] for col in cols]
+                    await c.execute(counter_upsert_sql(table), *args)
+
+    # ── export ──
+    async def export_rows(self, table: str, guild_id: Optional[int] = None):
+        """
+        Walks the table (then its archive, if any) in primary-key order through a
+        server-side cursor, so neither side ever holds more than one chunk. Cursor time is booked as DB time and the
+        whole export is recorded in query_stats as a single statement.
+        """
+        for source in (table, *EXPORT_ARCHIVES.get(table, ())):
+            async with contextlib.aclosing(self._export_source(source, table, guild_id)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+
+    async def _export_source(self, source: str, table: str, guild_id: Optional[int]):
+        cols, key = EXPORT_TABLES[table]
+        where     = 'WHERE guild_id=$1' if guild_id is not None else ''
+        sql       = f'SELECT {", ".join(cols)} FROM {source} {where} ORDER BY {key}'
+        args      = (guild_id,) if guild_id is not None else ()
+        async with self.acquire('background') as c:
+            spent, error = 0.0, None
+            try:
+                async with c.transaction():
+                    t0  = _time.perf_counter()
+                    cur = await c.cursor(sql, *args)
+                    spent += _time.perf_counter() - t0
+                    while True:
+                        t0    = _time.perf_counter()
+                        rows  = await cur.fetch(EXPORT_CHUNK)
+                        spent += _time.perf_counter() - t0
+                        if not rows:
+                            break
+                        yield [tuple(r) for r in rows]
+            except Exception as ex:
+                error = ex
+                raise
+            finally:
+                c.record(sql, args, spent, error)
+
+
+# ================================================================== in-memory storage
+
+def _utcnow() -> datetime:
+    # naive UTC, matching what asyncpg returns for TIMESTAMP columns filled by NOW()
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class MemoryStorage(Storage):
+    """
+    Dict-backed Storage with the same semantics as Database — conditional claims,
+    block-reserved ticket numbers, additive counters. Nothing survives a restart.
+    `latency` (seconds) is slept on every call to stand in for a network round trip.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency        = latency
+        self.tickets        = {}                 # ticket_id -> row
+        self.archive        = {}                 # (guild_id, ticket_id) -> row, closed tickets moved out of `tickets`
+        self.config         = {}                 # guild_id -> row
+        self.blacklist      = {}                 # (guild_id, user_id) -> row
+        self.member_invites = {}                 # (guild_id, user_id) -> row
+        self.member_left    = {}                 # (guild_id, user_id) -> left_at
+        self.custom_invites = {}                 # (guild_id, code) -> row
+        self.verifications  = set()              # (guild_id, user_id)
+        self.invite_uses    = {}                 # (guild_id, code) -> uses
+        self.ratings        = {}                 # (guild_id, ticket_id) -> row
+        self.transcripts    = defaultdict(list)  # channel_id -> [row], capture order
+        self.transcript_seq = 0                  # stands in for ticket_messages.id
+        self.counters       = {t: defaultdict(lambda: defaultdict(int)) for t in COUNTER_TABLES}   # table -> (guild_id, id) -> {col: n}
+
+    async def _rt(self):
+        await asyncio.sleep(self.latency)
+
+    async def connect(self):
+        await self.warm_caches()
+        self.connected = True
+        logger.info('memory storage ready  •  nothing is persisted')
+
+    # ── tickets ──
+    async def load_open_tickets(self) -> list:
+        await self._rt()
+        return [dict(t) for t in self.tickets.values() if t['status'] != 'closed']
+
+    def _config_row(self, guild_id: int) -> dict:
+        if guild_id not in self.config:
+            self.config[guild_id] = {**dict.fromkeys(CONFIG_COLUMNS), 'guild_id': guild_id, 'ticket_counter': 0}
+        return self.config[guild_id]
+
+    async def reserve_ticket_numbers(self, guild_id: int, block: int) -> int:
+        await self._rt()
+        cfg = self._config_row(guild_id)
+        cfg['ticket_counter'] = (cfg.get('ticket_counter') or 0) + block
+        return cfg['ticket_counter']
+
+    async def get_ticket(self, channel_id: int):
+        rec = ticket_cache.get(channel_id)
+        if rec:
+            return rec
+        await self._rt()
+        row = next((t for t in self.tickets.values() if t['channel_id'] == channel_id), None)
+        return ticket_cache.put(row) if row else None
+
+    async def insert_ticket(self, ticket_id: str, guild_id: int, channel_id: int, user_id: int,
+                            ticket_type: str, tier: str, trade_details: str = None) -> TicketRecord:
+        await self._rt()
+        if ticket_id in self.tickets:
+            raise ValueError(f'duplicate ticket_id {ticket_id}')
+        row = dict.fromkeys(TICKET_COLUMNS)
+        row.update(ticket_id=ticket_id, guild_id=guild_id, channel_id=channel_id, user_id=user_id,
+                   ticket_type=ticket_type, tier=tier, trade_details=trade_details,
+                   status='open', created_at=_utcnow())
+        self.tickets[ticket_id] = row
+        return ticket_cache.put(row)
+
+    async def claim_ticket(self, ticket, user_id: int) -> tuple[bool, Optional[int]]:
+        await self._rt()
+        row = self.tickets.get(ticket['ticket_id'])
+        if row and row['claimed_by'] is None and row['status'] != 'closed':
+            row.update(claimed_by=user_id, status='claimed')
+            self.counters['ticket_stats'][(row['guild_id'], user_id)]['claimed'] += 1
+            ticket_cache.update(ticket['channel_id'], claimed_by=user_id, status='claimed')
+            return True, user_id
+        holder = row['claimed_by'] if row else None
+        if holder:
+            ticket_cache.update(ticket['channel_id'], claimed_by=holder, status='claimed')
+        else:
+            ticket_cache.drop(ticket['channel_id'])
+        return False, holder
+
+    async def unclaim_ticket(self, ticket) -> bool:
+        await self._rt()
+        row = self.tickets.get(ticket['ticket_id'])
+        if row and row['claimed_by'] == ticket['claimed_by']:
+            row.update(claimed_by=None, status='open')
+            ticket_cache.update(ticket['channel_id'], claimed_by=None, status='open')
+            return True
+        ticket_cache.drop(ticket['channel_id'])
+        return False
+
+    async def transfer_ticket(self, ticket, to_id: int) -> bool:
+        await self._rt()
+        row = self.tickets.get(ticket['ticket_id'])
+        if row and row['claimed_by'] == ticket['claimed_by']:
+            row.update(claimed_by=to_id, status='claimed')
+            ticket_cache.update(ticket['channel_id'], claimed_by=to_id, status='claimed')
+            return True
+        ticket_cache.drop(ticket['channel_id'])
+        return False
+
+    async def close_ticket(self, ticket):
+        await self._rt()
+        if ticket['ticket_id'] in self.tickets:
+            self.tickets[ticket['ticket_id']]['status'] = 'closed'
+        ticket_cache.drop(ticket['channel_id'])
+
+    async def open_state(self, guild_id: int, user_id: int) -> tuple:
+        await self._rt()
+        bl = self.blacklist.get((guild_id, user_id)) if blacklist_cache.has(guild_id, user_id) else None
+        return bl, [t['channel_id'] for t in self.tickets.values()
+                    if t['user_id'] == user_id and t['guild_id'] == guild_id and t['status'] != 'closed']
+
+    async def stale_open_tickets(self) -> list:
+        await self._rt()
+        cutoff = _utcnow() - timedelta(minutes=1)
+        return [t for t in self.tickets.values() if t['status'] != 'closed' and t['created_at'] < cutoff]
+
+    async def close_tickets(self, rows):
+        await self._rt()
+        for r in rows:
+            if r['ticket_id'] in self.tickets:
+                self.tickets[r['ticket_id']]['status'] = 'closed'
+            ticket_cache.drop(r['channel_id'])
+
+    async def ticket_totals(self, guild_id: int) -> dict:
+        await self._rt()
+        mine = [t for t in self.tickets.values() if t['guild_id'] == guild_id]
+        return {
+            'open':          sum(1 for t in mine if t['status'] != 'closed'),
+            'total':         len(mine) + sum(1 for t in self.archive.values() if t['guild_id'] == guild_id),
+            'verifications': sum(1 for g, _ in self.verifications if g == guild_id),
+        }
+
+    async def archive_closed_tickets(self, limit: int) -> int:
+        await self._rt()
+        closed = [tid for tid, t in self.tickets.items() if t['status'] == 'closed'][:limit]
+        replaced = []
+        for tid in closed:
+            row = self.tickets.pop(tid)
+            if (row['guild_id'], tid) in self.archive:
+                replaced.append(f"{row['guild_id']}/{tid}")
+            self.archive[(row['guild_id'], tid)] = {**row, 'archived_at': _utcnow()}
+        if replaced:
+            logger.warning(f'archive replaced {len(replaced)} older archived ticket(s): {", ".join(replaced)}')
+        return len(closed)
+
+    # ── transcripts ──
+    async def append_ticket_messages(self, rows: list):
+        await self._rt()
+        for row in rows:
+            self.transcript_seq += 1
+            self.transcripts[row[1]].append({'id': self.transcript_seq, **dict(zip(TRANSCRIPT_COLUMNS, row))})
+
+    async def ticket_messages(self, channel_id: int, after: Optional[tuple] = None, limit: int = TRANSCRIPT_PAGE) -> list:
+        await self._rt()
+        rows = sorted(self.transcripts.get(channel_id, ()), key=lambda r: (r['at'], r['id']))
+        if after is not None:
+            rows = [r for r in rows if (r['at'], r['id']) > after]
+        return rows[:limit]
+
+    async def last_ticket_messages(self, channel_ids: list) -> dict:
+        await self._rt()
+        out = {}
+        for ch_id in channel_ids:
+            ids = [r['message_id'] for r in self.transcripts.get(ch_id, ()) if r['event'] == 'message']
+            if ids:
+                out[ch_id] = max(ids)
+        return out
+
+    async def drop_ticket_messages(self, channel_ids: list):
+        await self._rt()
+        for ch_id in channel_ids:
+            self.transcripts.pop(ch_id, None)
+
+    # ── config ──
+    async def load_config(self) -> list:
+        await self._rt()
+        return list(self.config.values())
+
+    async def get_config(self, guild_id: int):
+        await self._rt()
+        return self.config.get(guild_id)
+
+    async def set_config(self, guild_id: int, column: str, value):
+        if column not in CONFIG_COLUMNS[1:]:
+            raise ValueError(f'not a config column: {column}')
+        await self._rt()
+        row = self._config_row(guild_id)
+        row[column] = value
+        config_cache.put(row)
+        return row
+
+    # ── blacklist ──
+    async def load_blacklist(self) -> list:
+        await self._rt()
+        return list(self.blacklist.values())
+
+    async def add_blacklist(self, guild_id: int, user_id: int, reason: str, by: int):
+        await self._rt()
+        self.blacklist[(guild_id, user_id)] = {
+            'user_id': user_id, 'guild_id': guild_id, 'reason': reason,
+            'blacklisted_by': by, 'created_at': _utcnow(),
+        }
+        blacklist_cache.add(guild_id, user_id)
+
+    async def remove_blacklist(self, guild_id: int, user_id: int) -> bool:
+        await self._rt()
+        blacklist_cache.discard(guild_id, user_id)
+        return self.blacklist.pop((guild_id, user_id), None) is not None
+
+    async def list_blacklist(self, guild_id: int) -> list:
+        await self._rt()
+        rows = [r for (g, _), r in self.blacklist.items() if g == guild_id]
+        return sorted(rows, key=lambda r: r['created_at'], reverse=True)
+
+    # ── invites ──
+    async def invitees_page(self, guild_id: int, inviter_id: int, limit: int, after: Optional[tuple] = None) -> list:
+        await self._rt()
+        rows = [r for (g, _), r in self.member_invites.items() if g == guild_id and r['inviter_id'] == inviter_id]
+        rows.sort(key=lambda r: (r['joined_at'], r['user_id']), reverse=True)
+        if after is not None:
+            rows = [r for r in rows if (r['joined_at'], r['user_id']) < after]
+        return rows[:limit]
+
+    async def member_invite(self, guild_id: int, user_id: int):
+        await self._rt()
+        return self.member_invites.get((guild_id, user_id))
+
+    def _invite_row(self, guild_id: int, inviter_id: int, deltas) -> dict:
+        row = {'inviter_id': inviter_id}
+        row.update({col: deltas.get(col, 0) for col in COUNTER_TABLES['invite_stats'][1]})
+        return row
+
+    async def invite_leaderboard(self, guild_id: int, limit: int = 10) -> list:
+        await self._rt()
+        rows = [self._invite_row(g, i, d) for (g, i), d in self.counters['invite_stats'].items() if g == guild_id]
+        rows.sort(key=lambda r: (-(r['joins'] - r['leaves'] - r['fake']), r['inviter_id']))
+        return rows[:limit]
+
+    async def invite_rank(self, guild_id: int, inviter_id: int, real: int):
+        await self._rt()
+        rows  = {i: d.get('joins', 0) - d.get('leaves', 0) - d.get('fake', 0)
+                 for (g, i), d in self.counters['invite_stats'].items() if g == guild_id}
+        ahead = [r for i, r in rows.items() if r > real and i != inviter_id]
+        return {'rank': len(ahead) + 1, 'total': len(rows), 'next_up': min(ahead) if ahead else None}
+
+    async def get_invite_stats(self, guild_id: int, inviter_id: int):
+        await self._rt()
+        d = self.counters['invite_stats'].get((guild_id, inviter_id))
+        return self._invite_row(guild_id, inviter_id, d) if d is not None else None
+
+    async def clear_invites(self, guild_id: int, inviter_id: Optional[int] = None):
+        await self._rt()
+        stats = self.counters['invite_stats']
+        if inviter_id is not None:
+            stats.pop((guild_id, inviter_id), None)
+            return
+        for table in (stats, self.counters['invite_breakdown'], self.member_invites, self.member_left):
+            for key in [k for k in table if k[0] == guild_id]:
+                del table[key]
+
+    async def load_custom_invites(self) -> list:
+        await self._rt()
+        return list(self.custom_invites.values())
+
+    async def set_custom_invite(self, guild_id: int, code: str, user_id: int, created_by: int):
+        await self._rt()
+        for key in [k for k, r in self.custom_invites.items() if k[0] == guild_id and r['user_id'] == user_id]:
+            del self.custom_invites[key]
+        self.custom_invites[(guild_id, code)] = {
+            'guild_id': guild_id, 'code': code, 'user_id': user_id, 'created_by': created_by,
+        }
+        custom_invite_cache.put(guild_id, code, user_id)
+
+    async def record_join(self, guild_id: int, user_id: int, inviter_id: int, new_account: bool):
+        await self._rt()
+        now       = _utcnow()
+        prev      = self.member_invites.get((guild_id, user_id))
+        left_at   = self.member_left.pop((guild_id, user_id), None)
+        is_rejoin = not new_account and left_at is not None and left_at > now - timedelta(days=8)
+        state     = 'rejoin' if is_rejoin else 'fake' if new_account else 'unverified'
+        self.member_invites[(guild_id, user_id)] = {
+            'user_id': user_id, 'inviter_id': inviter_id, 'is_rejoin': is_rejoin, 'joined_at': now, 'state': state,
+        }
+        d   = self.counters['invite_stats'].get((guild_id, inviter_id))
+        row = {'is_rejoin': is_rejoin, 'state': state,
+               'prev_inviter': prev['inviter_id'] if prev else None, 'prev_state': prev['state'] if prev else None}
+        row.update({col: (d.get(col, 0) if d is not None else None) for col in COUNTER_TABLES['invite_stats'][1]})
+        return row
+
+    async def record_leave(self, guild_id: int, user_id: int):
+        await self._rt()
+        self.member_left[(guild_id, user_id)] = _utcnow()
+        row = self.member_invites.get((guild_id, user_id))
+        if row is None:
+            return None
+        out = {**row, 'moved': row['state'] not in ('left', 'rejoin')}
+        if out['moved']:
+            row['state'] = 'left'
+        return out
+
+    async def record_verification(self, guild_id: int, user_id: int) -> Optional[int]:
+        await self._rt()
+        self.verifications.add((guild_id, user_id))
+        row = self.member_invites.get((guild_id, user_id))
+        return row['inviter_id'] if row else None
+
+    async def set_invite_state(self, guild_id: int, user_id: int, state: str, from_states: tuple):
+        await self._rt()
+        row = self.member_invites.get((guild_id, user_id))
+        if row is None or row['state'] not in from_states:
+            return None
+        prev, row['state'] = row['state'], state
+        return {'inviter_id': row['inviter_id'], 'state': prev}
+
+    async def verify_invitees(self, guild_id: int, user_ids: list) -> list:
+        await self._rt()
+        moved = []
+        for user_id in user_ids:
+            row = self.member_invites.get((guild_id, user_id))
+            if row and row['state'] == 'unverified':
+                row['state'] = 'verified'
+                moved.append({'inviter_id': row['inviter_id']})
+        return moved
+
+    async def get_invite_breakdown(self, guild_id: int, inviter_id: int):
+        await self._rt()
+        d = self.counters['invite_breakdown'].get((guild_id, inviter_id))
+        return {col: d.get(col, 0) for col in COUNTER_TABLES['invite_breakdown'][1]} if d is not None else None
+
+    async def load_invite_uses(self) -> list:
+        await self._rt()
+        return [{'guild_id': g, 'code': code, 'uses': n} for (g, code), n in self.invite_uses.items()]
+
+    async def put_invite_uses(self, guild_id: int, uses: dict, prune: bool = False):
+        await self._rt()
+        if prune:
+            for key in [k for k in self.invite_uses if k[0] == guild_id and k[1] not in uses]:
+                del self.invite_uses[key]
+        for code, n in uses.items():
+            self.invite_uses[(guild_id, code)] = n
+
+    async def drop_invite_use(self, guild_id: int, code: str):
+        await self._rt()
+        self.invite_uses.pop((guild_id, code), None)
+
+    # ── stats / ratings ──
+    async def get_ticket_stats(self, guild_id: int, user_id: int):
+        await self._rt()
+        d = self.counters['ticket_stats'].get((guild_id, user_id))
+        return {col: d.get(col, 0) for col in COUNTER_TABLES['ticket_stats'][1]} if d is not None else None
+
+    async def rating_exists(self, guild_id: int, ticket_id: str) -> bool:
+        await self._rt()
+        return (guild_id, ticket_id) in self.ratings
+
+    async def add_rating(self, guild_id: int, ticket_id: str, claimer_id: int, user_id: int, rating: int) -> bool:
+        await self._rt()
+        if (guild_id, ticket_id) in self.ratings:
+            return False
+        self.ratings[(guild_id, ticket_id)] = {
+            'guild_id': guild_id, 'ticket_id': ticket_id, 'claimer_id': claimer_id,
+            'user_id': user_id, 'rating': rating,
+        }
+        return True
+
+    async def apply_counters(self, batch: dict):
+        await self._rt()
+        for (table, guild_id, key_id), cols in batch.items():
+            row = self.counters[table][(guild_id, key_id)]
+            for col, n in cols.items():
+                row[col] += n
+
+    async def export_rows(self, table: str, guild_id: Optional[int] = None):
+        cols, _ = EXPORT_TABLES[table]
+        source  = {'tickets': self.tickets, 'member_invites': self.member_invites, 'ticket_ratings': self.ratings}[table]
+        items   = sorted(source.items())
+        if table == 'tickets':
+            items += sorted(self.archive.items())   # live rows first, then the archive, as on Postgres
+        rows    = []
+        for key, row in items:
+            if table == 'member_invites':
+                row = {**row, 'guild_id': key[0]}
+            if guild_id is not None and row['guild_id'] != guild_id:
+                continue
+            rows.append(tuple(row.get(col) for col in cols))
+            if len(rows) >= EXPORT_CHUNK:
+                await self._rt()
+                yield rows
+                rows = []
+        if rows:
+            await self._rt()
+            yield rows
+
+
+db: Storage = MemoryStorage(MEMORY_LATENCY_MS / 1000) if STORAGE_BACKEND == 'memory' else Database()
+
+
+# ================================================================== export
+
+# table -> (columns, ORDER BY) — the key is the primary key so the cursor walks an index instead of sorting
+EXPORT_TABLES = {
+    'tickets':        (TICKET_COLUMNS, 'ticket_id'),
+    'member_invites': (('guild_id', 'user_id', 'inviter_id', 'is_rejoin', 'joined_at'), 'guild_id, user_id'),
+    'ticket_ratings': (('guild_id', 'ticket_id', 'claimer_id', 'user_id', 'rating'), 'guild_id, ticket_id'),
+}
+EXPORT_ARCHIVES = {'tickets': ('tickets_archive',)}   # cold tables appended after the live one
+EXPORT_FORMATS  = ('csv', 'jsonl')
+
+
+async def write_export(storage: Storage, table: str, fmt: str, out, guild_id: Optional[int] = None) -> int:
+    """
+    Streams `table` into the binary file `out` as gzip-compressed CSV (with header) or JSONL,
+    one chunk at a time. `out` is left open; returns the number of rows written.
+    """
+    cols, _ = EXPORT_TABLES[table]
+    text    = io.TextIOWrapper(gzip.GzipFile(fileobj=out, mode='wb'), encoding='utf-8', newline='')
+    n       = 0
+    try:
+        if fmt == 'csv':
+            w = csv.writer(text)
+            w.writerow(cols)
+        # closed explicitly: an export that fails or is cancelled mid-write hands its
+        # connection (and cursor transaction) back now, not when the generator is collected
+        async with contextlib.aclosing(storage.export_rows(table, guild_id)) as chunks:
+            async for chunk in chunks:
+                if fmt == 'csv':
+                    w.writerows(chunk)
+                else:
+                    text.writelines(json.dumps(dict(zip(cols, row)), default=str) + '\n' for row in chunk)
+                n += len(chunk)
+    finally:
+        text.close()   # flushes the gzip trailer; GzipFile never closes a fileobj it was handed
+    return n
 
 
 # ================================================================== bot setup
@@ -446,10 +2519,7 @@ async def _can_manage(ctx, ticket) -> bool:
 async def send_log(guild, title, desc=None, color=0x5865F2, fields=None):
     """Sends an embed to the log channel with automatic rate-limit retry."""
     try:
-        async with db.pool.acquire() as c:
-            cfg = await c.fetchrow(
-                'SELECT log_channel_id FROM config WHERE guild_id = $1', guild.id
-            )
+        cfg = config_cache.get(guild.id)
         if not cfg or not cfg['log_channel_id']:
             return
         ch = guild.get_channel(cfg['log_channel_id'])
@@ -475,32 +2545,58 @@ async def send_log(guild, title, desc=None, color=0x5865F2, fields=None):
         logger.error(f'send_log: {ex}')
 
 
-async def claim_lock(channel, claimer, creator=None, ticket_type='middleman'):
-    # Lock every staff/tier role out of sending, for all ticket types
-    roles_to_lock = list(ROLES.keys())
-    for key in roles_to_lock:
-        r = channel.guild.get_role(ROLES[key])
+# ── ticket permissions ──
+# Staff/tier roles can send while a ticket is open and are muted while it is claimed
+# or locked; the claimer and creator carry their own overwrites.
+ROLE_SEND       = {'open': True, 'claimed': False, 'locked': False}
+overwrite_stats = {'edits': 0, 'skipped': 0}
+
+
+def ticket_overwrites(channel, state: str, members: dict = None) -> dict:
+    """
+    The full overwrite map `channel` should have in `state`. `members` maps a member to
+    their send_messages (True, False, or None to fall back to their roles); each stays
+    able to read. Targets not touched here keep their current overwrite.
+    """
+    target = {t.id: (t, ow) for t, ow in channel.overwrites.items()}
+    for role_id in ROLES.values():
+        r = channel.guild.get_role(role_id)
         if r:
-            ow = channel.overwrites_for(r)
-            ow.send_messages = False
-            await channel.set_permissions(r, overwrite=ow)
-    # Explicitly allow claimer and creator
-    await channel.set_permissions(claimer, read_messages=True, send_messages=True)
+            ow = target.get(r.id, (r, discord.PermissionOverwrite()))[1]
+            ow.send_messages = ROLE_SEND[state]
+            target[r.id] = (r, ow)
+    for m, send in (members or {}).items():
+        ow = target.get(m.id, (m, discord.PermissionOverwrite()))[1]
+        ow.read_messages = True
+        ow.send_messages = send
+        target[m.id] = (m, ow)
+    return dict(target.values())
+
+
+async def apply_overwrites(channel, target: dict) -> bool:
+    """
+    Puts `target` on `channel` in one edit, or does nothing when it already matches.
+    Keyed by id so a cached Member and an uncached Object for the same user compare equal.
+    """
+    current = {t.id: ow for t, ow in channel.overwrites.items()}
+    if {t.id: ow for t, ow in target.items()} == current:
+        overwrite_stats['skipped'] += 1
+        return False
+    await channel.edit(overwrites=target)
+    overwrite_stats['edits'] += 1
+    return True
+
+
+async def claim_lock(channel, claimer, creator=None, ticket_type='middleman'):
+    members = {claimer: True}
     if creator and creator.id != claimer.id:
-        await channel.set_permissions(creator, read_messages=True, send_messages=True)
+        members[creator] = True
+    await apply_overwrites(channel, ticket_overwrites(channel, 'claimed', members))
 
 
 async def claim_unlock(channel, old_claimer=None, ticket_type='middleman'):
-    # Restore send permissions for all staff/tier roles
-    for key in ROLES.keys():
-        r = channel.guild.get_role(ROLES[key])
-        if r:
-            ow = channel.overwrites_for(r)
-            ow.send_messages = True
-            await channel.set_permissions(r, overwrite=ow)
-    # Remove individual overwrite from old claimer (back to role-based)
-    if old_claimer:
-        await channel.set_permissions(old_claimer, read_messages=True, send_messages=None)
+    members = {old_claimer: None} if old_claimer else None
+    await apply_overwrites(channel, ticket_overwrites(channel, 'open', members))
 
 
 def make_ticket_embed(user, tier, ticket_id, extra_fields=None, desc=None):
@@ -522,6 +2618,117 @@ def make_ticket_embed(user, tier, ticket_id, extra_fields=None, desc=None):
     return e
 
 
+# ================================================================== channel pool
+
+CHANNEL_POOL_KINDS   = ('support', 'middleman', 'reward')
+CHANNEL_POOL_PREFIX  = 'pool-'   # never 'ticket-' — ticket commands key off that prefix
+CATEGORY_CHANNEL_CAP = 50        # Discord's per-category limit; pooled channels count toward it
+
+
+class ChannelPool:
+    """
+    Pre-created ticket channels, hidden from everyone but the bot, kept CHANNEL_POOL_DEPTH
+    deep per kind in each guild's ticket category. open_ticket_channel() takes one and
+    turns it into the ticket with a single edit; a take wakes the guild's filler, which
+    tops every kind back up one paced create at a time, re-checking after each create so
+    takes made meanwhile are refilled too. Whenever the category is new to the pool (first
+    fill, or after $setcategory) its leftover pool channels are adopted by name and pool
+    channels anywhere else in the guild are deleted.
+    """
+    def __init__(self):
+        self.free    = defaultdict(list)   # (guild_id, kind) -> [channel_id]
+        self.hits    = 0
+        self.misses  = 0
+        self.created = 0
+        self.retired = 0
+        self.adopted = {}   # guild_id -> category id the free lists belong to
+        self._fills  = {}   # guild_id -> filler task
+
+    def take(self, guild, kind: str, category):
+        ids = self.free[(guild.id, kind)]
+        while ids:
+            ch = guild.get_channel(ids.pop(0))
+            if ch is not None and ch.category_id == category.id:
+                self.hits += 1
+                self.wake(guild)
+                return ch
+        self.misses += 1
+        self.wake(guild)
+        return None
+
+    def wake(self, guild):
+        if CHANNEL_POOL_DEPTH and guild.id not in self._fills:
+            self._fills[guild.id] = asyncio.create_task(self._fill(guild))
+
+    def filling(self, guild_id: int) -> bool:
+        return guild_id in self._fills
+
+    async def _adopt(self, guild, category):
+        """Point the guild's free lists at `category`: keep its pool channels, delete the rest."""
+        names = {f'{CHANNEL_POOL_PREFIX}{kind}': kind for kind in CHANNEL_POOL_KINDS}
+        for kind in CHANNEL_POOL_KINDS:
+            self.free[(guild.id, kind)] = []
+        for ch in guild.text_channels:
+            kind = names.get(ch.name)
+            if kind is None:
+                continue
+            if ch.category_id == category.id:
+                self.free[(guild.id, kind)].append(ch.id)
+                continue
+            try:
+                await ch.delete(reason='channel pool moved to a new ticket category')
+                self.retired += 1
+            except discord.NotFound:
+                pass
+        self.adopted[guild.id] = category.id
+
+    async def _fill(self, guild):
+        hidden = {
+            guild.default_role: discord.PermissionOverwrite(read_messages=False),
+            guild.me:           discord.PermissionOverwrite(read_messages=True, send_messages=True, manage_channels=True, manage_messages=True),
+        }
+        try:
+            while True:
+                # re-read every round: a $setcategory mid-fill moves the pool instead of being missed
+                cfg      = config_cache.get(guild.id)
+                category = guild.get_channel(cfg['ticket_category_id']) if cfg and cfg['ticket_category_id'] else None
+                if category is None:
+                    return
+                if self.adopted.get(guild.id) != category.id:
+                    await self._adopt(guild, category)
+                depth = self.depth(guild.id)
+                kind  = min(depth, key=depth.get)
+                if depth[kind] >= CHANNEL_POOL_DEPTH or len(category.channels) >= CATEGORY_CHANNEL_CAP:
+                    return
+                # pace first, so a take that missed gets the rate limit bucket before the filler
+                await asyncio.sleep(CHANNEL_POOL_REFILL_S)
+                ch = await category.create_text_channel(name=f'{CHANNEL_POOL_PREFIX}{kind}', overwrites=hidden)
+                self.free[(guild.id, kind)].append(ch.id)
+                self.created += 1
+        except Exception as ex:
+            logger.error(f'channel pool fill {guild.id}: {ex}')
+        finally:
+            self._fills.pop(guild.id, None)
+
+    def depth(self, guild_id: int) -> dict:
+        return {kind: len(self.free[(guild_id, kind)]) for kind in CHANNEL_POOL_KINDS}
+
+
+channel_pool = ChannelPool()
+
+
+async def open_ticket_channel(guild, kind: str, category, name: str, overwrites: dict):
+    """A ticket channel with `name` and `overwrites`, from the pool when one is ready."""
+    ch = channel_pool.take(guild, kind, category)
+    if ch is not None:
+        try:
+            await ch.edit(name=name, overwrites=overwrites)
+            return ch
+        except discord.NotFound:
+            pass
+    return await category.create_text_channel(name=name, overwrites=overwrites)
+
+
 async def pre_open_checks(interaction, guild, user):
     if tickets_locked.get(guild.id):
         await interaction.followup.send(
@@ -529,24 +2736,10 @@ async def pre_open_checks(interaction, guild, user):
             ephemeral=True
         )
         return False
-    async with db.pool.acquire() as c:
-        bl      = await c.fetchrow(
-            'SELECT * FROM blacklist WHERE user_id = $1 AND guild_id = $2', user.id, guild.id
-        )
-        cfg     = await c.fetchrow(
-            'SELECT * FROM config WHERE guild_id = $1', guild.id
-        )
-        tickets = await c.fetch(
-            "SELECT ticket_id, channel_id FROM tickets WHERE user_id=$1 AND guild_id=$2 AND status!='closed'",
-            user.id, guild.id
-        )
-        ghost_ids = [t['ticket_id'] for t in tickets if guild.get_channel(t['channel_id']) is None]
-        real_open = len(tickets) - len(ghost_ids)
-        if ghost_ids:
-            await c.execute(
-                "UPDATE tickets SET status='closed' WHERE ticket_id=ANY($1::text[])",
-                ghost_ids
-            )
+    cfg = config_cache.get(guild.id)
+    bl, open_channels = await db.open_state(guild.id, user.id)
+    # tickets whose channel is gone don't count; ghost_sweep closes them off the request path
+    real_open = sum(1 for ch_id in open_channels if guild.get_channel(ch_id))
     if bl:
         by     = guild.get_member(bl['blacklisted_by'])
         date   = bl['created_at'].strftime('%b %d, %Y') if bl.get('created_at') else 'unknown'
@@ -574,47 +2767,396 @@ async def pre_open_checks(interaction, guild, user):
     return cfg
 
 
-async def save_transcript(channel, ticket, closer):
-    async with db.pool.acquire() as c:
-        cfg = await c.fetchrow(
-            'SELECT log_channel_id FROM config WHERE guild_id = $1', channel.guild.id
-        )
-    if not cfg or not cfg['log_channel_id']:
-        return
-    lc = channel.guild.get_channel(cfg['log_channel_id'])
-    if not lc:
-        return
-    opener  = channel.guild.get_member(ticket['user_id'])
-    claimer = channel.guild.get_member(ticket['claimed_by']) if ticket['claimed_by'] else None
-    header  = '\n'.join([
-        'TRANSCRIPT',
-        '=' * 48,
-        f"ticket:     {ticket['ticket_id']}",
-        f"opened by:  {opener.name if opener else ticket['user_id']}",
-        f"claimed by: {claimer.name if claimer else 'nobody'}",
-        f"closed by:  {closer.name}",
-        '=' * 48,
-        '',
-    ])
-    msgs = []
-    async for m in channel.history(limit=500, oldest_first=True):
-        msgs.append(f"[{m.created_at.strftime('%H:%M:%S')}] {m.author.name}: {m.content or '[embed/file]'}")
-    file = discord.File(
-        fp=io.BytesIO((header + '\n'.join(msgs)).encode()),
-        filename=f"transcript-{ticket['ticket_id']}.txt"
-    )
-    msg_count = len(msgs)
-    e = discord.Embed(title='🔒  Ticket Closed', color=0xED4245)
-    e.add_field(name='🎫  Ticket',    value=f"#{ticket['ticket_id']}",         inline=True)
-    e.add_field(name='📋  Type',       value=f"{ticket['ticket_type'].title()} / {ticket.get('tier', '-').title()}", inline=True)
-    e.add_field(name='💬  Messages',   value=str(msg_count),                    inline=True)
-    e.add_field(name='👤  Opened By',  value=opener.mention if opener else 'Unknown', inline=True)
-    e.add_field(name='🔒  Closed By',  value=closer.mention,                    inline=True)
-    if claimer:
-        e.add_field(name='✋  Claimed By', value=claimer.mention, inline=True)
-    await lc.send(embed=e, file=file)
+def is_ticket_channel(channel) -> bool:
+    return channel is not None and getattr(channel, 'name', '').startswith('ticket-')
+
+
+def transcript_line(r, names: dict) -> Optional[str]:
+    """
+    One captured row as a transcript line; edits and deletes read where they happened.
+    None for a message already written — a backfill can overlap what was captured live.
+    """
+    if r['event'] == 'message' and r['message_id'] in names:
+        return None
+    name = r['author_name'] or names.get(r['message_id'], 'unknown')
+    body = r['content'] or ''
+    if r['attachments']:
+        body = f"{body} [files: {', '.join(r['attachments'].splitlines())}]".strip()
+    when = r['at'].strftime('%H:%M:%S')
+    if r['event'] == 'message':
+        names[r['message_id']] = name
+        return f'[{when}] {name}: {body or "[embed/file]"}'
+    if r['event'] == 'edit':
+        return f'[{when}] {name} (edited): {body or "[embed/file]"}'
+    return f'[{when}] {name} (deleted){": " + body if body else ""}'
+
+
+class TranscriptWriter:
+    """
+    Streams transcript lines into numbered parts, each a SpooledTemporaryFile (gzipped
+    with compress=True) cut before it would pass `limit` bytes. Every part opens with
+    the header and no line straddles two parts. Gzip output is sync-flushed every
+    FLUSH_EVERY bytes (or limit / 16, if smaller) so the compressed size can be bounded
+    without closing the stream.
+    """
+    FLUSH_EVERY = 256 * 1024
+    GZIP_TAIL   = 64            # trailer plus sync-flush slack
+
+    def __init__(self, name: str, header: str, limit: int, compress: bool = TRANSCRIPT_GZIP):
+        self.name     = name
+        self.header   = header
+        self.limit    = limit
+        self.compress = compress
+        self.parts    = []       # finished spools, rewound
+        self.messages = 0
+        self.size     = 0        # bytes across finished parts
+        self._every   = min(self.FLUSH_EVERY, max(4096, limit // 16))
+        self._open()
+
+    def _open(self):
+        self._spool   = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+        self._out     = gzip.GzipFile(fileobj=self._spool, mode='wb') if self.compress else self._spool
+        self._pending = 0        # bytes given to gzip since its last flush
+        self._lines   = 0
+        self._put(f'{self.header}part {len(self.parts) + 1}\n\n'.encode())
+
+    def _put(self, data: bytes):
+        self._out.write(data)
+        if self.compress:
+            self._pending += len(data)
+            if self._pending >= self._every:
+                self._out.flush()
+                self._pending = 0
+
+    def _bound(self, extra: int) -> int:
+        # deflate never grows data by more than a few bytes per block, so raw pending bytes are a safe ceiling
+        tail = self._pending + self.GZIP_TAIL if self.compress else 0
+        return self._spool.tell() + tail + extra
+
+    def _close_part(self):
+        if self.compress:
+            self._out.close()   # writes the gzip trailer; the spool stays open
+        self.size += self._spool.tell()
+        self._spool.seek(0)
+        self.parts.append(self._spool)
+
+    def write(self, line: str, message: bool = True):
+        data = (line + '\n').encode()
+        if self._lines and self._bound(len(data)) > self.limit:
+            self._close_part()
+            self._open()
+        self._put(data)
+        self._lines   += 1
+        self.messages += message
+
+    def finish(self) -> list:
+        """discord.File per part; the caller uploads them and then calls close()."""
+        self._close_part()
+        ext = '.txt.gz' if self.compress else '.txt'
+        n   = len(self.parts)
+        return [
+            discord.File(fp=spool, filename=f'{self.name}{ext}' if n == 1 else f'{self.name}-part{i}of{n}{ext}')
+            for i, spool in enumerate(self.parts, 1)
+        ]
+
+    def close(self):
+        if self._spool not in self.parts:   # failed part-way; the part being written was never finished
+            if self.compress:
+                self._out.close()
+            self._spool.close()
+        for spool in self.parts:
+            spool.close()
+
+
+async def save_transcript(channel, ticket, closer):
+    await transcripts.flush(db)
+    cfg = config_cache.get(channel.guild.id)
+    lc  = channel.guild.get_channel(cfg['log_channel_id']) if cfg and cfg['log_channel_id'] else None
+    if not lc:
+        transcripts.seal([channel.id])
+        await db.drop_ticket_messages([channel.id])
+        return
+    started = _time.perf_counter()
+    opener  = channel.guild.get_member(ticket['user_id'])
+    claimer = channel.guild.get_member(ticket['claimed_by']) if ticket['claimed_by'] else None
+    header  = '\n'.join([
+        'TRANSCRIPT',
+        '=' * 48,
+        f"ticket:     {ticket['ticket_id']}",
+        f"opened by:  {opener.name if opener else ticket['user_id']}",
+        f"claimed by: {claimer.name if claimer else 'nobody'}",
+        f"closed by:  {closer.name}",
+        '=' * 48,
+        '',
+    ])
+    # the upload limit covers the whole request, so leave room for the embed and multipart framing
+    writer = TranscriptWriter(f"transcript-{ticket['ticket_id']}", header, lc.guild.filesize_limit - 64 * 1024)
+    try:
+        names, last, seen = {}, None, 0
+        while channel.id not in transcripts.lossy:
+            rows  = await db.ticket_messages(channel.id, last)
+            seen += len(rows)
+            for r in rows:
+                line = transcript_line(r, names)
+                if line is not None:
+                    writer.write(line, r['event'] == 'message')
+            if len(rows) < TRANSCRIPT_PAGE:
+                break
+            last = (rows[-1]['at'], rows[-1]['id'])
+        if not seen:
+            # opened before capture was running, or rows were dropped while the DB was down —
+            # the channel itself is the complete record, so stream its history once
+            async for m in channel.history(limit=None, oldest_first=True):
+                writer.write(f"[{m.created_at.strftime('%H:%M:%S')}] {m.author.name}: {m.content or '[embed/file]'}")
+        files   = writer.finish()
+        elapsed = _time.perf_counter() - started
+        e = discord.Embed(title='🔒  Ticket Closed', color=0xED4245)
+        e.add_field(name='🎫  Ticket',    value=f"#{ticket['ticket_id']}",         inline=True)
+        e.add_field(name='📋  Type',       value=f"{ticket['ticket_type'].title()} / {ticket.get('tier', '-').title()}", inline=True)
+        e.add_field(name='💬  Messages',   value=str(writer.messages),              inline=True)
+        e.add_field(name='👤  Opened By',  value=opener.mention if opener else 'Unknown', inline=True)
+        e.add_field(name='🔒  Closed By',  value=closer.mention,                    inline=True)
+        if claimer:
+            e.add_field(name='✋  Claimed By', value=claimer.mention, inline=True)
+        if len(files) > 1:
+            e.add_field(name='📎  Transcript', value=f'{len(files)} parts  •  {writer.size / 1048576:.1f} MB', inline=True)
+        await lc.send(embed=e, file=files[0])
+        for f in files[1:]:
+            await lc.send(file=f)
+    finally:
+        writer.close()
+    transcripts.record_build(writer.size, elapsed)
+    logger.info(
+        f"transcript #{ticket['ticket_id']}  •  {writer.messages} message(s)  •  "
+        f'{writer.size / 1024:.1f} KiB in {len(files)} part(s)  •  built in {elapsed * 1000:.0f}ms'
+    )
+    transcripts.seal([channel.id])
+    await db.drop_ticket_messages([channel.id])
+
+
+# ================================================================== ticket open pipeline
+
+class TicketSpec:
+    """
+    What differs between ticket kinds. `roles` are ROLES keys given access, the last
+    one is pinged; `data` is stored as the ticket's JSON; `fields` go on the opening
+    embed; `log` sends the Ticket Opened log entry.
+    """
+    def __init__(self, kind: str, ticket_type: str, tier: str, slug: str, roles: tuple,
+                 data: dict = None, fields: list = None, log: bool = False):
+        self.kind        = kind
+        self.ticket_type = ticket_type
+        self.tier        = tier
+        self.slug        = slug
+        self.roles       = roles
+        self.data        = data
+        self.fields      = fields
+        self.log         = log
+
+
+class TicketOpener:
+    """
+    One pipeline for every way of opening a ticket. Entry points defer the interaction
+    and submit(); requests wait in a bounded per-guild line drained by at most
+    TICKET_OPEN_CONCURRENCY workers, which exit when it empties. Someone who has to wait
+    is shown their place in line before they join it, the place is kept current as the
+    line moves, and that message becomes the result. The DB insert and the opening
+    message run together; the log entry is not awaited. Each stage's latency is kept
+    for /metrics.
+    """
+    STAGES         = ('queue', 'checks', 'number', 'channel', 'insert_send', 'total')
+    POSITION_EVERY = 3.0   # seconds between "In Line" refreshes, so a long line isn't an edit storm
+
+    def __init__(self):
+        self.lines      = defaultdict(deque)                       # guild_id -> waiting requests
+        self.workers    = defaultdict(set)                         # guild_id -> worker tasks
+        self.refreshers = {}                                       # guild_id -> position refresh task
+        self.tasks      = set()                                    # fire-and-forget log sends
+        self.active     = defaultdict(int)                         # guild_id -> opens in progress
+        self.joining    = defaultdict(int)                         # guild_id -> notices being sent
+        self.timings    = defaultdict(lambda: deque(maxlen=512))   # stage -> recent seconds
+        self.opened     = 0
+        self.rejected   = 0
+
+    def pct(self, stage: str, q: float) -> float:
+        t = sorted(self.timings[stage])
+        if not t:
+            return 0.0
+        return t[min(len(t) - 1, int(q * len(t)))] * 1000
+
+    def queued(self) -> int:
+        return sum(len(line) for line in self.lines.values())
+
+    @staticmethod
+    def _in_line(position: int) -> discord.Embed:
+        return discord.Embed(title='🕒  In Line', description=f'Your ticket is **#{position}** in line. It will open here shortly.', color=0x5865F2)
+
+    async def _busy(self, interaction: discord.Interaction, notice=None):
+        self.rejected += 1
+        e = discord.Embed(title='⏳  Tickets Are Busy', description='Lots of people are opening tickets right now. Please try again in a minute.', color=0xFEE75C)
+        try:
+            if notice is not None:
+                await notice.edit(embed=e)
+            else:
+                await interaction.followup.send(embed=e, ephemeral=True)
+        except Exception:
+            pass
+
+    async def submit(self, interaction: discord.Interaction, spec: TicketSpec):
+        gid  = interaction.guild.id
+        line = self.lines[gid]
+        if len(line) >= TICKET_OPEN_QUEUE:
+            return await self._busy(interaction)
+        req = {'interaction': interaction, 'spec': spec, 'notice': None, 'shown': 0,
+               'taken': False, 'lock': asyncio.Lock(), 't0': _time.perf_counter()}
+        ahead = len(line) + self.joining[gid] + self.active[gid] - TICKET_OPEN_CONCURRENCY
+        if ahead >= 0:
+            # no worker can see the request until the notice exists, so the result always edits it
+            req['shown'] = ahead + 1
+            self.joining[gid] += 1
+            try:
+                req['notice'] = await interaction.followup.send(embed=self._in_line(req['shown']), ephemeral=True, wait=True)
+            except Exception:
+                pass
+            finally:
+                self.joining[gid] -= 1
+            if len(line) >= TICKET_OPEN_QUEUE:
+                return await self._busy(interaction, req['notice'])
+        line.append(req)
+        while len(self.workers[gid]) < min(TICKET_OPEN_CONCURRENCY, len(line)):
+            task = asyncio.create_task(self._work(gid))
+            self.workers[gid].add(task)
+            task.add_done_callback(self.workers[gid].discard)   # only matters if cancelled before it ran
+
+    async def _work(self, gid: int):
+        # a worker leaves self.workers in the same step it sees the line empty; a done callback
+        # runs a step later, and a submit() resuming in between would count it and start none
+        line = self.lines[gid]
+        try:
+            while line:
+                req          = line.popleft()
+                req['taken'] = True
+                self.active[gid] += 1
+                if line and gid not in self.refreshers:
+                    self.refreshers[gid] = asyncio.create_task(self._refresh(gid))
+                try:
+                    await self._open(req)
+                finally:
+                    self.active[gid] -= 1
+        finally:
+            self.workers[gid].discard(asyncio.current_task())
+
+    async def _refresh(self, gid: int):
+        """Rewrites each waiting notice whose place has changed, every POSITION_EVERY seconds while anyone waits."""
+        line = self.lines[gid]
+        try:
+            while line:
+                await asyncio.sleep(self.POSITION_EVERY)
+                for position, req in enumerate(list(line), 1):
+                    if req['notice'] is None or req['shown'] == position:
+                        continue
+                    async with req['lock']:
+                        if req['taken']:
+                            continue
+                        try:
+                            await req['notice'].edit(embed=self._in_line(position))
+                            req['shown'] = position
+                        except Exception:
+                            pass
+        finally:
+            if self.refreshers.get(gid) is asyncio.current_task():
+                del self.refreshers[gid]
+
+    async def _reply(self, req: dict, embed: discord.Embed):
+        async with req['lock']:
+            try:
+                if req['notice'] is not None:
+                    await req['notice'].edit(embed=embed)
+                else:
+                    await req['interaction'].followup.send(embed=embed, ephemeral=True)
+            except Exception:
+                pass
+
+    async def _open(self, req: dict):
+        interaction, spec = req['interaction'], req['spec']
+        guild, user       = interaction.guild, interaction.user
+        t                 = _time.perf_counter()
+        self.timings['queue'].append(t - req['t0'])
+
+        def lap(stage: str):
+            nonlocal t
+            now = _time.perf_counter()
+            self.timings[stage].append(now - t)
+            t = now
+
+        try:
+            cfg = await pre_open_checks(interaction, guild, user)
+        except Exception as ex:
+            logger.error(f'pre_open_checks: {ex}')
+            cfg = None
+            await self._reply(req, discord.Embed(description='Something went wrong. Please try again or contact a staff member.', color=0xED4245))
+        lap('checks')
+        if not cfg:
+            if req['notice'] is not None:
+                try:
+                    await req['notice'].delete()
+                except Exception:
+                    pass
+            return
+        try:
+            num      = await db.next_num(guild.id)
+            tid      = f'{num:04d}'
+            lap('number')
+            category = guild.get_channel(cfg['ticket_category_id'])
+            roles    = [r for r in (guild.get_role(ROLES[key]) for key in spec.roles if key in ROLES) if r]
+
+            overwrites = {
+                guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                guild.me:           discord.PermissionOverwrite(read_messages=True, send_messages=True, manage_channels=True, manage_messages=True),
+                user:               discord.PermissionOverwrite(read_messages=True, send_messages=True),
+            }
+            for r in roles:
+                overwrites[r] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+
+            channel = await open_ticket_channel(guild, spec.kind, category, f'ticket-{spec.slug}-{tid}-{user.name}', overwrites)
+            lap('channel')
+            e    = make_ticket_embed(user, spec.tier, tid, spec.fields)
+            ping = user.mention
+            if roles and ROLES.get(spec.roles[-1]) == roles[-1].id:
+                ping += f' {roles[-1].mention}'
+            data = json.dumps(spec.data) if spec.data is not None else None
+            inserted, sent = await asyncio.gather(
+                db.insert_ticket(tid, guild.id, channel.id, user.id, spec.ticket_type, spec.tier, data),
+                channel.send(content=ping, embed=e, view=ControlView()),
+                return_exceptions=True
+            )
+            if isinstance(inserted, BaseException):
+                # no row means no ticket; don't leave an orphan channel behind
+                try:
+                    await channel.delete(reason='ticket insert failed')
+                except Exception:
+                    pass
+                raise inserted
+            if isinstance(sent, BaseException):
+                logger.warning(f'{spec.tier} open  •  opening message failed in {channel.id}: {sent}')
+            lap('insert_send')
+            daily_stats[guild.id]['tickets'] += 1
+            self.opened += 1
+            await self._reply(req, discord.Embed(title='✅  Ticket Opened', description=f'Your ticket has been created — {channel.mention}', color=0x57F287))
+            self.timings['total'].append(_time.perf_counter() - req['t0'])
+            if spec.log:
+                task = asyncio.create_task(send_log(guild, 'Ticket Opened',
+                    f'{user.mention} opened a {TIER_LABEL[spec.tier]} ticket',
+                    TIER_COLOR[spec.tier]))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        except Exception as ex:
+            logger.error(f'{spec.tier} open: {ex}')
+            await self._reply(req, discord.Embed(description='Something went wrong. Please try again or contact a staff member.', color=0xED4245))
 
 
+ticket_opener = TicketOpener()
+
 
 # ================================================================== UI components
 
@@ -641,82 +3183,23 @@ class MiddlemanModal(Modal, title='Middleman Request'):
             await interaction.response.defer(ephemeral=True)
         except Exception:
             return
-        guild, user = interaction.guild, interaction.user
-        try:
-            cfg = await pre_open_checks(interaction, guild, user)
-        except Exception as ex:
-            logger.error(f'pre_open_checks: {ex}')
-            try:
-                await interaction.followup.send(
-                    embed=discord.Embed(description='Something went wrong. Please try again or contact a staff member.', color=0xED4245),
-                    ephemeral=True
-                )
-            except Exception:
-                pass
-            return
-        if not cfg:
-            return
-        try:
-            num      = await db.next_num(guild.id)
-            tid      = f'{num:04d}'
-            slug     = TIER_SLUG.get(self.tier, self.tier)
-            ch_name  = f'ticket-{slug}-{tid}-{user.name}'
-            category = guild.get_channel(cfg['ticket_category_id'])
-            role_id  = ROLES.get(self.tier)
-            staff_r  = guild.get_role(ROLES['staff'])
-            tier_r   = guild.get_role(role_id) if role_id else None
-
-            overwrites = {
-                guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                guild.me:           discord.PermissionOverwrite(read_messages=True, send_messages=True, manage_channels=True, manage_messages=True),
-                user:               discord.PermissionOverwrite(read_messages=True, send_messages=True),
-            }
-            if staff_r:
-                overwrites[staff_r] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-            if tier_r:
-                overwrites[tier_r] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-
-            channel = await category.create_text_channel(name=ch_name, overwrites=overwrites)
-            trade   = {
-                'trader':    self.trader.value,
-                'giving':    self.giving.value,
-                'receiving': self.receiving.value,
-                'tip':       self.tip.value or None,
-            }
-            async with db.pool.acquire() as c:
-                await c.execute(
-                    'INSERT INTO tickets (ticket_id, guild_id, channel_id, user_id, ticket_type, tier, trade_details) VALUES ($1,$2,$3,$4,$5,$6,$7)',
-                    tid, guild.id, channel.id, user.id, 'middleman', self.tier, json.dumps(trade)
-                )
-            daily_stats[guild.id]['tickets'] += 1
-            fields = [
-                ('**Trading with**', trade['trader'],    False),
-                ('**Giving**',       trade['giving'],    True),
-                ('**Receiving**',    trade['receiving'], True),
-            ]
-            if trade['tip']:
-                fields.append(('**Tip**', trade['tip'], True))
-            e    = make_ticket_embed(user, self.tier, tid, fields)
-            ping = user.mention
-            if tier_r:
-                ping += f' {tier_r.mention}'
-            await channel.send(content=ping, embed=e, view=ControlView())
-            await interaction.followup.send(
-                embed=discord.Embed(title='✅  Ticket Opened', description=f'Your ticket has been created — {channel.mention}', color=0x57F287),
-                ephemeral=True
-            )
-            await send_log(guild, 'Ticket Opened',
-                f'{user.mention} opened a {TIER_LABEL[self.tier]} ticket',
-                TIER_COLOR[self.tier])
-        except Exception as ex:
-            logger.error(f'middleman open: {ex}')
-            try:
-                await interaction.followup.send(
-                    embed=discord.Embed(description='Something went wrong. Please try again or contact a staff member.', color=0xED4245),
-                    ephemeral=True
-                )
-            except Exception:
-                pass
+        trade = {
+            'trader':    self.trader.value,
+            'giving':    self.giving.value,
+            'receiving': self.receiving.value,
+            'tip':       self.tip.value or None,
+        }
+        fields = [
+            ('**Trading with**', trade['trader'],    False),
+            ('**Giving**',       trade['giving'],    True),
+            ('**Receiving**',    trade['receiving'], True),
+        ]
+        if trade['tip']:
+            fields.append(('**Tip**', trade['tip'], True))
+        await ticket_opener.submit(interaction, TicketSpec(
+            'middleman', 'middleman', self.tier, TIER_SLUG.get(self.tier, self.tier),
+            ('staff', self.tier), trade, fields, log=True
+        ))
 
 
 class TierSelect(Select):
@@ -751,66 +3234,10 @@ class RewardModal(Modal, title='Claim a Reward'):
             await interaction.response.defer(ephemeral=True)
         except Exception:
             return
-        guild, user = interaction.guild, interaction.user
-        try:
-            cfg = await pre_open_checks(interaction, guild, user)
-        except Exception as ex:
-            logger.error(f'pre_open_checks: {ex}')
-            try:
-                await interaction.followup.send(
-                    embed=discord.Embed(description='Something went wrong. Please try again or contact a staff member.', color=0xED4245),
-                    ephemeral=True
-                )
-            except Exception:
-                pass
-            return
-        if not cfg:
-            return
-        try:
-            num      = await db.next_num(guild.id)
-            tid      = f'{num:04d}'
-            ch_name  = f'ticket-reward-{tid}-{user.name}'
-            category = guild.get_channel(cfg['ticket_category_id'])
-            staff_r  = guild.get_role(ROLES['staff'])
-
-            overwrites = {
-                guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                guild.me:           discord.PermissionOverwrite(read_messages=True, send_messages=True, manage_channels=True, manage_messages=True),
-                user:               discord.PermissionOverwrite(read_messages=True, send_messages=True),
-            }
-            if staff_r:
-                overwrites[staff_r] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-
-            channel = await category.create_text_channel(name=ch_name, overwrites=overwrites)
-            data    = {'type': self.rtype, 'what': self.what.value}
-
-            async with db.pool.acquire() as c:
-                await c.execute(
-                    'INSERT INTO tickets (ticket_id, guild_id, channel_id, user_id, ticket_type, tier, trade_details) VALUES ($1,$2,$3,$4,$5,$6,$7)',
-                    tid, guild.id, channel.id, user.id, 'support', 'reward', json.dumps(data)
-                )
-            daily_stats[guild.id]['tickets'] += 1
-            fields = [
-                ('**Claiming**', self.what.value, False),
-            ]
-            e    = make_ticket_embed(user, 'reward', tid, fields)
-            ping = user.mention
-            if staff_r:
-                ping += f' {staff_r.mention}'
-            await channel.send(content=ping, embed=e, view=ControlView())
-            await interaction.followup.send(
-                embed=discord.Embed(title='✅  Ticket Opened', description=f'Your ticket has been created — {channel.mention}', color=0x57F287),
-                ephemeral=True
-            )
-        except Exception as ex:
-            logger.error(f'reward open: {ex}')
-            try:
-                await interaction.followup.send(
-                    embed=discord.Embed(description='Something went wrong. Please try again or contact a staff member.', color=0xED4245),
-                    ephemeral=True
-                )
-            except Exception:
-                pass
+        await ticket_opener.submit(interaction, TicketSpec(
+            'reward', 'support', 'reward', 'reward', ('staff',),
+            {'type': self.rtype, 'what': self.what.value}, [('**Claiming**', self.what.value, False)]
+        ))
 
 
 class RewardSelect(Select):
@@ -851,61 +3278,7 @@ class TicketPanel(View):
             await interaction.response.defer(ephemeral=True)
         except Exception:
             return
-        guild, user = interaction.guild, interaction.user
-        try:
-            cfg = await pre_open_checks(interaction, guild, user)
-        except Exception as ex:
-            logger.error(f'pre_open_checks: {ex}')
-            try:
-                await interaction.followup.send(
-                    embed=discord.Embed(description='Something went wrong. Please try again or contact a staff member.', color=0xED4245),
-                    ephemeral=True
-                )
-            except Exception:
-                pass
-            return
-        if not cfg:
-            return
-        try:
-            num     = await db.next_num(guild.id)
-            tid     = f'{num:04d}'
-            ch_name = f'ticket-support-{tid}-{user.name}'
-            cat     = guild.get_channel(cfg['ticket_category_id'])
-            staff_r = guild.get_role(ROLES['staff'])
-
-            overwrites = {
-                guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                guild.me:           discord.PermissionOverwrite(read_messages=True, send_messages=True, manage_channels=True, manage_messages=True),
-                user:               discord.PermissionOverwrite(read_messages=True, send_messages=True),
-            }
-            if staff_r:
-                overwrites[staff_r] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
-
-            channel = await cat.create_text_channel(name=ch_name, overwrites=overwrites)
-            async with db.pool.acquire() as c:
-                await c.execute(
-                    'INSERT INTO tickets (ticket_id, guild_id, channel_id, user_id, ticket_type, tier) VALUES ($1,$2,$3,$4,$5,$6)',
-                    tid, guild.id, channel.id, user.id, 'support', 'support'
-                )
-            daily_stats[guild.id]['tickets'] += 1
-            e    = make_ticket_embed(user, 'support', tid)
-            ping = user.mention
-            if staff_r:
-                ping += f' {staff_r.mention}'
-            await channel.send(content=ping, embed=e, view=ControlView())
-            await interaction.followup.send(
-                embed=discord.Embed(title='✅  Ticket Opened', description=f'Your ticket has been created — {channel.mention}', color=0x57F287),
-                ephemeral=True
-            )
-        except Exception as ex:
-            logger.error(f'support open: {ex}')
-            try:
-                await interaction.followup.send(
-                    embed=discord.Embed(description='Something went wrong. Please try again or contact a staff member.', color=0xED4245),
-                    ephemeral=True
-                )
-            except Exception:
-                pass
+        await ticket_opener.submit(interaction, TicketSpec('support', 'support', 'support', 'support', ('staff',)))
 
     @discord.ui.button(label='Middleman', style=ButtonStyle.success, emoji='⚖️', custom_id='btn_middleman')
     async def middleman(self, interaction: discord.Interaction, _):
@@ -956,31 +3329,29 @@ class ControlView(View):
                 embed=discord.Embed(description='You need a staff role to claim tickets.', color=0xED4245),
                 ephemeral=True
             )
-        async with db.pool.acquire() as c:
-            ticket = await c.fetchrow(
-                'SELECT * FROM tickets WHERE channel_id = $1', interaction.channel.id
+        ticket = await db.get_ticket(interaction.channel.id)
+        if not ticket:
+            return await interaction.response.send_message(
+                embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245), ephemeral=True
             )
-            if not ticket:
-                return await interaction.response.send_message(
-                    embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245), ephemeral=True
-                )
-            if ticket['claimed_by']:
-                who = interaction.guild.get_member(ticket['claimed_by'])
-                return await interaction.response.send_message(
-                    embed=discord.Embed(
-                        description=f'This ticket is already claimed by {who.mention if who else "someone"}.',
-                        color=0xED4245
-                    ),
-                    ephemeral=True
-                )
-            await c.execute(
-                "UPDATE tickets SET claimed_by=$1, status='claimed' WHERE ticket_id=$2",
-                interaction.user.id, ticket['ticket_id']
+        if ticket['claimed_by']:
+            who = interaction.guild.get_member(ticket['claimed_by'])
+            return await interaction.response.send_message(
+                embed=discord.Embed(
+                    description=f'This ticket is already claimed by {who.mention if who else "someone"}.',
+                    color=0xED4245
+                ),
+                ephemeral=True
             )
-            await c.execute(
-                '''INSERT INTO ticket_stats (guild_id, user_id, claimed) VALUES ($1,$2,1)
-                   ON CONFLICT (guild_id, user_id) DO UPDATE SET claimed = ticket_stats.claimed + 1''',
-                interaction.guild.id, interaction.user.id
+        won, holder = await db.claim_ticket(ticket, interaction.user.id)
+        if not won:
+            who = interaction.guild.get_member(holder) if holder else None
+            return await interaction.response.send_message(
+                embed=discord.Embed(
+                    description=f'This ticket is already claimed by {who.mention if who else "someone"}.',
+                    color=0xED4245
+                ),
+                ephemeral=True
             )
         creator = interaction.guild.get_member(ticket['user_id'])
         await claim_lock(interaction.channel, interaction.user, creator, ticket['ticket_type'])
@@ -1013,34 +3384,32 @@ class ControlView(View):
             return await interaction.response.send_message(
                 embed=discord.Embed(title='⏳  Slow Down', description=f'Please wait **{rem:.1f}s** before trying again.', color=0xFEE75C), ephemeral=True
             )
-        async with db.pool.acquire() as c:
-            ticket = await c.fetchrow(
-                'SELECT * FROM tickets WHERE channel_id = $1', interaction.channel.id
+        ticket = await db.get_ticket(interaction.channel.id)
+        if not ticket:
+            return await interaction.response.send_message(
+                embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245), ephemeral=True
+            )
+        if not ticket['claimed_by']:
+            return await interaction.response.send_message(
+                embed=discord.Embed(description="This ticket hasn't been claimed yet.", color=0xED4245), ephemeral=True
             )
-            if not ticket:
-                return await interaction.response.send_message(
-                    embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245), ephemeral=True
-                )
-            if not ticket['claimed_by']:
-                return await interaction.response.send_message(
-                    embed=discord.Embed(description="This ticket hasn't been claimed yet.", color=0xED4245), ephemeral=True
-                )
-            is_mm      = ticket['ticket_type'] == 'middleman'
-            is_claimer = ticket['claimed_by'] == interaction.user.id
-            is_admin   = interaction.user.guild_permissions.administrator
-            if is_mm and not is_claimer:
-                return await interaction.response.send_message(
-                    embed=discord.Embed(description='Only the staff member who claimed this ticket can unclaim it.', color=0xED4245),
-                    ephemeral=True
-                )
-            if not is_mm and not is_claimer and not is_admin:
-                return await interaction.response.send_message(
-                    embed=discord.Embed(description="You didn't claim this ticket.", color=0xED4245),
-                    ephemeral=True
-                )
-            await c.execute(
-                "UPDATE tickets SET claimed_by=NULL, status='open' WHERE ticket_id=$1",
-                ticket['ticket_id']
+        is_mm      = ticket['ticket_type'] == 'middleman'
+        is_claimer = ticket['claimed_by'] == interaction.user.id
+        is_admin   = interaction.user.guild_permissions.administrator
+        if is_mm and not is_claimer:
+            return await interaction.response.send_message(
+                embed=discord.Embed(description='Only the staff member who claimed this ticket can unclaim it.', color=0xED4245),
+                ephemeral=True
+            )
+        if not is_mm and not is_claimer and not is_admin:
+            return await interaction.response.send_message(
+                embed=discord.Embed(description="You didn't claim this ticket.", color=0xED4245),
+                ephemeral=True
+            )
+        if not await db.unclaim_ticket(ticket):
+            return await interaction.response.send_message(
+                embed=discord.Embed(description='This ticket changed while you were unclaiming it. Please try again.', color=0xFEE75C),
+                ephemeral=True
             )
         old = interaction.guild.get_member(ticket['claimed_by'])
         await claim_unlock(interaction.channel, old, ticket['ticket_type'])
@@ -1056,8 +3425,7 @@ class ControlView(View):
                 embed=discord.Embed(description='You need a staff role to close tickets.', color=0xED4245),
                 ephemeral=True
             )
-        async with db.pool.acquire() as c:
-            ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', interaction.channel.id)
+        ticket = await db.get_ticket(interaction.channel.id)
         if not ticket:
             return await interaction.response.send_message(
                 embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245),
@@ -1110,17 +3478,9 @@ class CloseConfirm(View):
                 ephemeral=True
             )
         await interaction.response.defer()
-        async with db.pool.acquire() as c:
-            await c.execute(
-                "UPDATE tickets SET status='closed' WHERE ticket_id=$1",
-                self.ticket['ticket_id']
-            )
-            if self.ticket.get('claimed_by'):
-                await c.execute(
-                    '''INSERT INTO ticket_stats (guild_id, user_id, closed) VALUES ($1,$2,1)
-                       ON CONFLICT (guild_id, user_id) DO UPDATE SET closed = ticket_stats.closed + 1''',
-                    interaction.guild.id, self.ticket['claimed_by']
-                )
+        await db.close_ticket(self.ticket)
+        if self.ticket.get('claimed_by'):
+            counters.bump('ticket_stats', interaction.guild.id, self.ticket['claimed_by'], closed=1)
         e = discord.Embed(color=0xED4245)
         e.title       = '🔒  Closing Ticket'
         e.description = f'Closing ticket **#{self.ticket["ticket_id"]}** — saving the transcript. This channel will be deleted shortly.'
@@ -1162,8 +3522,7 @@ async def close_cmd(ctx):
     if not limiter.check(ctx.author.id, 'close', 3):
         rem = limiter.remaining(ctx.author.id, 'close', 3)
         return await ctx.reply(embed=discord.Embed(description=f'Please wait **{rem:.1f}s** before trying to close again.', color=0xFEE75C))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
+    ticket = await db.get_ticket(ctx.channel.id)
     if not ticket:
         return await ctx.reply(embed=discord.Embed(description='Could not find a ticket record for this channel.', color=0xED4245))
     is_mm         = ticket['ticket_type'] == 'middleman'
@@ -1194,27 +3553,24 @@ async def close_cmd(ctx):
 async def claim_cmd(ctx):
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.reply(embed=discord.Embed(description='This command can only be used inside a ticket channel.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
-        if not ticket:
-            return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
-        if ticket['claimed_by']:
-            who = ctx.guild.get_member(ticket['claimed_by'])
-            return await ctx.reply(embed=discord.Embed(
-                description=f'This ticket is already claimed by {who.mention if who else "someone"}.',
-                color=0xED4245
-            ))
-        if not await _can_manage(ctx, ticket):
-            return await ctx.reply(embed=discord.Embed(description="You don't have the required role to claim this type of ticket.", color=0xED4245))
-        await c.execute(
-            "UPDATE tickets SET claimed_by=$1, status='claimed' WHERE ticket_id=$2",
-            ctx.author.id, ticket['ticket_id']
-        )
-        await c.execute(
-            '''INSERT INTO ticket_stats (guild_id, user_id, claimed) VALUES ($1,$2,1)
-               ON CONFLICT (guild_id, user_id) DO UPDATE SET claimed = ticket_stats.claimed + 1''',
-            ctx.guild.id, ctx.author.id
-        )
+    ticket = await db.get_ticket(ctx.channel.id)
+    if not ticket:
+        return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
+    if ticket['claimed_by']:
+        who = ctx.guild.get_member(ticket['claimed_by'])
+        return await ctx.reply(embed=discord.Embed(
+            description=f'This ticket is already claimed by {who.mention if who else "someone"}.',
+            color=0xED4245
+        ))
+    if not await _can_manage(ctx, ticket):
+        return await ctx.reply(embed=discord.Embed(description="You don't have the required role to claim this type of ticket.", color=0xED4245))
+    won, holder = await db.claim_ticket(ticket, ctx.author.id)
+    if not won:
+        who = ctx.guild.get_member(holder) if holder else None
+        return await ctx.reply(embed=discord.Embed(
+            description=f'This ticket is already claimed by {who.mention if who else "someone"}.',
+            color=0xED4245
+        ))
     creator = ctx.guild.get_member(ticket['user_id'])
     await claim_lock(ctx.channel, ctx.author, creator, ticket['ticket_type'])
     e = discord.Embed(color=0x57F287)
@@ -1236,23 +3592,20 @@ async def claim_cmd(ctx):
 async def unclaim_cmd(ctx):
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.reply(embed=discord.Embed(description='This command can only be used inside a ticket channel.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
-        if not ticket:
-            return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
-        if not ticket['claimed_by']:
-            return await ctx.reply(embed=discord.Embed(description="This ticket hasn't been claimed yet.", color=0xED4245))
-        is_mm      = ticket['ticket_type'] == 'middleman'
-        is_claimer = ticket['claimed_by'] == ctx.author.id
-        is_admin   = ctx.author.guild_permissions.administrator
-        if is_mm and not is_claimer:
-            return await ctx.reply(embed=discord.Embed(description='Only the staff member who claimed this ticket can unclaim it.', color=0xED4245))
-        if not is_mm and not is_claimer and not is_admin:
-            return await ctx.reply(embed=discord.Embed(description="You didn't claim this ticket.", color=0xED4245))
-        await c.execute(
-            "UPDATE tickets SET claimed_by=NULL, status='open' WHERE ticket_id=$1",
-            ticket['ticket_id']
-        )
+    ticket = await db.get_ticket(ctx.channel.id)
+    if not ticket:
+        return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
+    if not ticket['claimed_by']:
+        return await ctx.reply(embed=discord.Embed(description="This ticket hasn't been claimed yet.", color=0xED4245))
+    is_mm      = ticket['ticket_type'] == 'middleman'
+    is_claimer = ticket['claimed_by'] == ctx.author.id
+    is_admin   = ctx.author.guild_permissions.administrator
+    if is_mm and not is_claimer:
+        return await ctx.reply(embed=discord.Embed(description='Only the staff member who claimed this ticket can unclaim it.', color=0xED4245))
+    if not is_mm and not is_claimer and not is_admin:
+        return await ctx.reply(embed=discord.Embed(description="You didn't claim this ticket.", color=0xED4245))
+    if not await db.unclaim_ticket(ticket):
+        return await ctx.reply(embed=discord.Embed(description='This ticket changed while you were unclaiming it. Please try again.', color=0xFEE75C))
     old = ctx.guild.get_member(ticket['claimed_by'])
     await claim_unlock(ctx.channel, old, ticket['ticket_type'])
     e = discord.Embed(color=0x5865F2)
@@ -1268,8 +3621,7 @@ async def add_cmd(ctx, member: discord.Member = None):
         return await ctx.reply(embed=discord.Embed(description='**Usage:** `$add @user`\nGrants a user access to send messages in this ticket.', color=0x5865F2))
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.reply(embed=discord.Embed(description='This command can only be used inside a ticket channel.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
+    ticket = await db.get_ticket(ctx.channel.id)
     if not ticket:
         return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
     if not ticket.get('claimed_by'):
@@ -1291,8 +3643,7 @@ async def remove_cmd(ctx, member: discord.Member = None):
         return await ctx.reply(embed=discord.Embed(description='**Usage:** `$remove @user`\nRevokes a user\'s access to this ticket.', color=0x5865F2))
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.reply(embed=discord.Embed(description='This command can only be used inside a ticket channel.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
+    ticket = await db.get_ticket(ctx.channel.id)
     if not ticket or not await _can_manage(ctx, ticket):
         return await ctx.reply(embed=discord.Embed(description="You don't have permission to manage this ticket.", color=0xED4245))
     await ctx.channel.set_permissions(member, overwrite=None)
@@ -1310,8 +3661,7 @@ async def rename_cmd(ctx, *, new_name: str = None):
         return await ctx.reply(embed=discord.Embed(description='**Usage:** `$rename <name>`\nRenames the ticket channel.', color=0x5865F2))
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.reply(embed=discord.Embed(description='This command can only be used inside a ticket channel.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
+    ticket = await db.get_ticket(ctx.channel.id)
     if not ticket or not await _can_manage(ctx, ticket):
         return await ctx.reply(embed=discord.Embed(description="You don't have permission to rename this ticket.", color=0xED4245))
     safe     = re.sub(r'[^a-z0-9\-]', '-', new_name.lower())
@@ -1331,24 +3681,24 @@ async def transfer_cmd(ctx, member: discord.Member = None):
         return await ctx.reply(embed=discord.Embed(description='**Usage:** `$transfer @user`\nTransfers your claim on this ticket to another staff member.', color=0x5865F2))
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.reply(embed=discord.Embed(description='This command can only be used inside a ticket channel.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
-        if not ticket:
-            return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
-        if not ticket['claimed_by']:
-            return await ctx.reply(embed=discord.Embed(description="This ticket hasn't been claimed yet. Claim it first before transferring.", color=0xED4245))
-        is_mm      = ticket['ticket_type'] == 'middleman'
-        is_claimer = ticket['claimed_by'] == ctx.author.id
-        is_admin   = ctx.author.guild_permissions.administrator
-        if is_mm and not is_claimer:
-            return await ctx.reply(embed=discord.Embed(description='Only the staff member who claimed this ticket can transfer it.', color=0xED4245))
-        if not is_mm and not is_claimer and not is_admin:
-            return await ctx.reply(embed=discord.Embed(description="You didn't claim this ticket.", color=0xED4245))
-        old = ctx.guild.get_member(ticket['claimed_by'])
-        if old:
-            await ctx.channel.set_permissions(old, read_messages=True, send_messages=False)
-        await ctx.channel.set_permissions(member, read_messages=True, send_messages=True)
-        await c.execute("UPDATE tickets SET claimed_by=$1, status='claimed' WHERE ticket_id=$2", member.id, ticket['ticket_id'])
+    ticket = await db.get_ticket(ctx.channel.id)
+    if not ticket:
+        return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
+    if not ticket['claimed_by']:
+        return await ctx.reply(embed=discord.Embed(description="This ticket hasn't been claimed yet. Claim it first before transferring.", color=0xED4245))
+    is_mm      = ticket['ticket_type'] == 'middleman'
+    is_claimer = ticket['claimed_by'] == ctx.author.id
+    is_admin   = ctx.author.guild_permissions.administrator
+    if is_mm and not is_claimer:
+        return await ctx.reply(embed=discord.Embed(description='Only the staff member who claimed this ticket can transfer it.', color=0xED4245))
+    if not is_mm and not is_claimer and not is_admin:
+        return await ctx.reply(embed=discord.Embed(description="You didn't claim this ticket.", color=0xED4245))
+    if not await db.transfer_ticket(ticket, member.id):
+        return await ctx.reply(embed=discord.Embed(description='This ticket changed while you were transferring it. Please try again.', color=0xFEE75C))
+    old     = ctx.guild.get_member(ticket['claimed_by'])
+    members = {old: False} if old else {}
+    members[member] = True
+    await apply_overwrites(ctx.channel, ticket_overwrites(ctx.channel, 'claimed', members))
     e = discord.Embed(color=0x57F287)
     e.title       = '🔄  Ticket Transferred'
     e.description = f'This ticket has been transferred from **{ctx.author.mention}** to **{member.mention}**.'
@@ -1362,20 +3712,14 @@ async def transfer_cmd(ctx, member: discord.Member = None):
 async def locktic_cmd(ctx):
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.reply(embed=discord.Embed(description='This command can only be used inside a ticket channel.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
+    ticket = await db.get_ticket(ctx.channel.id)
     if not ticket:
         return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
     if not ticket.get('claimed_by'):
         return await ctx.reply(embed=discord.Embed(description='This ticket must be claimed before it can be locked.', color=0xFEE75C))
     if ticket['claimed_by'] != ctx.author.id and not ctx.author.guild_permissions.administrator:
         return await ctx.reply(embed=discord.Embed(description='Only the staff member who claimed this ticket can lock it.', color=0xED4245))
-    for key in ROLES.keys():
-        r = ctx.guild.get_role(ROLES[key])
-        if r:
-            ow = ctx.channel.overwrites_for(r)
-            ow.send_messages = False
-            await ctx.channel.set_permissions(r, overwrite=ow)
+    await apply_overwrites(ctx.channel, ticket_overwrites(ctx.channel, 'locked'))
     e = discord.Embed(color=0xED4245)
     e.title       = '🔒  Ticket Locked'
     e.description = 'This ticket has been locked. Only the claimer and the ticket creator can send messages here.\n\nRun `$unlocktic` to restore access.'
@@ -1388,20 +3732,14 @@ async def locktic_cmd(ctx):
 async def unlocktic_cmd(ctx):
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.reply(embed=discord.Embed(description='This command can only be used inside a ticket channel.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
+    ticket = await db.get_ticket(ctx.channel.id)
     if not ticket:
         return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
     if not ticket.get('claimed_by'):
         return await ctx.reply(embed=discord.Embed(description='This ticket must be claimed before it can be unlocked.', color=0xFEE75C))
     if ticket['claimed_by'] != ctx.author.id and not ctx.author.guild_permissions.administrator:
         return await ctx.reply(embed=discord.Embed(description='Only the staff member who claimed this ticket can unlock it.', color=0xED4245))
-    for key in ROLES.keys():
-        r = ctx.guild.get_role(ROLES[key])
-        if r:
-            ow = ctx.channel.overwrites_for(r)
-            ow.send_messages = True
-            await ctx.channel.set_permissions(r, overwrite=ow)
+    await apply_overwrites(ctx.channel, ticket_overwrites(ctx.channel, 'open'))
     e = discord.Embed(color=0x57F287)
     e.title       = '🔓  Ticket Unlocked'
     e.description = 'This ticket has been unlocked. Everyone with access can now send messages again.'
@@ -1414,8 +3752,7 @@ async def unlocktic_cmd(ctx):
 async def proof_cmd(ctx):
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.reply(embed=discord.Embed(description='This command can only be used inside a ticket channel.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
+    ticket = await db.get_ticket(ctx.channel.id)
     if not ticket:
         return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
     proof_ch = ctx.guild.get_channel(PROOF_CHANNEL)
@@ -1664,11 +4001,8 @@ async def setup_cmd(ctx):
 async def setcategory_cmd(ctx, category: discord.CategoryChannel = None):
     if not category:
         return await ctx.reply(embed=discord.Embed(title='📁  Set Category', description='**Usage:** `$setcategory #category`\nSets the category where new ticket channels will be created.', color=0x5865F2))
-    async with db.pool.acquire() as c:
-        await c.execute(
-            'INSERT INTO config (guild_id, ticket_category_id) VALUES ($1,$2) ON CONFLICT (guild_id) DO UPDATE SET ticket_category_id=$2',
-            ctx.guild.id, category.id
-        )
+    await db.set_config(ctx.guild.id, 'ticket_category_id', category.id)
+    channel_pool.wake(ctx.guild)   # moves the pool: adopts the new category, deletes the old one's
     e = discord.Embed(color=0x57F287)
     e.title       = '✅  Category Updated'
     e.description = f'New ticket channels will now be created under **{category.name}**.'
@@ -1681,11 +4015,7 @@ async def setcategory_cmd(ctx, category: discord.CategoryChannel = None):
 async def setlogs_cmd(ctx, channel: discord.TextChannel = None):
     if not channel:
         return await ctx.reply(embed=discord.Embed(title='📋  Set Logs', description='**Usage:** `$setlogs #channel`\nSets the channel where ticket transcripts and audit logs are sent.', color=0x5865F2))
-    async with db.pool.acquire() as c:
-        await c.execute(
-            'INSERT INTO config (guild_id, log_channel_id) VALUES ($1,$2) ON CONFLICT (guild_id) DO UPDATE SET log_channel_id=$2',
-            ctx.guild.id, channel.id
-        )
+    await db.set_config(ctx.guild.id, 'log_channel_id', channel.id)
     e = discord.Embed(color=0x57F287)
     e.title       = '✅  Log Channel Updated'
     e.description = f'Ticket transcripts and audit logs will now be sent to {channel.mention}.'
@@ -1696,15 +4026,15 @@ async def setlogs_cmd(ctx, channel: discord.TextChannel = None):
 @bot.command(name='config')
 @owner_only()
 async def config_cmd(ctx):
-    async with db.pool.acquire() as c:
-        cfg = await c.fetchrow('SELECT * FROM config WHERE guild_id=$1', ctx.guild.id)
+    cfg = await db.get_config(ctx.guild.id)
     e = discord.Embed(title='⚙️  Bot Configuration', color=TIER_COLOR['support'])
 
     cat  = ctx.guild.get_channel(cfg['ticket_category_id']) if cfg and cfg.get('ticket_category_id') else None
     logs = ctx.guild.get_channel(cfg['log_channel_id'])     if cfg and cfg.get('log_channel_id')     else None
     e.add_field(name='📁  Category',      value=cat.mention  if cat  else 'Not Set', inline=True)
     e.add_field(name='📋  Log Channel',    value=logs.mention if logs else 'Not Set', inline=True)
-    e.add_field(name='🎫  Total Tickets',  value=str(cfg['ticket_counter'] if cfg else 0), inline=True)
+    issued = ticket_numbers.issued(ctx.guild.id)
+    e.add_field(name='🎫  Total Tickets',  value=str(issued if issued is not None else (cfg['ticket_counter'] if cfg else 0)), inline=True)
     e.add_field(name='🔒  Ticket Status',  value='🔒 Locked' if tickets_locked.get(ctx.guild.id) else '🟢 Open', inline=True)
 
     welcome_ch = ctx.guild.get_channel(WELCOME_CHANNEL)
@@ -1730,6 +4060,72 @@ async def config_cmd(ctx):
     await ctx.reply(embed=e)
 
 
+@bot.command(name='dbstats')
+@owner_only()
+async def dbstats_cmd(ctx, n: int = 10):
+    top = query_stats.top(max(1, min(n, 20)))
+    if not top:
+        return await ctx.reply(embed=discord.Embed(description='No statements have been recorded yet.', color=0xFEE75C))
+    lines = []
+    for i, (fp, s) in enumerate(top, 1):
+        tags = ', '.join(t for t, _ in sorted(s['tags'].items(), key=lambda kv: kv[1], reverse=True)[:3])
+        errs = f'  •  ⚠️ {s["errors"]} err' if s['errors'] else ''
+        lines.append(
+            f'`{i}.` **{s["total"]:.0f}ms** total  •  {s["n"]} call{"s" if s["n"] != 1 else ""}  •  '
+            f'p50 ≤{query_stats.pct(fp, 0.5):.0f}ms  p99 ≤{query_stats.pct(fp, 0.99):.0f}ms  max {s["max"]:.0f}ms{errs}\n'
+            f'-# {tags}\n'
+            f'```sql\n{fp[:160]}{"…" if len(fp) > 160 else ""}```'
+        )
+    e = discord.Embed(title='🗄️  Top Statements by Total Time', color=0x5865F2)
+    e.description = '\n'.join(lines)[:4096]
+    e.set_footer(text=f'{len(query_stats.stats)} distinct statement(s) since {BOT_START.strftime("%b %d %H:%M")} UTC  •  slow log > {DB_SLOW_MS:.0f}ms')
+    await ctx.reply(embed=e)
+
+
+@bot.command(name='chanpool')
+@owner_only()
+async def chanpool_cmd(ctx):
+    depth = channel_pool.depth(ctx.guild.id)
+    taken = channel_pool.hits + channel_pool.misses
+    rate  = f'{channel_pool.hits / taken * 100:.0f}%' if taken else '—'
+    e = discord.Embed(title='🧊  Channel Pool', color=0x5865F2)
+    e.description = (
+        '\n'.join(f'> `{kind}` — **{n}** / {CHANNEL_POOL_DEPTH} ready' for kind, n in depth.items()) + '\n\n'
+        f'> 🎯  Hits **{channel_pool.hits}**  ·  Misses **{channel_pool.misses}**  ·  Hit rate **{rate}**\n'
+        f'> 🏗️  Created **{channel_pool.created}**  ·  Retired **{channel_pool.retired}**  ·  Refilling {"yes" if channel_pool.filling(ctx.guild.id) else "no"}'
+    )
+    e.set_footer(text=f'CHANNEL_POOL_DEPTH={CHANNEL_POOL_DEPTH}  •  CHANNEL_POOL_REFILL_S={CHANNEL_POOL_REFILL_S:g}  •  counts are bot-wide')
+    await ctx.reply(embed=e)
+
+
+@bot.command(name='export')
+@owner_only()
+async def export_cmd(ctx, table: str = None, fmt: str = 'csv'):
+    table, fmt = (table or '').lower(), fmt.lower()
+    if table not in EXPORT_TABLES or fmt not in EXPORT_FORMATS:
+        return await ctx.reply(embed=discord.Embed(
+            title='📦  Export',
+            description=f'**Usage:** `$export <table> [csv|jsonl]`\nTables: {", ".join(f"`{t}`" for t in EXPORT_TABLES)}',
+            color=0x5865F2))
+    async with ctx.typing():
+        with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES) as out:
+            rows = await write_export(db, table, fmt, out, ctx.guild.id)
+            size = out.tell()
+            if size > ctx.guild.filesize_limit:
+                return await ctx.reply(embed=discord.Embed(
+                    title='📦  Export Too Large',
+                    description=(f'`{table}` is **{size / 1048576:.1f} MB** compressed ({rows:,} rows), over this '
+                                 f'server\'s {ctx.guild.filesize_limit / 1048576:.0f} MB upload limit.\n'
+                                 f'Run `python bot.py export {table} --format {fmt} --guild {ctx.guild.id}` on the host instead.'),
+                    color=0xFEE75C))
+            out.seek(0)
+            name = f'{table}-{ctx.guild.id}-{datetime.now(timezone.utc):%Y%m%d}.{fmt}.gz'
+            await ctx.reply(
+                f'📦  **{table}**  •  {rows:,} row{"s" if rows != 1 else ""}  •  {size / 1024:.0f} KB',
+                file=discord.File(out, filename=name),
+            )
+
+
 @bot.command(name='lock')
 @owner_only()
 async def lock_cmd(ctx):
@@ -1759,12 +4155,7 @@ async def unlock_cmd(ctx):
 async def blacklist_cmd(ctx, member: discord.Member = None, *, reason: str = 'no reason given'):
     if not member:
         return await ctx.reply(embed=discord.Embed(title='🚫  Blacklist', description='**Usage:** `$blacklist @user [reason]`\nPrevents a user from opening any tickets.', color=0x5865F2))
-    async with db.pool.acquire() as c:
-        await c.execute(
-            'INSERT INTO blacklist (user_id, guild_id, reason, blacklisted_by) VALUES ($1,$2,$3,$4) '
-            'ON CONFLICT (user_id, guild_id) DO UPDATE SET reason=$3, blacklisted_by=$4, created_at=NOW()',
-            member.id, ctx.guild.id, reason, ctx.author.id
-        )
+    await db.add_blacklist(ctx.guild.id, member.id, reason, ctx.author.id)
     e = discord.Embed(color=0xED4245)
     e.title = '🚫  User Blacklisted'
     e.set_author(name=f'{member.display_name}', icon_url=member.display_avatar.url)
@@ -1781,11 +4172,7 @@ async def blacklist_cmd(ctx, member: discord.Member = None, *, reason: str = 'no
 async def unblacklist_cmd(ctx, member: discord.Member = None):
     if not member:
         return await ctx.reply(embed=discord.Embed(title='✅  Unblacklist', description='**Usage:** `$unblacklist @user`\nRemoves a user from the blacklist and restores their ability to open tickets.', color=0x5865F2))
-    async with db.pool.acquire() as c:
-        result = await c.execute(
-            'DELETE FROM blacklist WHERE user_id=$1 AND guild_id=$2', member.id, ctx.guild.id
-        )
-    if result == 'DELETE 0':
+    if not await db.remove_blacklist(ctx.guild.id, member.id):
         return await ctx.reply(embed=discord.Embed(description=f'{member.mention} is not currently blacklisted.', color=0xFEE75C))
     e = discord.Embed(color=0x57F287)
     e.title       = '✅  Unblacklisted'
@@ -1797,8 +4184,7 @@ async def unblacklist_cmd(ctx, member: discord.Member = None):
 @bot.command(name='blacklists')
 @owner_only()
 async def blacklists_cmd(ctx):
-    async with db.pool.acquire() as c:
-        rows = await c.fetch('SELECT * FROM blacklist WHERE guild_id=$1 ORDER BY created_at DESC', ctx.guild.id)
+    rows = await db.list_blacklist(ctx.guild.id)
     if not rows:
         return await ctx.reply(embed=discord.Embed(title='🚫  Blacklist', description='No users are currently blacklisted.', color=0x57F287))
     lines = []
@@ -1817,42 +4203,18 @@ async def blacklists_cmd(ctx):
 
 # ================================================================== invite commands
 
+async def get_breakdown(guild_id: int, inviter_id: int) -> dict:
+    """An inviter's invite_breakdown counts including unflushed deltas."""
+    row = await db.get_invite_breakdown(guild_id, inviter_id)
+    return counters.overlay('invite_breakdown', guild_id, inviter_id, row)
+
+
 @bot.command(name='invites')
 async def invites_cmd(ctx, member: discord.Member = None):
     member = member or ctx.author
-    verified_role = ctx.guild.get_role(VERIFIED_ROLE)
-
-    # Pull every member this person has invited
-    async with db.pool.acquire() as c:
-        rows = await c.fetch(
-            "SELECT user_id, is_rejoin FROM member_invites WHERE guild_id=$1 AND inviter_id=$2",
-            ctx.guild.id, member.id
-        )
-
-    joins    = len(rows)
-    left     = 0
-    rejoins  = 0
-    fake     = 0
-    verified = 0
-
-    now_utc = datetime.now(timezone.utc)
-
-    for r in rows:
-        invited_m = ctx.guild.get_member(r['user_id'])
-        is_rejoin = r.get('is_rejoin', False)
-
-        if is_rejoin:
-            rejoins += 1
-        elif invited_m is None:
-            left += 1
-        else:
-            acc = invited_m.created_at if invited_m.created_at.tzinfo else invited_m.created_at.replace(tzinfo=timezone.utc)
-            if (now_utc - acc).days < 3:
-                fake += 1
-            elif verified_role and verified_role in invited_m.roles:
-                verified += 1
-
-    real = joins - left - rejoins - fake
+    b      = await get_breakdown(ctx.guild.id, member.id)
+    real   = b['joins'] - b['departed'] - b['rejoins'] - b['fake']
+    stats  = counters.overlay('invite_stats', ctx.guild.id, member.id, await db.get_invite_stats(ctx.guild.id, member.id))
 
     e = discord.Embed(title='📨  Invite Log', color=0x5865F2)
     e.set_author(name=member.display_name, icon_url=member.display_avatar.url)
@@ -1860,26 +4222,23 @@ async def invites_cmd(ctx, member: discord.Member = None):
     e.description = (
         f'**{member.mention} has {real} real {"invite" if real == 1 else "invites"}**\n'
         f'\n'
-        f'> 📥  Joins       **{joins}**\n'
-        f'> 🚪  Left         **{left}**\n'
-        f'> 🔄  Rejoins   **{rejoins}**\n'
-        f'> 🤖  Fake        **{fake}**\n'
-        f'> ✅  Verified   **{verified}**'
+        f'> 📥  Joins       **{b["joins"]}**\n'
+        f'> 🚪  Left         **{b["departed"]}**\n'
+        f'> 🔄  Rejoins   **{b["rejoins"]}**\n'
+        f'> 🤖  Fake        **{b["fake"]}**\n'
+        f'> ✅  Verified   **{b["verified"]}**'
     )
+    if stats['unattributed']:
+        e.description += f'\n> 🕓  Offline     **{stats["unattributed"]}**  (joined while the bot was down — not counted)'
     e.set_footer(text=f'Requested by {ctx.author.display_name}')
     await ctx.reply(embed=e)
 
 
 async def build_lb_embed(guild, last_updated: str = None) -> discord.Embed:
-    async with db.pool.acquire() as c:
-        rows = await c.fetch(
-            '''SELECT inviter_id, joins, leaves, fake, rejoins, verified
-               FROM invite_stats
-               WHERE guild_id=$1
-               ORDER BY (joins - leaves - fake) DESC
-               LIMIT 10''',
-            guild.id
-        )
+    # stored top 10 with this process's unflushed deltas laid over, re-sorted; counter_flush persists them
+    rows = [{'inviter_id': row['inviter_id'], **counters.overlay('invite_stats', guild.id, row['inviter_id'], row)}
+            for row in await db.invite_leaderboard(guild.id, 10)]
+    rows.sort(key=lambda r: (-(r['joins'] - r['leaves'] - r['fake']), r['inviter_id']))
     if not rows:
         e = discord.Embed(title='🏆  Invite Leaderboard', color=0x5865F2)
         e.set_author(name=guild.name, icon_url=guild.icon.url if guild.icon else None)
@@ -1902,18 +4261,94 @@ async def build_lb_embed(guild, last_updated: str = None) -> discord.Embed:
     e  = discord.Embed(title='🏆  Invite Leaderboard', color=0x5865F2)
     e.set_author(name=guild.name, icon_url=guild.icon.url if guild.icon else None)
     e.description = '\n'.join(lines)
-    e.set_footer(text='Live  ·  Refreshes every 30s')
+    e.set_footer(text=f'Live  ·  Refreshes every {LB_REFRESH_S}s')
     return e
 
 
+LB_REFRESH_S = 30
+
+
+class LeaderboardHub:
+    """
+    One live leaderboard per guild, shared by every $lb message in it. Each tick the
+    embed is rebuilt only if the guild's invite_stats changed since the last build, and
+    the same embed is then pushed to every subscribed message. The hub removes itself
+    when its last subscriber stops, times out or has its message deleted.
+    """
+    hubs: dict = {}   # guild_id -> hub
+    builds     = 0    # embeds built across all hubs
+
+    def __init__(self, guild: discord.Guild):
+        self.guild   = guild
+        self.views   = set()
+        self.embed   = None
+        self.version = None
+        self.task    = None
+
+    @classmethod
+    def for_guild(cls, guild: discord.Guild) -> 'LeaderboardHub':
+        hub = cls.hubs.get(guild.id)
+        if hub is None:
+            hub = cls.hubs[guild.id] = cls(guild)
+        return hub
+
+    async def current(self) -> discord.Embed:
+        """The leaderboard embed — the cached one unless invite_stats changed since it was built."""
+        version = counters.version('invite_stats', self.guild.id)
+        if self.embed is None or version != self.version:
+            self.embed   = await build_lb_embed(self.guild)
+            self.version = version
+            LeaderboardHub.builds += 1
+        return self.embed
+
+    def subscribe(self, view: 'LiveLBView'):
+        self.views.add(view)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def unsubscribe(self, view: 'LiveLBView'):
+        self.views.discard(view)
+        if self.views:
+            return
+        if self.hubs.get(self.guild.id) is self:
+            del self.hubs[self.guild.id]
+        if self.task and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    async def _run(self):
+        try:
+            while self.views:
+                await asyncio.sleep(LB_REFRESH_S)
+                before = self.embed
+                e      = await self.current()
+                if e is before:
+                    continue
+                views   = list(self.views)
+                results = await asyncio.gather(*(v.message.edit(embed=e, view=v) for v in views), return_exceptions=True)
+                for v, r in zip(views, results):
+                    if isinstance(r, Exception):
+                        self.unsubscribe(v)
+                        v.stop()
+        except asyncio.CancelledError:
+            pass
+        except Exception as ex:
+            logger.error(f'live leaderboard {self.guild.id}: {ex}')
+            for v in list(self.views):
+                self.unsubscribe(v)
+
+
 class LiveLBView(View):
-    def __init__(self, author_id: int):
+    def __init__(self, author_id: int, hub: LeaderboardHub):
         super().__init__(timeout=300)
         self.author_id = author_id
-        self.stopped   = False
-        self.task      = None
+        self.hub       = hub
         self.message   = None
 
+    def _final(self, footer: str) -> discord.Embed:
+        e = (self.hub.embed or discord.Embed(title='🏆  Invite Leaderboard', color=0x5865F2)).copy()
+        e.set_footer(text=footer)
+        return e
+
     @discord.ui.button(label='Stop', style=ButtonStyle.red, custom_id='lb_stop')
     async def stop_btn(self, interaction: discord.Interaction, _):
         if interaction.user.id != self.author_id:
@@ -1921,52 +4356,22 @@ class LiveLBView(View):
                 embed=discord.Embed(description='This leaderboard belongs to someone else.', color=0xED4245),
                 ephemeral=True
             )
-        self.stopped = True
-        if self.task:
-            self.task.cancel()
+        self.hub.unsubscribe(self)
         self.stop()
-        e = await build_lb_embed(interaction.guild)
-        e.set_footer(text='stopped — run $lb again to restart')
-        await interaction.response.edit_message(embed=e, view=None)
+        await interaction.response.edit_message(embed=self._final('stopped — run $lb again to restart'), view=None)
 
     async def on_timeout(self):
-        self.stopped = True
-        if self.task:
-            self.task.cancel()
+        self.hub.unsubscribe(self)
         try:
-            e = await build_lb_embed(self.message.guild)
-            e.set_footer(text='timed out — run $lb to restart')
-            await self.message.edit(embed=e, view=None)
+            await self.message.edit(embed=self._final('timed out — run $lb to restart'), view=None)
         except Exception:
             pass
 
 
-async def live_lb_loop(view: LiveLBView, guild):
-    try:
-        while not view.stopped:
-            await asyncio.sleep(30)
-            if view.stopped:
-                break
-            e  = await build_lb_embed(guild)
-            try:
-                await view.message.edit(embed=e, view=view)
-            except Exception:
-                break
-    except asyncio.CancelledError:
-        pass
-
-
-
 @bot.command(name='whoinvited')
 async def whoinvited_cmd(ctx, member: discord.Member = None):
     member = member or ctx.author
-    async with db.pool.acquire() as c:
-        row = await c.fetchrow(
-            "SELECT mi.inviter_id, mi.joined_at, mi.is_rejoin "
-            "FROM member_invites mi "
-            "WHERE mi.guild_id=$1 AND mi.user_id=$2",
-            ctx.guild.id, member.id
-        )
+    row = await db.member_invite(ctx.guild.id, member.id)
     if not row or not row['inviter_id']:
         e = discord.Embed(color=0xED4245)
         e.set_author(name=member.display_name, icon_url=member.display_avatar.url)
@@ -1997,11 +4402,8 @@ async def whoinvited_cmd(ctx, member: discord.Member = None):
 
     inviter_str = inviter.mention if inviter else f'`{row["inviter_id"]}`'
 
-    async with db.pool.acquire() as c:
-        inv_stats = await c.fetchrow(
-            'SELECT joins, leaves, fake, rejoins FROM invite_stats WHERE guild_id=$1 AND inviter_id=$2',
-            ctx.guild.id, row['inviter_id']
-        )
+    inv_stats    = await db.get_invite_stats(ctx.guild.id, row['inviter_id'])
+    inv_stats    = counters.overlay('invite_stats', ctx.guild.id, row['inviter_id'], inv_stats)
     real_invites = 0
     if inv_stats:
         real_invites = inv_stats['joins'] - inv_stats['leaves'] - inv_stats['fake'] - inv_stats['rejoins']
@@ -2022,62 +4424,49 @@ async def whoinvited_cmd(ctx, member: discord.Member = None):
 
 @bot.command(name='lb', aliases=['leaderboardinvites', 'lbi', 'invitelb'])
 async def lb_cmd(ctx):
-    view         = LiveLBView(author_id=ctx.author.id)
-    e            = await build_lb_embed(ctx.guild)
-    msg          = await ctx.reply(embed=e, view=view)
-    view.message = msg
-    view.task    = asyncio.create_task(live_lb_loop(view, ctx.guild))
+    hub          = LeaderboardHub.for_guild(ctx.guild)
+    view         = LiveLBView(ctx.author.id, hub)
+    e            = await hub.current()
+    view.message = await ctx.reply(embed=e, view=view)
+    hub.subscribe(view)
 
 
-@bot.command(name='invited')
-async def invited_cmd(ctx, member: discord.Member = None):
-    if not member:
-        return await ctx.reply(embed=discord.Embed(title='👥  Invited', description='**Usage:** `$invited @user`\nShows everyone a user has invited with their current status.', color=0x5865F2))
-    async with db.pool.acquire() as c:
-        rows = await c.fetch(
-            '''SELECT mi.user_id, mi.joined_at, mi.is_rejoin
-               FROM member_invites mi
-               WHERE mi.guild_id=$1 AND mi.inviter_id=$2
-               ORDER BY mi.joined_at DESC''',
-            ctx.guild.id, member.id
-        )
-    if not rows:
-        e = discord.Embed(color=0x5865F2)
-        e.set_author(name=member.display_name, icon_url=member.display_avatar.url)
-        e.set_thumbnail(url=member.display_avatar.url)
-        e.description = f'**{member.mention} has not invited anyone yet.**'
-        e.set_footer(text=f'Requested by {ctx.author.display_name}')
-        return await ctx.reply(embed=e)
+@bot.command(name='myrank', aliases=['rank'])
+async def myrank_cmd(ctx, member: discord.Member = None):
+    member = member or ctx.author
+    # unflushed counts come from the buffer (everyone else's are at most one flush behind)
+    stored = await db.get_invite_stats(ctx.guild.id, member.id)
+    s      = counters.overlay('invite_stats', ctx.guild.id, member.id, stored)
+    real   = s['joins'] - s['leaves'] - s['fake']
 
-    verified_role = ctx.guild.get_role(VERIFIED_ROLE)
-    lines  = []
-    counts = {'verified': 0, 'unverified': 0, 'left': 0, 'rejoin': 0}
+    e = discord.Embed(title='🏅  Invite Rank', color=0x5865F2)
+    e.set_author(name=member.display_name, icon_url=member.display_avatar.url)
+    e.set_thumbnail(url=member.display_avatar.url)
+    if stored is None and not any(s.values()):
+        e.description = f'{member.mention} isn\'t on the leaderboard yet — no invites recorded.'
+    else:
+        r     = await db.invite_rank(ctx.guild.id, member.id, real)
+        total = r['total'] + (stored is None)
+        e.description = (
+            f'**{member.mention} is #{r["rank"]} of {total}**\n'
+            f'\n'
+            f'> 📨  Real invites   **{real}**'
+        )
+        if r['next_up'] is not None:
+            gap = r['next_up'] - real
+            e.description += f'\n> ⬆️  Next place     **{gap}** more invite{"s" if gap != 1 else ""}'
+    e.set_footer(text=f'Requested by {ctx.author.display_name}')
+    await ctx.reply(embed=e)
 
-    for r in rows:
-        invited_member = ctx.guild.get_member(r['user_id'])
-        if r.get('is_rejoin'):
-            counts['rejoin'] += 1
-            tag = '🔄'
-        elif invited_member is None:
-            counts['left'] += 1
-            tag = '🚪'
-        elif verified_role and verified_role in invited_member.roles:
-            counts['verified'] += 1
-            tag = '✅'
-        else:
-            counts['unverified'] += 1
-            tag = '❌'
 
-        name = invited_member.mention if invited_member else f'`{r["user_id"]}`'
-        lines.append(f'{tag} {name}')
+INVITED_PAGE = 30
+INVITED_TAG  = {'verified': '✅', 'unverified': '❌', 'left': '🚪', 'rejoin': '🔄', 'fake': '🤖'}
 
-    total = len(rows)
-    real  = total - counts['left'] - counts['rejoin'] - counts['unverified']
 
-    # Split list into two columns
-    half     = (len(lines) + 1) // 2
-    col_left  = lines[:half]
-    col_right = lines[half:]
+def make_invited_embed(member: discord.Member, b: dict, rows: list, page: int, requester: str) -> discord.Embed:
+    total = b['joins']
+    lines = [f'{INVITED_TAG.get(r["state"], "❔")} <@{r["user_id"]}>' for r in rows]
+    half  = (len(lines) + 1) // 2
 
     e = discord.Embed(title=f'👥  Invited by {member.display_name}', color=0x5865F2)
     e.set_author(name=member.display_name, icon_url=member.display_avatar.url)
@@ -2085,17 +4474,93 @@ async def invited_cmd(ctx, member: discord.Member = None):
     e.description = (
         f'{member.mention} has invited **{total}** member{"s" if total != 1 else ""}\n'
         f'\n'
-        f'✅ {counts["verified"]}  ·  🚪 {counts["left"]}  ·  🔄 {counts["rejoin"]}  ·  ❌ {counts["unverified"]}'
+        f'✅ {b["verified"]}  ·  🚪 {b["departed"]}  ·  🔄 {b["rejoins"]}  ·  ❌ {b["unverified"]}  ·  🤖 {b["fake"]}'
     )
-    if col_left:
-        e.add_field(name='​', value='\n'.join(col_left[:15]),  inline=True)
-    if col_right:
-        e.add_field(name='​', value='\n'.join(col_right[:15]), inline=True)
-    if total > 30:
-        e.set_footer(text=f'Showing 30 of {total}  ·  Requested by {ctx.author.display_name}')
+    if lines[:half]:
+        e.add_field(name='​', value='\n'.join(lines[:half]), inline=True)
+    if lines[half:]:
+        e.add_field(name='​', value='\n'.join(lines[half:]), inline=True)
+    first = page * INVITED_PAGE + 1
+    if total > INVITED_PAGE:
+        e.set_footer(text=f'Showing {first}–{first + len(rows) - 1} of {total}  ·  Requested by {requester}')
     else:
+        e.set_footer(text=f'Requested by {requester}')
+    return e
+
+
+class InvitedView(View):
+    """
+    Back / Next over an inviter's members, newest first. Pages are keyset reads:
+    `cursors[i]` is the (joined_at, user_id) page i starts after.
+    """
+    def __init__(self, author: discord.Member, member: discord.Member, b: dict, rows: list, more: bool):
+        super().__init__(timeout=120)
+        self.author  = author
+        self.member  = member
+        self.b       = b
+        self.rows    = rows
+        self.more    = more
+        self.page    = 0
+        self.cursors = [None]
+        self.message = None
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.prev_btn.disabled = self.page == 0
+        self.next_btn.disabled = not self.more
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        if interaction.user.id != self.author.id:
+            return await interaction.response.send_message(
+                embed=discord.Embed(description='This list belongs to someone else.', color=0xED4245),
+                ephemeral=True
+            )
+        if page > self.page and len(self.cursors) <= page:
+            last = self.rows[-1]
+            self.cursors.append((last['joined_at'], last['user_id']))
+        rows = await db.invitees_page(interaction.guild.id, self.member.id, INVITED_PAGE + 1, self.cursors[page])
+        self.page, self.rows, self.more = page, rows[:INVITED_PAGE], len(rows) > INVITED_PAGE
+        self._update_buttons()
+        await interaction.response.edit_message(
+            embed=make_invited_embed(self.member, self.b, self.rows, self.page, self.author.display_name), view=self
+        )
+
+    @discord.ui.button(label='◀  Back', style=ButtonStyle.blurple)
+    async def prev_btn(self, interaction: discord.Interaction, _):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label='Next  ▶', style=ButtonStyle.blurple)
+    async def next_btn(self, interaction: discord.Interaction, _):
+        await self._show(interaction, self.page + 1)
+
+    async def on_timeout(self):
+        try:
+            for item in self.children:
+                item.disabled = True
+            await self.message.edit(view=self)
+        except Exception:
+            pass
+
+
+@bot.command(name='invited')
+async def invited_cmd(ctx, member: discord.Member = None):
+    if not member:
+        return await ctx.reply(embed=discord.Embed(title='👥  Invited', description='**Usage:** `$invited @user`\nShows everyone a user has invited with their current status.', color=0x5865F2))
+    b = await get_breakdown(ctx.guild.id, member.id)
+    if not b['joins']:
+        e = discord.Embed(color=0x5865F2)
+        e.set_author(name=member.display_name, icon_url=member.display_avatar.url)
+        e.set_thumbnail(url=member.display_avatar.url)
+        e.description = f'**{member.mention} has not invited anyone yet.**'
         e.set_footer(text=f'Requested by {ctx.author.display_name}')
-    await ctx.reply(embed=e)
+        return await ctx.reply(embed=e)
+
+    rows = await db.invitees_page(ctx.guild.id, member.id, INVITED_PAGE + 1)
+    e    = make_invited_embed(member, b, rows[:INVITED_PAGE], 0, ctx.author.display_name)
+    if len(rows) <= INVITED_PAGE:
+        return await ctx.reply(embed=e)
+    view = InvitedView(ctx.author, member, b, rows[:INVITED_PAGE], True)
+    view.message = await ctx.reply(embed=e, view=view)
 
 
 @bot.command(name='clearinvites')
@@ -2112,10 +4577,9 @@ async def clearinvites_cmd(ctx, target: str = None):
         return await ctx.reply(embed=e)
 
     if target.lower() == 'all':
-        async with db.pool.acquire() as c:
-            await c.execute('DELETE FROM invite_stats   WHERE guild_id=$1', ctx.guild.id)
-            await c.execute('DELETE FROM member_invites WHERE guild_id=$1', ctx.guild.id)
-            await c.execute('DELETE FROM member_left    WHERE guild_id=$1', ctx.guild.id)
+        await db.clear_invites(ctx.guild.id)
+        counters.discard('invite_stats', ctx.guild.id)
+        counters.discard('invite_breakdown', ctx.guild.id)
         e = discord.Embed(color=0x57F287)
         e.title       = '✅  All Invite Stats Cleared'
         e.description = f'All invite stats across **{ctx.guild.name}** have been reset.'
@@ -2129,11 +4593,8 @@ async def clearinvites_cmd(ctx, target: str = None):
             description=f'Could not find `{target}`. Please mention a member or use `all` to reset everyone.',
             color=0xED4245
         ))
-    async with db.pool.acquire() as c:
-        await c.execute(
-            'DELETE FROM invite_stats WHERE guild_id=$1 AND inviter_id=$2',
-            ctx.guild.id, member.id
-        )
+    await db.clear_invites(ctx.guild.id, member.id)
+    counters.discard('invite_stats', ctx.guild.id, member.id)
     e = discord.Embed(color=0x57F287)
     e.title       = '✅  Invite Stats Cleared'
     e.description = f'All invite stats have been reset for {member.mention}.'
@@ -2170,6 +4631,40 @@ async def on_message_edit(before: discord.Message, after: discord.Message):
     }
 
 
+@bot.event
+async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+    # raw, so edits to messages that fell out of the message cache are still captured
+    if 'content' not in payload.data or not is_ticket_channel(bot.get_channel(payload.channel_id)):
+        return
+    before = payload.cached_message
+    if before is not None and before.content == payload.data['content']:
+        return
+    author = payload.data.get('author') or {}
+    transcripts.add(payload.guild_id, payload.channel_id, payload.message_id, 'edit',
+                    int(author['id']) if 'id' in author else None, author.get('username'),
+                    payload.data['content'], [a['url'] for a in payload.data.get('attachments', [])])
+
+
+@bot.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    if not is_ticket_channel(bot.get_channel(payload.channel_id)):
+        return
+    m = payload.cached_message
+    transcripts.add(payload.guild_id, payload.channel_id, payload.message_id, 'delete',
+                    m.author.id if m else None, m.author.name if m else None, m.content if m else None)
+
+
+@bot.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    if not is_ticket_channel(bot.get_channel(payload.channel_id)):
+        return
+    cached = {m.id: m for m in payload.cached_messages}
+    for mid in sorted(payload.message_ids):
+        m = cached.get(mid)
+        transcripts.add(payload.guild_id, payload.channel_id, mid, 'delete',
+                        m.author.id if m else None, m.author.name if m else None, m.content if m else None)
+
+
 @bot.command(name='snipe', aliases=['sn'])
 async def snipe_cmd(ctx):
     data = snipe_cache.get(ctx.channel.id)
@@ -2363,11 +4858,8 @@ async def botlist_cmd(ctx):
 @bot.command(name='ticketstats', aliases=['ts', 'tstats'])
 async def ticketstats_cmd(ctx):
     member = ctx.author
-    async with db.pool.acquire() as c:
-        row = await c.fetchrow(
-            'SELECT claimed, closed, total_rating, rating_count FROM ticket_stats WHERE guild_id=$1 AND user_id=$2',
-            ctx.guild.id, member.id
-        )
+    row = await db.get_ticket_stats(ctx.guild.id, member.id)
+    row = counters.overlay('ticket_stats', ctx.guild.id, member.id, row)
     claimed      = row['claimed']      if row else 0
     closed       = row['closed']       if row else 0
     total_rating = row['total_rating'] if row else 0
@@ -2415,29 +4907,15 @@ class RatingView(View):
             )
         self.rated = True
         self.stop()
-        async with db.pool.acquire() as c:
-            existing = await c.fetchval(
-                'SELECT rating FROM ticket_ratings WHERE guild_id=$1 AND ticket_id=$2',
-                self.guild_id, self.ticket_id
-            )
-            if existing:
-                await interaction.response.edit_message(
-                    embed=discord.Embed(description='This ticket has already been rated.', color=0xFEE75C),
-                    view=None
-                )
-                return
-            await c.execute(
-                'INSERT INTO ticket_ratings (guild_id, ticket_id, claimer_id, user_id, rating) VALUES ($1,$2,$3,$4,$5)',
-                self.guild_id, self.ticket_id, self.claimer_id, self.user_id, rating
-            )
-            await c.execute(
-                '''INSERT INTO ticket_stats (guild_id, user_id, total_rating, rating_count)
-                   VALUES ($1, $2, $3, 1)
-                   ON CONFLICT (guild_id, user_id) DO UPDATE
-                   SET total_rating  = ticket_stats.total_rating  + $3,
-                       rating_count  = ticket_stats.rating_count  + 1''',
-                self.guild_id, self.claimer_id, rating
+        stored = await db.add_rating(self.guild_id, self.ticket_id, self.claimer_id, self.user_id, rating)
+        if stored:
+            counters.bump('ticket_stats', self.guild_id, self.claimer_id, total_rating=rating, rating_count=1)
+        else:
+            await interaction.response.edit_message(
+                embed=discord.Embed(description='This ticket has already been rated.', color=0xFEE75C),
+                view=None
             )
+            return
         stars = '★' * rating + '☆' * (5 - rating)
         e = discord.Embed(color=0x57F287)
         e.title       = '⭐  Rating Submitted'
@@ -2462,8 +4940,7 @@ class RatingView(View):
 async def rateme_cmd(ctx):
     if not ctx.channel.name.startswith('ticket-'):
         return await ctx.reply(embed=discord.Embed(description='This command can only be used inside a ticket channel.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        ticket = await c.fetchrow('SELECT * FROM tickets WHERE channel_id=$1', ctx.channel.id)
+    ticket = await db.get_ticket(ctx.channel.id)
     if not ticket:
         return await ctx.reply(embed=discord.Embed(description='No ticket found in this channel.', color=0xED4245))
     if not ticket.get('claimed_by'):
@@ -2476,12 +4953,7 @@ async def rateme_cmd(ctx):
     if creator.id == ctx.author.id:
         return await ctx.reply(embed=discord.Embed(description='You cannot rate yourself.', color=0xED4245))
     # check already rated
-    async with db.pool.acquire() as c:
-        already = await c.fetchval(
-            'SELECT rating FROM ticket_ratings WHERE guild_id=$1 AND ticket_id=$2',
-            ctx.guild.id, ticket['ticket_id']
-        )
-    if already:
+    if await db.rating_exists(ctx.guild.id, ticket['ticket_id']):
         return await ctx.reply(embed=discord.Embed(description='This ticket has already been rated.', color=0xFEE75C))
 
     view = RatingView(
@@ -2769,6 +5241,7 @@ HELP_PAGES = [
                     '┣ `$invited @user` ————— Everyone that user has invited\n'
                     '┣ `$whoinvited [@user]` — Who invited a specific member\n'
                     '┣ `$lb` ————————————— Live top-10 leaderboard  `$lbi` `$invitelb`\n'
+                    '┣ `$myrank [@user]` ——— Leaderboard position  `$rank`\n'
                     '┣ `$createcustomlink` —— Personal invite link  `$ccl`\n'
                     '┣ `$clearinvites all` —— Reset all invite stats  *(owner)*\n'
                     '┗ `$clearinvites @user` — Reset one user\'s stats  *(owner)*'
@@ -2790,7 +5263,10 @@ HELP_PAGES = [
                     '┣ `$setupverify` ————————— Post the verification panel\n'
                     '┣ `$setcategory #category` — Set where tickets are created\n'
                     '┣ `$setlogs #channel` ———— Set transcript & audit log channel\n'
-                    '┗ `$config` ——————————————— View full config, channels & latency'
+                    '┣ `$config` ——————————————— View full config, channels & latency\n'
+                    '┣ `$dbstats [n]` ——————————— Slowest statements by total time\n'
+                    '┣ `$chanpool` ——————————————— Pre-made ticket channels ready\n'
+                    '┗ `$export <table> [jsonl]` — Download tickets / invites / ratings'
                 ),
             },
         ],
@@ -2863,16 +5339,7 @@ async def createcustomlink_cmd(ctx):
     except Exception as ex:
         logger.error(f'createcustomlink: {ex}')
         return await ctx.reply(embed=discord.Embed(description='Something went wrong while creating the invite. Please try again.', color=0xED4245))
-    async with db.pool.acquire() as c:
-        await c.execute(
-            'DELETE FROM custom_invites WHERE guild_id=$1 AND user_id=$2',
-            ctx.guild.id, member.id
-        )
-        await c.execute(
-            'INSERT INTO custom_invites (guild_id, code, user_id, created_by) VALUES ($1,$2,$3,$4)',
-            ctx.guild.id, invite.code, member.id, ctx.author.id
-        )
-    invite_cache.setdefault(ctx.guild.id, {})[invite.code] = 0
+    await db.set_custom_invite(ctx.guild.id, invite.code, member.id, ctx.author.id)
     e = discord.Embed(color=0x57F287)
     e.set_author(name=ctx.guild.name, icon_url=ctx.guild.icon.url if ctx.guild.icon else None)
     e.description = (
@@ -2901,16 +5368,10 @@ async def botstats_cmd(ctx):
     total_msgs   = sum(message_counts.get(ctx.guild.id, {}).values())
 
     # pull from DB for all-time ticket total and open tickets
-    async with db.pool.acquire() as c:
-        open_tickets  = await c.fetchval(
-            "SELECT COUNT(*) FROM tickets WHERE guild_id=$1 AND status!='closed'", ctx.guild.id
-        )
-        total_tickets = await c.fetchval(
-            'SELECT COUNT(*) FROM tickets WHERE guild_id=$1', ctx.guild.id
-        )
-        total_verifs  = await c.fetchval(
-            'SELECT COUNT(*) FROM verifications WHERE guild_id=$1', ctx.guild.id
-        )
+    totals        = await db.ticket_totals(ctx.guild.id)
+    open_tickets  = totals['open']
+    total_tickets = totals['total']
+    total_verifs  = totals['verifications']
 
     e = discord.Embed(title='📊  Bot Statistics', color=0x5865F2)
     e.add_field(
@@ -3090,6 +5551,225 @@ async def setupverify_cmd(ctx):
 
 
 
+# ================================================================== join coalescer
+
+class JoinCoalescer:
+    """
+    Resolves which invite each joining member used. Joins arriving within `window`
+    seconds of the first one in a guild are batched and resolved with a single
+    guild.invites() fetch. Invite counts don't say who used what, so a batch is only
+    attributed when it is unambiguous: exactly one invite (or the vanity link) moved,
+    by exactly as many uses as there were joins. Anything else leaves the batch
+    unattributed rather than crediting an arbitrary inviter. A per-guild lock keeps
+    one diff against invite_cache at a time.
+    """
+    def __init__(self, window: float):
+        self.window    = window
+        self.pending   = defaultdict(list)            # guild_id -> [future]
+        self.locks     = defaultdict(asyncio.Lock)    # guild_id -> lock around the invite_cache diff
+        self.tasks     = set()                        # running _drain tasks
+        self.joins     = 0
+        self.fetches   = 0
+        self.ambiguous = 0                            # joins left unattributed by a mixed batch
+
+    async def resolve(self, member: discord.Member) -> tuple:
+        """(inviter or None, used_code or None, via_vanity) for a member who just joined."""
+        fut = asyncio.get_running_loop().create_future()
+        self.pending[member.guild.id].append(fut)
+        self.joins += 1
+        if len(self.pending[member.guild.id]) == 1:
+            task = asyncio.create_task(self._drain(member.guild))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        return await fut
+
+    async def _drain(self, guild: discord.Guild):
+        batch, results = [], []
+        try:
+            await asyncio.sleep(self.window)
+            async with self.locks[guild.id]:
+                batch   = self.pending.pop(guild.id, [])
+                results = await self._attribute(guild, len(batch))
+        finally:
+            # every waiter gets an answer, even if the fetch raised or the task was cancelled
+            batch = batch or self.pending.pop(guild.id, [])
+            for i, fut in enumerate(batch):
+                if not fut.done():
+                    fut.set_result(results[i] if i < len(results) else (None, None, False))
+        await persist_invite_uses(guild.id)
+
+    async def _attribute(self, guild: discord.Guild, n: int) -> list:
+        moved = []   # (inviter, code, via_vanity, gained) per link whose count went up
+        old   = invite_cache.get(guild.id, {})
+        new   = dict(old)
+        try:
+            live = await guild.invites()
+            self.fetches += 1
+            for inv in live:
+                gained = (inv.uses or 0) - old.get(inv.code, 0)
+                if gained > 0:
+                    moved.append((inv.inviter, inv.code, False, gained))
+            new = {inv.code: inv.uses or 0 for inv in live}
+        except Exception as ex:
+            logger.error(f'invite fetch: {ex}')
+        vanity = await vanity_uses(guild)
+        if vanity is not None:
+            # without a stored baseline the first read is every use ever — seed it, don't diff it
+            if VANITY_CODE in old and vanity > old[VANITY_CODE]:
+                moved.append((None, None, True, vanity - old[VANITY_CODE]))
+            new[VANITY_CODE] = vanity
+        invite_cache[guild.id] = new
+        if len(moved) == 1 and moved[0][3] == n:
+            return [moved[0][:3]] * n
+        if moved:
+            self.ambiguous += n
+            logger.info(
+                f'join coalescer  •  {n} join(s) in {guild.id} against '
+                f'{", ".join(f"{m[1] or "vanity"}+{m[3]}" for m in moved)} — left unattributed'
+            )
+        return []
+
+
+join_coalescer = JoinCoalescer(JOIN_COALESCE_MS / 1000)
+
+
+class MemberLRU:
+    """
+    Small LRU of members resolved over HTTP, for custom invite owners the gateway
+    cache doesn't hold. Owners who have left are remembered as None so a burst of
+    joins through their link costs one fetch_member, not one each.
+    """
+    def __init__(self, size: int = 256):
+        self.size    = size
+        self._lru    = OrderedDict()   # (guild_id, user_id) -> Member | None
+        self.fetches = 0
+
+    async def get(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        member = guild.get_member(user_id)
+        if member:
+            return member
+        key = (guild.id, user_id)
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return self._lru[key]
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            member = None
+        self.fetches += 1
+        self._lru[key] = member
+        if len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+        return member
+
+
+owner_members = MemberLRU()
+
+
+async def vanity_uses(guild: discord.Guild) -> Optional[int]:
+    """The vanity URL's use count, or None when the guild has none (no request is made) or it can't be read."""
+    if 'VANITY_URL' not in guild.features:
+        return None
+    try:
+        vanity = await guild.vanity_invite()
+    except Exception as ex:
+        logger.warning(f'vanity fetch {guild.id}: {ex}')
+        return None
+    return (vanity.uses or 0) if vanity else None
+
+
+async def persist_invite_uses(guild_id: int, code: Optional[str] = None):
+    """Mirror invite_cache to storage — one code, or the guild's whole list (pruning codes that are gone)."""
+    if not db.connected or guild_id not in invite_cache:
+        return
+    uses = invite_cache[guild_id]
+    try:
+        if code is None:
+            await db.put_invite_uses(guild_id, dict(uses), prune=True)
+        elif code in uses:
+            await db.put_invite_uses(guild_id, {code: uses[code]})
+        else:
+            await db.drop_invite_use(guild_id, code)
+    except Exception as ex:
+        logger.warning(f'invite uses persist {guild_id}: {ex}')
+
+
+async def reconcile_invites():
+    """
+    One pass over every guild after (re)connecting: fetch the live invite list under the
+    join lock (plus the vanity URL's count, as the coalescer's baseline), record uses gained
+    while the bot was offline, store the result. Those joins
+    have no member row to classify, so they go to invite_stats.unattributed rather than joins.
+    Guilds with nothing stored yet are only seeded — their existing uses predate tracking.
+    """
+    credited = 0
+    for guild in bot.guilds:
+        try:
+            async with join_coalescer.locks[guild.id]:
+                live   = await guild.invites()
+                vanity = await vanity_uses(guild)
+                old    = invite_cache.get(guild.id)
+                invite_cache[guild.id] = {inv.code: inv.uses or 0 for inv in live}
+                if vanity is not None:
+                    # vanity joins have no inviter to credit; this only resets the baseline
+                    invite_cache[guild.id][VANITY_CODE] = vanity
+            for inv in live if old else ():
+                gained = (inv.uses or 0) - old.get(inv.code, 0)
+                if gained > 0 and inv.inviter:
+                    owner = custom_invite_cache.owner(guild.id, inv.code) or inv.inviter.id
+                    counters.bump('invite_stats', guild.id, owner, unattributed=gained)
+                    credited += gained
+            await persist_invite_uses(guild.id)
+        except Exception as ex:
+            logger.warning(f'invite reconcile {guild.id}: {ex}')
+    logger.info(f'invite cache reconciled  •  {len(bot.guilds)} guild(s)  •  {credited} offline join(s) unattributed')
+
+
+_startup_tasks: dict = {}   # name -> task; a reconnect's on_ready doesn't stack a second pass
+
+
+def start_once(name: str, factory):
+    """Start factory() as a background task unless the previous one is still running."""
+    task = _startup_tasks.get(name)
+    if task and not task.done():
+        logger.info(f'{name} still running  •  skipped')
+        return
+    _startup_tasks[name] = asyncio.create_task(factory())
+
+
+async def reconcile_verified():
+    """
+    Promote invitees who hold the verified role but are stored as unverified. Migration v8
+    classified existing members from the verifications table, whose inserts always failed
+    before this series, and role grants made while the bot was offline never reach on_member_update.
+    """
+    moved = 0
+    for guild in bot.guilds:
+        role = guild.get_role(VERIFIED_ROLE)
+        if not role or not role.members:
+            continue
+        try:
+            rows = await db.verify_invitees(guild.id, [m.id for m in role.members])
+        except Exception as ex:
+            logger.warning(f'verified reconcile {guild.id}: {ex}')
+            continue
+        for r in rows:
+            move_invite_state(guild.id, r['inviter_id'], 'unverified', 'verified')
+        moved += len(rows)
+    logger.info(f'verified invitees reconciled  •  {len(bot.guilds)} guild(s)  •  {moved} promoted')
+
+
+async def backfill_transcripts():
+    """Fill every open ticket channel's transcript with what it received while disconnected."""
+    channels = [ch for guild in bot.guilds for ch in guild.text_channels if is_ticket_channel(ch)]
+    try:
+        added = await transcripts.backfill(db, channels)
+    except Exception as ex:
+        logger.warning(f'transcript backfill: {ex}')
+        return
+    logger.info(f'transcripts backfilled  •  {len(channels)} channel(s)  •  {added} message(s)')
+
+
 # ================================================================== events
 
 
@@ -3121,6 +5801,86 @@ async def limiter_cleanup():
     limiter.cleanup()
 
 
+@tasks.loop(seconds=COUNTER_FLUSH_MS / 1000)
+async def counter_flush():
+    if db.connected:
+        await counters.flush(db)
+
+
+@tasks.loop(seconds=TRANSCRIPT_FLUSH_MS / 1000)
+async def transcript_flush():
+    if db.connected:
+        await transcripts.flush(db)
+
+
+@tasks.loop(minutes=10)
+async def ghost_sweep():
+    """Close open tickets whose channel was deleted out from under the bot."""
+    if not db.connected:
+        return
+    try:
+        rows   = await db.stale_open_tickets()
+        ghosts = []
+        for r in rows:
+            guild = bot.get_guild(r['guild_id'])
+            if guild and not guild.unavailable and guild.get_channel(r['channel_id']) is None:
+                ghosts.append(r)
+        if not ghosts:
+            return
+        await db.close_tickets(ghosts)
+        transcripts.seal([r['channel_id'] for r in ghosts])
+        await db.drop_ticket_messages([r['channel_id'] for r in ghosts])
+        logger.info(f'ghost sweep  •  closed {len(ghosts)} ticket(s) with no channel')
+    except Exception as ex:
+        logger.error(f'ghost sweep: {ex}')
+
+
+@tasks.loop(minutes=15)
+async def archive_sweep():
+    """Move closed tickets to tickets_archive in batches, pausing between them to stay off the pool."""
+    if not db.connected:
+        return
+    total = 0
+    try:
+        while True:
+            moved  = await db.archive_closed_tickets(ARCHIVE_BATCH)
+            total += moved
+            if moved < ARCHIVE_BATCH:
+                break
+            await asyncio.sleep(0.5)
+    except Exception as ex:
+        logger.error(f'archive sweep: {ex}')
+    if total:
+        logger.info(f'archive sweep  •  moved {total} closed ticket(s) to tickets_archive')
+
+
+@tasks.loop(minutes=5)
+async def pool_report():
+    """Log pool pressure per lane and suggest a bigger pool when the interactive lane saturates."""
+    for lane, pool, cap in (('interactive', db.pool, DB_POOL_MAX), ('background', db.bg_pool, DB_BG_POOL_MAX)):
+        if not pool:
+            continue
+        p50  = pool_stats.wait_pct(lane, 0.50)
+        p99  = pool_stats.wait_pct(lane, 0.99)
+        peak = pool_stats.peak[lane]
+        logger.info(
+            f'db pool {lane}  •  size {pool.get_size()}/{cap}  •  peak in use {peak}  •  '
+            f'wait p50 {p50:.1f}ms p99 {p99:.1f}ms'
+        )
+        if lane == 'interactive' and peak >= cap and p99 > 100:
+            logger.warning(f'interactive db pool saturated — consider DB_POOL_MAX={cap * 2}')
+        pool_stats.peak[lane] = pool_stats.in_use[lane]
+    flagged = [(site, s['idle_holds']) for site, s in pool_stats.sites.items() if s['idle_holds']]
+    if flagged:
+        logger.warning('db connections held across non-DB awaits: ' + ', '.join(f'{site} ×{n}' for site, n in flagged))
+
+
+@bot.before_invoke
+async def tag_command(ctx):
+    """Tag DB statements issued by this command (runs in the command's own task, unlike on_command)."""
+    current_command.set(f'${ctx.command.qualified_name}')
+
+
 @bot.event
 async def on_command(ctx):
     """
@@ -3155,6 +5915,16 @@ async def on_ready():
         limiter_cleanup.start()
     if not midnight_reset.is_running():
         midnight_reset.start()
+    if not pool_report.is_running():
+        pool_report.start()
+    if not counter_flush.is_running():
+        counter_flush.start()
+    if not transcript_flush.is_running():
+        transcript_flush.start()
+    if not ghost_sweep.is_running():
+        ghost_sweep.start()
+    if not archive_sweep.is_running():
+        archive_sweep.start()
 
     if not _bot_ready:
         _bot_ready = True
@@ -3163,6 +5933,10 @@ async def on_ready():
 
         try:
             await db.connect()
+        except MigrationError as ex:
+            logger.critical(f'{ex} — shutting down')
+            await bot.close()
+            return
         except Exception as ex:
             logger.error(f'db failed: {ex}')
             return
@@ -3170,15 +5944,15 @@ async def on_ready():
         bot.add_view(TicketPanel())
         bot.add_view(ControlView())
         bot.add_view(VerifyView())
+        start_once('verified reconcile', reconcile_verified)
 
-        # cache invites on every ready (reconnect refreshes cache)
-    for guild in bot.guilds:
-        try:
-            invites = await guild.invites()
-            invite_cache[guild.id] = {inv.code: inv.uses for inv in invites}
-        except Exception:
-            pass
-    logger.info('invite cache loaded')
+    # invite_cache was warmed from storage on connect; catch up on anything missed while offline.
+    # on_ready fires again after a fresh gateway session, whose gap isn't replayed as events
+    if db.connected:
+        start_once('invite reconcile', reconcile_invites)
+        start_once('transcript backfill', backfill_transcripts)
+        for guild in bot.guilds:
+            channel_pool.wake(guild)
 
     await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name='tickets'))
     logger.info(f'ready  •  {len(bot.guilds)} server(s)')
@@ -3259,8 +6033,50 @@ async def on_command_error(ctx, error):
         logger.error(f'{ctx.command}: {type(error).__name__}: {error}')
 
 
+def move_invite_state(guild_id: int, inviter_id: int, old: Optional[str], new: Optional[str]):
+    """
+    Buffers the invite_breakdown change for one member moving between states.
+    old=None is a member arriving in the inviter's list, new=None one leaving it.
+    """
+    deltas = defaultdict(int)
+    if old is None:
+        deltas['joins'] += 1
+    elif old in INVITE_STATE_COLUMN:
+        deltas[INVITE_STATE_COLUMN[old]] -= 1
+    if new is None:
+        deltas['joins'] -= 1
+    else:
+        deltas[INVITE_STATE_COLUMN[new]] += 1
+    counters.bump('invite_breakdown', guild_id, inviter_id, **deltas)
+
+
+async def attribute_join(guild_id: int, user_id: int, inviter_id: int, new_account: bool) -> tuple[dict, bool, bool]:
+    """
+    Storage side of an invite join: one record_join round trip classifies it
+    (fake / rejoin within 7 days / normal) and records who invited the member, then
+    the inviter's counters and breakdown are bumped through the buffer.
+    Returns (inviter stats incl. unflushed deltas, is_rejoin, is_fake).
+    """
+    is_fake   = new_account
+    row       = await db.record_join(guild_id, user_id, inviter_id, new_account)
+    is_rejoin = row['is_rejoin']
+    if row['prev_inviter'] is not None:
+        move_invite_state(guild_id, row['prev_inviter'], row['prev_state'], None)
+    move_invite_state(guild_id, inviter_id, None, row['state'])
+
+    if is_rejoin:
+        counters.bump('invite_stats', guild_id, inviter_id, rejoins=1)
+    elif is_fake:
+        counters.bump('invite_stats', guild_id, inviter_id, joins=1, fake=1)
+    else:
+        counters.bump('invite_stats', guild_id, inviter_id, joins=1)
+    row = row if row['joins'] is not None else None
+    return counters.overlay('invite_stats', guild_id, inviter_id, row), is_rejoin, is_fake
+
+
 @bot.event
 async def on_member_join(member: discord.Member):
+    current_lane.set('background')
     guild = member.guild
 
     unverified_role = guild.get_role(UNVERIFIED_ROLE)
@@ -3305,41 +6121,14 @@ async def on_member_join(member: discord.Member):
             logger.error(f'invite log bot: {ex}')
         return
 
-    inviter   = None
-    used_code = None
-    try:
-        live_invites = await guild.invites()
-        new_invites  = {inv.code: inv.uses for inv in live_invites}
-        old_invites  = invite_cache.get(guild.id, {})
-        for inv in live_invites:
-            if inv.uses > old_invites.get(inv.code, 0):
-                used_code = inv.code
-                inviter   = inv.inviter
-                break
-        invite_cache[guild.id] = new_invites
-        # check if used code belongs to a custom invite (overrides inv.inviter)
-        if used_code:
-            async with db.pool.acquire() as c:
-                ci = await c.fetchrow(
-                    'SELECT user_id FROM custom_invites WHERE guild_id=$1 AND code=$2',
-                    guild.id, used_code
-                )
-            if ci:
-                inviter = guild.get_member(ci['user_id']) or await guild.fetch_member(ci['user_id'])
-    except Exception as ex:
-        logger.error(f'invite fetch: {ex}')
-
-    vanity_used = False
-    if not inviter and used_code is None:
+    inviter, used_code, vanity_used = await join_coalescer.resolve(member)
+    # check if used code belongs to a custom invite (overrides inv.inviter)
+    owner_id = custom_invite_cache.owner(guild.id, used_code) if used_code else None
+    if owner_id:
         try:
-            vanity = await guild.vanity_invite()
-            if vanity:
-                old_vanity = invite_cache.get(f'{guild.id}_vanity', 0)
-                if vanity.uses and vanity.uses > old_vanity:
-                    vanity_used = True
-                    invite_cache[f'{guild.id}_vanity'] = vanity.uses
-        except Exception:
-            pass
+            inviter = await owner_members.get(guild, owner_id) or inviter
+        except Exception as ex:
+            logger.error(f'custom invite owner fetch: {ex}')
 
     if vanity_used:
         try:
@@ -3355,61 +6144,11 @@ async def on_member_join(member: discord.Member):
             acc_age        = now_utc - acc_created
             is_new_account = acc_age.days < 3
 
-            async with db.pool.acquire() as c:
-                left_row = await c.fetchrow(
-                    'SELECT left_at FROM member_left WHERE guild_id=$1 AND user_id=$2',
-                    guild.id, member.id
-                )
-
-            is_rejoin = False
-            is_fake   = False
-            if is_new_account:
-                is_fake = True
-            elif left_row:
-                left_at = left_row['left_at'] if left_row['left_at'].tzinfo else left_row['left_at'].replace(tzinfo=timezone.utc)
-                if (now_utc - left_at).days <= 7:
-                    is_rejoin = True
-
-            async with db.pool.acquire() as c:
-                if is_rejoin:
-                    await c.execute(
-                        '''INSERT INTO invite_stats (guild_id, inviter_id, rejoins) VALUES ($1,$2,1)
-                           ON CONFLICT (guild_id, inviter_id) DO UPDATE SET rejoins = invite_stats.rejoins + 1''',
-                        guild.id, inviter.id
-                    )
-                elif is_fake:
-                    await c.execute(
-                        '''INSERT INTO invite_stats (guild_id, inviter_id, joins, fake) VALUES ($1,$2,1,1)
-                           ON CONFLICT (guild_id, inviter_id) DO UPDATE
-                           SET joins = invite_stats.joins + 1, fake = invite_stats.fake + 1''',
-                        guild.id, inviter.id
-                    )
-                else:
-                    await c.execute(
-                        '''INSERT INTO invite_stats (guild_id, inviter_id, joins) VALUES ($1,$2,1)
-                           ON CONFLICT (guild_id, inviter_id) DO UPDATE SET joins = invite_stats.joins + 1''',
-                        guild.id, inviter.id
-                    )
-
-                await c.execute(
-                    '''INSERT INTO member_invites (guild_id, user_id, inviter_id, is_rejoin)
-                       VALUES ($1,$2,$3,$4)
-                       ON CONFLICT (guild_id, user_id) DO UPDATE
-                       SET inviter_id=$3, joined_at=NOW(), is_rejoin=$4''',
-                    guild.id, member.id, inviter.id, is_rejoin
-                )
-                await c.execute(
-                    'DELETE FROM member_left WHERE guild_id=$1 AND user_id=$2',
-                    guild.id, member.id
-                )
-                row = await c.fetchrow(
-                    'SELECT joins, leaves, fake, rejoins FROM invite_stats WHERE guild_id=$1 AND inviter_id=$2',
-                    guild.id, inviter.id
-                )
+            row, is_rejoin, is_fake = await attribute_join(guild.id, member.id, inviter.id, is_new_account)
 
-            joins   = row['joins']   if row else 1
-            leaves  = row['leaves']  if row else 0
-            fake    = row['fake']    if row else 0
+            joins   = row['joins']
+            leaves  = row['leaves']
+            fake    = row['fake']
             real    = joins - leaves - fake
             word    = 'invite' if real == 1 else 'invites'
 
@@ -3433,31 +6172,57 @@ async def on_member_join(member: discord.Member):
             logger.error(f'invite log unknown: {ex}')
 
 
+@bot.event
+async def on_invite_create(invite: discord.Invite):
+    if invite.guild is None:
+        return
+    invite_cache.setdefault(invite.guild.id, {})[invite.code] = invite.uses or 0
+    await persist_invite_uses(invite.guild.id, invite.code)
+
+
+@bot.event
+async def on_invite_delete(invite: discord.Invite):
+    if invite.guild is None:
+        return
+    invite_cache.get(invite.guild.id, {}).pop(invite.code, None)
+    await persist_invite_uses(invite.guild.id, invite.code)
+
+
 @bot.event
 async def on_member_remove(member: discord.Member):
+    current_lane.set('background')
     try:
-        async with db.pool.acquire() as c:
-            await c.execute(
-                '''INSERT INTO member_left (guild_id, user_id, left_at) VALUES ($1,$2,NOW())
-                   ON CONFLICT (guild_id, user_id) DO UPDATE SET left_at=NOW()''',
-                member.guild.id, member.id
-            )
-            inv_row = await c.fetchrow(
-                'SELECT inviter_id, is_rejoin FROM member_invites WHERE guild_id=$1 AND user_id=$2',
-                member.guild.id, member.id
-            )
-            if inv_row and not inv_row.get('is_rejoin'):
-                await c.execute(
-                    '''INSERT INTO invite_stats (guild_id, inviter_id, leaves) VALUES ($1,$2,1)
-                       ON CONFLICT (guild_id, inviter_id) DO UPDATE SET leaves = invite_stats.leaves + 1''',
-                    member.guild.id, inv_row['inviter_id']
-                )
+        inv_row = await db.record_leave(member.guild.id, member.id)
+        if inv_row and not inv_row.get('is_rejoin'):
+            counters.bump('invite_stats', member.guild.id, inv_row['inviter_id'], leaves=1)
+        if inv_row and inv_row['moved']:
+            move_invite_state(member.guild.id, inv_row['inviter_id'], inv_row['state'], 'left')
     except Exception as ex:
         logger.error(f'on_member_remove: {ex}')
 
 
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    # keeps invite_breakdown's verified / unverified split in step with the verified role
+    had = any(r.id == VERIFIED_ROLE for r in before.roles)
+    has = any(r.id == VERIFIED_ROLE for r in after.roles)
+    if had == has:
+        return
+    current_lane.set('background')
+    state, from_states = ('verified', ('unverified',)) if has else ('unverified', ('verified',))
+    try:
+        moved = await db.set_invite_state(after.guild.id, after.id, state, from_states)
+        if moved:
+            move_invite_state(after.guild.id, moved['inviter_id'], moved['state'], state)
+    except Exception as ex:
+        logger.error(f'on_member_update: {ex}')
+
+
 @bot.event
 async def on_message(message: discord.Message):
+    if message.guild and is_ticket_channel(message.channel):
+        transcripts.add(message.guild.id, message.channel.id, message.id, 'message', message.author.id,
+                        message.author.name, message.content, [a.url for a in message.attachments], message.created_at)
     if message.author.bot:
         await bot.process_commands(message)
         return
@@ -3479,22 +6244,14 @@ async def on_message(message: discord.Message):
                 captchas.pop(user_id, None)
 
                 try:
-                    async with db.pool.acquire() as c:
-                        daily_stats[message.guild.id]['verifications'] += 1
-                        await c.execute(
-                            'INSERT INTO verifications (guild_id, user_id) VALUES ($1,$2) ON CONFLICT DO NOTHING',
-                            message.guild.id, message.author.id
-                        )
-                        inv_row = await c.fetchrow(
-                            'SELECT inviter_id FROM member_invites WHERE guild_id=$1 AND user_id=$2',
-                            message.guild.id, message.author.id
-                        )
-                        if inv_row:
-                            await c.execute(
-                                '''INSERT INTO invite_stats (guild_id, inviter_id, verified) VALUES ($1,$2,1)
-                                   ON CONFLICT (guild_id, inviter_id) DO UPDATE SET verified = invite_stats.verified + 1''',
-                                message.guild.id, inv_row['inviter_id']
-                            )
+                    daily_stats[message.guild.id]['verifications'] += 1
+                    lane = current_lane.set('background')
+                    try:
+                        inviter_id = await db.record_verification(message.guild.id, message.author.id)
+                    finally:
+                        current_lane.reset(lane)
+                    if inviter_id:
+                        counters.bump('invite_stats', message.guild.id, inviter_id, verified=1)
                 except Exception as ex:
                     logger.error(f'verified count update: {ex}')
 
@@ -3580,9 +6337,68 @@ async def web_server():
             content_type='text/plain'
         )
 
+    async def metrics(request):
+        lines = []
+        for lane, pool in (('interactive', db.pool), ('background', db.bg_pool)):
+            if not pool:
+                continue
+            lines += [
+                f'db_pool_size{{lane="{lane}"}} {pool.get_size()}',
+                f'db_pool_max{{lane="{lane}"}} {pool.get_max_size()}',
+                f'db_pool_in_use{{lane="{lane}"}} {pool_stats.in_use[lane]}',
+                f'db_pool_wait_ms{{lane="{lane}",q="0.5"}} {pool_stats.wait_pct(lane, 0.50):.2f}',
+                f'db_pool_wait_ms{{lane="{lane}",q="0.99"}} {pool_stats.wait_pct(lane, 0.99):.2f}',
+            ]
+        lines += [
+            f'counter_flush_lag_seconds {counters.lag():.3f}',
+            f'counter_flush_last_lag_seconds {counters.last_lag:.3f}',
+            f'counter_flush_total {counters.flushes}',
+            f'counter_flush_failures_total {counters.failures}',
+            f'transcript_pending_rows {len(transcripts)}',
+            f'transcript_rows_total {transcripts.rows}',
+            f'transcript_flush_failures_total {transcripts.failures}',
+            f'transcript_dropped_rows_total {transcripts.dropped}',
+            f'transcript_builds_total {transcripts.builds}',
+            f'transcript_bytes_total {transcripts.built}',
+            f'transcript_build_ms{{q="0.5"}} {transcripts.build_pct(0.50):.2f}',
+            f'transcript_build_ms{{q="0.99"}} {transcripts.build_pct(0.99):.2f}',
+            f'join_coalescer_joins_total {join_coalescer.joins}',
+            f'join_coalescer_invite_fetches_total {join_coalescer.fetches}',
+            f'join_coalescer_ambiguous_total {join_coalescer.ambiguous}',
+            f'custom_invite_owner_fetches_total {owner_members.fetches}',
+            f'leaderboard_hubs {len(LeaderboardHub.hubs)}',
+            f'leaderboard_subscribers {sum(len(h.views) for h in LeaderboardHub.hubs.values())}',
+            f'leaderboard_builds_total {LeaderboardHub.builds}',
+            f'ticket_open_total {ticket_opener.opened}',
+            f'ticket_open_rejected_total {ticket_opener.rejected}',
+            f'ticket_open_queued {ticket_opener.queued()}',
+            f'channel_pool_hits_total {channel_pool.hits}',
+            f'channel_pool_misses_total {channel_pool.misses}',
+            f'channel_pool_created_total {channel_pool.created}',
+            f'channel_pool_retired_total {channel_pool.retired}',
+            f'channel_pool_free {sum(len(ids) for ids in channel_pool.free.values())}',
+            f'overwrite_edits_total {overwrite_stats["edits"]}',
+            f'overwrite_edits_skipped_total {overwrite_stats["skipped"]}',
+        ]
+        for stage in TicketOpener.STAGES:
+            lines += [
+                f'ticket_open_stage_ms{{stage="{stage}",q="0.5"}} {ticket_opener.pct(stage, 0.50):.2f}',
+                f'ticket_open_stage_ms{{stage="{stage}",q="0.99"}} {ticket_opener.pct(stage, 0.99):.2f}',
+            ]
+        for site, s in sorted(pool_stats.sites.items()):
+            lines += [
+                f'db_acquire_total{{site="{site}"}} {s["n"]}',
+                f'db_acquire_wait_ms_max{{site="{site}"}} {s["max_wait"] * 1000:.2f}',
+                f'db_acquire_hold_ms_avg{{site="{site}"}} {s["hold"] * 1000 / s["n"]:.2f}',
+                f'db_acquire_hold_ms_max{{site="{site}"}} {s["max_hold"] * 1000:.2f}',
+                f'db_acquire_idle_holds{{site="{site}"}} {s["idle_holds"]}',
+            ]
+        return aiohttp.web.Response(text='\n'.join(lines) + '\n', content_type='text/plain')
+
     app = aiohttp.web.Application()
     app.router.add_get('/', handle)
     app.router.add_get('/health', handle)
+    app.router.add_get('/metrics', metrics)
     runner = aiohttp.web.AppRunner(app)
     await runner.setup()
     port = int(os.getenv('PORT', 8080))
@@ -3591,12 +6407,46 @@ async def web_server():
 
 
 async def main():
-    async with bot:
-        await asyncio.gather(
-            web_server(),
-            bot.start(os.getenv('BOT_TOKEN', ''))
-        )
+    # Render / docker stop send SIGTERM — close the bot so the finally below still runs
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(bot.close()))
+    except NotImplementedError:
+        pass
+    try:
+        async with bot:
+            await asyncio.gather(
+                web_server(),
+                bot.start(os.getenv('BOT_TOKEN', ''))
+            )
+    finally:
+        if db.connected:
+            await counters.flush(db)
+            await transcripts.flush(db)
+            logger.info('counter and transcript buffers flushed on shutdown')
+            await db.close()
+
+
+async def export_cli(argv: list):
+    """python bot.py export <table> [--format csv|jsonl] [--guild ID] [--out PATH]"""
+    ap = argparse.ArgumentParser(prog='bot.py export', description='Stream a table to a gzip-compressed CSV / JSONL file.')
+    ap.add_argument('table', choices=EXPORT_TABLES)
+    ap.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    ap.add_argument('--guild', type=int, help='only rows for this guild id')
+    ap.add_argument('--out', help='output path (default <table>.<format>.gz)')
+    args = ap.parse_args(argv)
+    path = args.out or f'{args.table}.{args.format}.gz'
+    await db.connect()
+    try:
+        with open(path, 'wb') as out:
+            rows = await write_export(db, args.table, args.format, out, args.guild)
+        logger.info(f'exported {rows:,} row(s) from {args.table} to {path}  •  {os.path.getsize(path) / 1024:.0f} KB')
+    finally:
+        await db.close()
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    if sys.argv[1:2] == ['export']:
+        asyncio.run(export_cli(sys.argv[2:]))
+    else:
+        asyncio.run(main())
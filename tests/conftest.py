@@ -0,0 +1,21 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+
+@pytest.fixture
+def run():
+    """Runs a coroutine to completion on a fresh event loop."""
+    return asyncio.run
+
+
+@pytest.fixture
+def storage():
+    bot.ticket_cache._by_channel.clear()
+    return bot.MemoryStorage()
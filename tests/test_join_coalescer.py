@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import bot
+
+
+class _Guild:
+    def __init__(self, gid: int, live: dict, vanity=None):
+        self.id            = gid
+        self.features      = ['VANITY_URL'] if vanity is not None else []
+        self.live          = live
+        self.vanity        = vanity
+        self.vanity_calls  = 0
+
+    async def invites(self):
+        return [SimpleNamespace(code=code, uses=uses, inviter=f'owner-{code}') for code, uses in self.live.items()]
+
+    async def vanity_invite(self):
+        self.vanity_calls += 1
+        return SimpleNamespace(uses=self.vanity)
+
+
+def test_first_vanity_read_seeds_the_baseline_instead_of_diffing(run):
+    guild = _Guild(901, {'abc': 6}, vanity=100)
+    bot.invite_cache[guild.id] = {'abc': 5}   # warmed from invite_uses, no vanity stored yet
+
+    out = run(bot.JoinCoalescer(0)._attribute(guild, 1))
+    assert out == [('owner-abc', 'abc', False)]
+    assert bot.invite_cache[guild.id] == {'abc': 6, bot.VANITY_CODE: 100}
+
+
+def test_vanity_join_is_attributed_against_a_stored_baseline(run):
+    guild = _Guild(902, {'abc': 5}, vanity=102)
+    bot.invite_cache[guild.id] = {'abc': 5, bot.VANITY_CODE: 100}
+
+    assert run(bot.JoinCoalescer(0)._attribute(guild, 2)) == [(None, None, True)] * 2
+
+
+def test_guild_without_vanity_url_never_fetches_it(run):
+    guild = _Guild(903, {'abc': 6})
+    bot.invite_cache[guild.id] = {'abc': 5}
+
+    assert run(bot.JoinCoalescer(0)._attribute(guild, 1)) == [('owner-abc', 'abc', False)]
+    assert guild.vanity_calls == 0 and bot.VANITY_CODE not in bot.invite_cache[guild.id]
+
+
+def test_mixed_batch_is_left_unattributed(run):
+    guild = _Guild(904, {'abc': 6, 'xyz': 3})
+    bot.invite_cache[guild.id] = {'abc': 5, 'xyz': 2}
+    coalescer = bot.JoinCoalescer(0)
+
+    assert run(coalescer._attribute(guild, 2)) == []
+    assert coalescer.ambiguous == 2
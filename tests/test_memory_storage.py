@@ -0,0 +1,204 @@
+import gzip
+import secrets
+from datetime import timedelta
+
+import bot
+
+
+# ── ticket numbers ──
+
+def test_ticket_numbers_are_sequential_across_blocks(run, storage):
+    alloc = bot.TicketNumberAllocator(block=3)
+
+    async def go():
+        return [await alloc.next(storage, 1) for _ in range(7)]
+
+    assert run(go()) == [1, 2, 3, 4, 5, 6, 7]
+    assert storage.config[1]['ticket_counter'] == 9   # three blocks reserved
+    assert alloc.issued(1) == 7
+    assert alloc.issued(2) is None
+
+
+def test_ticket_numbers_skip_the_rest_of_a_block_after_restart(run, storage):
+    async def go():
+        first = bot.TicketNumberAllocator(block=5)
+        await first.next(storage, 1)
+        await first.next(storage, 1)
+        return await bot.TicketNumberAllocator(block=5).next(storage, 1)
+
+    assert run(go()) == 6
+
+
+def test_ticket_numbers_are_per_guild(run, storage):
+    alloc = bot.TicketNumberAllocator(block=10)
+
+    async def go():
+        return [await alloc.next(storage, g) for g in (1, 2, 1, 2)]
+
+    assert run(go()) == [1, 1, 2, 2]
+
+
+# ── counter buffer ──
+
+def test_counter_flush_applies_merged_deltas(run, storage):
+    buf = bot.CounterBuffer()
+    buf.bump('invite_stats', 1, 9, joins=2)
+    buf.bump('invite_stats', 1, 9, joins=1, fake=1)
+    buf.bump('ticket_stats', 1, 5, claimed=1)
+    run(buf.flush(storage))
+
+    assert storage.counters['invite_stats'][(1, 9)] == {'joins': 3, 'fake': 1}
+    assert storage.counters['ticket_stats'][(1, 5)] == {'claimed': 1}
+    assert buf.flushes == 1 and buf.lag() == 0.0
+
+
+def test_counter_overlay_adds_unflushed_deltas(run, storage):
+    buf = bot.CounterBuffer()
+    buf.bump('invite_stats', 1, 9, joins=4)
+    run(buf.flush(storage))
+    buf.bump('invite_stats', 1, 9, joins=1, leaves=1)
+
+    stored = run(storage.get_invite_stats(1, 9))
+    seen   = buf.overlay('invite_stats', 1, 9, stored)
+    assert (seen['joins'], seen['leaves']) == (5, 1)
+    assert buf.overlay('invite_stats', 1, 8, None) == dict.fromkeys(bot.COUNTER_TABLES['invite_stats'][1], 0)
+
+
+def test_counter_failed_flush_keeps_deltas(run, storage):
+    class Down:
+        async def apply_counters(self, batch):
+            raise ConnectionError('db down')
+
+    buf = bot.CounterBuffer()
+    buf.bump('invite_stats', 1, 9, joins=2)
+    run(buf.flush(Down()))
+    buf.bump('invite_stats', 1, 9, joins=1)
+    assert buf.failures == 1
+    assert buf.overlay('invite_stats', 1, 9, None)['joins'] == 3
+
+    run(buf.flush(storage))
+    assert storage.counters['invite_stats'][(1, 9)]['joins'] == 3
+
+
+# ── join / leave state ──
+
+def test_first_join_is_unverified_and_a_new_account_is_fake(run, storage):
+    a = run(storage.record_join(1, 100, 9, new_account=False))
+    b = run(storage.record_join(1, 101, 9, new_account=True))
+    assert (a['state'], a['is_rejoin'], a['prev_inviter']) == ('unverified', False, None)
+    assert (b['state'], b['is_rejoin']) == ('fake', False)
+
+
+def test_leave_moves_to_left_once(run, storage):
+    run(storage.record_join(1, 100, 9, new_account=False))
+    first  = run(storage.record_leave(1, 100))
+    second = run(storage.record_leave(1, 100))
+    assert (first['state'], first['moved']) == ('unverified', True)
+    assert (second['state'], second['moved']) == ('left', False)
+    assert run(storage.record_leave(1, 555)) is None
+
+
+def test_join_after_a_recent_leave_is_a_rejoin_and_stays_one(run, storage):
+    run(storage.record_join(1, 100, 9, new_account=False))
+    run(storage.record_leave(1, 100))
+    again = run(storage.record_join(1, 100, 8, new_account=False))
+    assert (again['state'], again['is_rejoin']) == ('rejoin', True)
+    assert (again['prev_inviter'], again['prev_state']) == (9, 'left')
+
+    left = run(storage.record_leave(1, 100))
+    assert (left['state'], left['moved']) == ('rejoin', False)
+
+
+def test_join_long_after_leaving_is_not_a_rejoin(run, storage):
+    run(storage.record_join(1, 100, 9, new_account=False))
+    run(storage.record_leave(1, 100))
+    storage.member_left[(1, 100)] -= timedelta(days=9)
+    again = run(storage.record_join(1, 100, 9, new_account=False))
+    assert (again['state'], again['is_rejoin']) == ('unverified', False)
+
+
+def test_verified_state_moves_only_from_unverified(run, storage):
+    run(storage.record_join(1, 100, 9, new_account=False))
+    run(storage.record_join(1, 101, 9, new_account=True))
+    moved = run(storage.verify_invitees(1, [100, 101]))
+    assert moved == [{'inviter_id': 9}]
+    assert run(storage.set_invite_state(1, 100, 'unverified', ('verified',))) == {'inviter_id': 9, 'state': 'verified'}
+    assert run(storage.set_invite_state(1, 101, 'verified', ('unverified',))) is None
+
+
+# ── transcript parts ──
+
+def _read(part, compress: bool) -> str:
+    data = part.read()
+    return (gzip.decompress(data) if compress else data).decode()
+
+
+def test_transcript_fits_one_part_when_small():
+    w = bot.TranscriptWriter('t', 'HEADER\n', limit=64 * 1024, compress=False)
+    for i in range(10):
+        w.write(f'line {i}')
+    files = w.finish()
+    assert [f.filename for f in files] == ['t.txt']
+    assert w.messages == 10
+    w.close()
+
+
+def test_transcript_splits_into_parts_under_the_limit():
+    for compress in (False, True):
+        limit = 8 * 1024
+        w     = bot.TranscriptWriter('t', 'HEADER\n', limit=limit, compress=compress)
+        lines = [f'{i:05d} ' + secrets.token_hex(40) for i in range(2000)]
+        for line in lines:
+            w.write(line)
+        files = w.finish()
+        n     = len(files)
+        assert n > 1
+        assert files[0].filename == f't-part1of{n}' + ('.txt.gz' if compress else '.txt')
+
+        body = []
+        for i, spool in enumerate(w.parts, 1):
+            assert spool.seek(0, 2) <= limit
+            spool.seek(0)
+            text = _read(spool, compress)
+            assert text.startswith(f'HEADER\npart {i}\n\n')
+            body += text.split('\n\n', 1)[1].splitlines()
+        assert body == lines   # every line once, in order, none split across parts
+        w.close()
+
+
+# ── archive ──
+
+def _closed_ticket(run, storage, tid: str, guild_id: int, channel_id: int):
+    rec = run(storage.insert_ticket(tid, guild_id, channel_id, 7, 'support', 'support'))
+    run(storage.close_ticket(rec))
+
+
+def test_archive_moves_only_closed_tickets(run, storage):
+    _closed_ticket(run, storage, '0001', 1, 11)
+    run(storage.insert_ticket('0002', 1, 12, 7, 'support', 'support'))
+
+    assert run(storage.archive_closed_tickets(100)) == 1
+    assert list(storage.tickets) == ['0002']
+    assert (1, '0001') in storage.archive
+    assert run(storage.ticket_totals(1))['total'] == 2
+    assert run(storage.archive_closed_tickets(100)) == 0
+
+
+def test_archive_respects_the_batch_limit(run, storage):
+    for i in range(5):
+        _closed_ticket(run, storage, f'{i:04d}', 1, 100 + i)
+    assert run(storage.archive_closed_tickets(2)) == 2
+    assert run(storage.archive_closed_tickets(2)) == 2
+    assert run(storage.archive_closed_tickets(2)) == 1
+    assert len(storage.archive) == 5 and not storage.tickets
+
+
+def test_archive_collision_replaces_the_older_row_and_logs_it(run, storage, caplog):
+    _closed_ticket(run, storage, '0001', 1, 11)
+    run(storage.archive_closed_tickets(100))
+    _closed_ticket(run, storage, '0001', 1, 12)   # guild counter went backwards
+    run(storage.archive_closed_tickets(100))
+
+    assert len(storage.archive) == 1
+    assert storage.archive[(1, '0001')]['channel_id'] == 12
+    assert 'archive replaced 1 older archived ticket(s): 1/0001' in caplog.text
@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+
+import bot
+
+
+class _Notice:
+    async def edit(self, embed):
+        pass
+
+    async def delete(self):
+        pass
+
+
+class _Followup:
+    def __init__(self, gate: asyncio.Event):
+        self.gate = gate
+
+    async def send(self, embed, ephemeral=True, wait=False):
+        await self.gate.wait()
+        return _Notice()
+
+
+def test_request_queued_as_workers_exit_is_still_opened(run, monkeypatch):
+    """Both slots finish in the same step the third request's notice comes back."""
+    monkeypatch.setattr(bot, 'TICKET_OPEN_CONCURRENCY', 2)
+    monkeypatch.setattr(bot.TicketOpener, 'POSITION_EVERY', 0.01)
+
+    async def go():
+        opener = bot.TicketOpener()
+        gate   = asyncio.Event()
+        opened = []
+
+        async def fake_open(req):
+            await gate.wait()
+            opened.append(req['interaction'].n)
+
+        opener._open = fake_open
+        guild        = SimpleNamespace(id=1)
+        inter        = [SimpleNamespace(n=i, guild=guild, followup=_Followup(gate)) for i in range(3)]
+        await opener.submit(inter[0], None)
+        await opener.submit(inter[1], None)
+        await asyncio.sleep(0)                     # both workers are now waiting inside _open
+        third = asyncio.create_task(opener.submit(inter[2], None))
+        await asyncio.sleep(0)                     # the third is waiting on its "In Line" notice
+        gate.set()
+        await third
+        for _ in range(50):
+            if len(opened) == 3:
+                break
+            await asyncio.sleep(0.01)
+        return opener, opened
+
+    opener, opened = run(go())
+    assert sorted(opened) == [0, 1, 2]
+    assert not opener.lines[1] and not opener.workers[1] and not opener.refreshers